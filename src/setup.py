@@ -13,15 +13,21 @@ setup(
         'opencv-python~=4.7.0.72',
         'yolov5~=7.0.13',
         'PyYAML~=6.0.1',
+        'numpy~=1.26.4',
         'torchvision~=0.16.2',
         'torch~=2.1.2',
         'smbus2~=0.4.3',
+        'pyserial~=3.5',
         'Pillow~=10.1.0',
         'luma.oled~=3.13.0',
         'Rtree~=1.2.0',
+        'shapely~=2.0.2',
         'typing-extensions~=4.12.2',
         'picamera2~=0.3.12'
     ],
+    extras_require={
+        'onnx': ['onnx~=1.15.0', 'onnxruntime~=1.16.3']
+    },
     url='https://github.com/DavidEscri/TFM_RPi4',
     license='',
     author='Jose David Escribano Orts',
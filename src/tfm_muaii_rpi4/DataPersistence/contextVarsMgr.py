@@ -31,6 +31,8 @@ class ContextVarsConst:
     VEHICULO_PARADO = "vehiculo_parado"
     SATELITES_GNSS = "satelites_gnss"
     PRECISION_GNSS = "precision_gnss"
+    OCUPACION_ASIENTOS = "ocupacion_asientos"
+    PERSONAS_CAMARAS = "personas_camaras"
 
 
 class _ContextVarsMgr(Service):
@@ -53,6 +55,8 @@ class _ContextVarsMgr(Service):
         self._contextVarDict.setdefault(ContextVarsConst.VEHICULO_PARADO, True)
         self._contextVarDict.setdefault(ContextVarsConst.SATELITES_GNSS, 0)
         self._contextVarDict.setdefault(ContextVarsConst.PRECISION_GNSS, 0.0)
+        self._contextVarDict.setdefault(ContextVarsConst.OCUPACION_ASIENTOS, {})
+        self._contextVarDict.setdefault(ContextVarsConst.PERSONAS_CAMARAS, {})
 
     def start(self):
         try:
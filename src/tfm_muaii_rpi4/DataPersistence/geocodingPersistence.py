@@ -0,0 +1,90 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "DataPersistence"
+__module__ = "geocodingPersistence"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import os
+
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.utils import Service, ServiceDB
+
+
+Logs = LogsSingleton()
+
+
+class _GeocodingPersistence(Service, ServiceDB):
+    """
+    Resultados de la geolocalización inversa online por celda geohash, para conservar la caché entre reinicios
+    """
+    DB_NAME = "DB_geocoding.db"
+    _table_name: str = "GEOCODING"
+    _list_fields: list = ["geohash", "max_speed", "location_info", "timestamp"]
+    _list_fields_type: list = ["VARCHAR(12)", "INTEGER", "VARCHAR(200)", "REAL"]
+    _primary_key: str = "geohash"
+
+    POS_GEOHASH: int = 0
+    POS_MAX_SPEED: int = 1
+    POS_LOCATION_INFO: int = 2
+    POS_TIMESTAMP: int = 3
+
+    def __init__(self):
+        Service.__init__(self, __info__, is_thread=False)
+        try:
+            env = EnvSingleton()
+            db_path = env.get_path(env.DB_path)
+            ServiceDB.__init__(self, self.DB_NAME, db_path)
+        except Exception as e:
+            super().critical_error(e, "init")
+
+    def start(self):
+        try:
+            super().start()
+            if not os.path.isfile(self.path_db):
+                Logs.get_logger().info("Creando base de datos %s", self.path_db, extra=__info__)
+            if not self.create_table(self._table_name, self._list_fields, self._list_fields_type, self._primary_key):
+                raise Exception(f"Error al crear la base de datos {self.path_db}")
+        except Exception as e:
+            super().critical_error(e, "start")
+
+    def stop(self):
+        try:
+            super().stop()
+        except Exception as e:
+            super().critical_error(e, "stop")
+
+    def get_records(self, min_timestamp: float, limit: int) -> list:
+        """
+        Registros posteriores a min_timestamp, del más antiguo al más reciente, hasta un máximo de limit
+        """
+        sql = (f"SELECT {', '.join(self._list_fields)} FROM ("
+               f"SELECT {', '.join(self._list_fields)} FROM {self._table_name} WHERE timestamp >= ? "
+               f"ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp")
+        res, record_list = self._db.query_sql(sql, (min_timestamp, limit), self._list_fields)
+        return record_list if res else []
+
+    def save_record(self, record: dict) -> bool:
+        if not self.validate_record(self._list_fields, record):
+            Logs.get_logger().error("Parámetros de entrada en el insert de %s no son correctos", self._table_name,
+                                    extra=__info__)
+            return False
+        sql = (f"INSERT OR REPLACE INTO {self._table_name} ({', '.join(self._list_fields)}) "
+               f"VALUES ({', '.join(['?'] * len(self._list_fields))})")
+        return self._db.insert_sql(sql, tuple(record[field] for field in self._list_fields))
+
+    def delete_records(self, max_timestamp: float) -> bool:
+        """
+        Elimina los registros anteriores a max_timestamp
+        """
+        sql = f"DELETE FROM {self._table_name} WHERE timestamp < ?"
+        return self._db.update_sql(sql, (max_timestamp,))
+
+
+class GeocodingPersistenceSingleton:
+    __instance = None
+
+    def __new__(cls):
+        if GeocodingPersistenceSingleton.__instance is None:
+            GeocodingPersistenceSingleton.__instance = _GeocodingPersistence()
+        return GeocodingPersistenceSingleton.__instance
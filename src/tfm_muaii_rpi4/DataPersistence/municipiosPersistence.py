@@ -72,7 +72,7 @@ class _MunicipiosPersistence(Service, ServiceDB):
         fields.append(self._list_fields[self.POS_PROVINCIA])
         fields.append(self._list_fields[self.POS_MUNICIPIO])
         params: list = list()
-        point = Point(coordinates.get_coordinates()[::-1])
+        point = Point(coordinates.get_lon_lat())
         for municipio_id, geom in self._municipios:
             if geom.contains(point):
                 params.append(municipio_id)
@@ -0,0 +1,150 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "DataPersistence"
+__module__ = "roadIndexManager"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import queue
+from collections import OrderedDict
+from threading import Lock
+
+from tfm_muaii_rpi4.DataPersistence.roadsPersistence import _RoadsPersistence
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.utils import Service
+
+Logs = LogsSingleton()
+
+
+class _RoadIndexManager(Service):
+    """
+    Carreteras de varias provincias abiertas, por nombre de base de datos. Una provincia que no está abierta se abre en
+    un hilo propio sin bloquear la consulta, que devuelve None mientras tanto; la primera vez se generan sus teselas de
+    tile_size grados. Si la memoria estimada de las teselas cargadas supera max_memory_mb (sección roads de
+    services.gps_controller), se cierran las provincias usadas hace más tiempo, conservando siempre la más reciente.
+    """
+    MAX_MEMORY_MB: float = 256.0
+    QUEUE_TIMEOUT: float = 1.0
+
+    def __init__(self):
+        super().__init__(__info__, is_thread=True)
+        env = EnvSingleton()
+        conf: dict = env.get_service_conf(env.gps_controller).get("roads", {})
+        self.__max_memory: float = float(conf.get("max_memory_mb", self.MAX_MEMORY_MB)) * 1024 * 1024
+        self.__tile_size: float = float(conf.get("tile_size", _RoadsPersistence.TILE_SIZE))
+        self.__indexes: OrderedDict = OrderedDict()     # Nombre de la base de datos -> _RoadsPersistence, LRU
+        self.__pending: set = set()
+        self.__in_use: dict = {}        # Nombre de la base de datos -> consultas en curso, que impiden cerrarla
+        self.__queue: queue.Queue = queue.Queue()
+        self.__lock = Lock()
+
+    def start(self):
+        try:
+            super().start()
+        except Exception as e:
+            super().critical_error(e, "start")
+
+    def stop(self):
+        try:
+            super().stop()
+        except Exception as e:
+            super().critical_error(e, "stop")
+
+    def get_record_by_coordinates(self, db_name: str, coords: tuple, heading: float = None) -> dict:
+        """
+        :param db_name: Base de datos de carreteras de la provincia de las coordenadas
+        :param coords: Coordenadas (longitud, latitud)
+        :param heading: Rumbo del vehículo en grados, para precargar las teselas hacia las que avanza
+        :return: Registro de la carretera más cercana, None si la provincia aún no está cargada
+        """
+        if db_name is None:
+            return None
+        with self.__lock:
+            roads_pers = self.__indexes.get(db_name)
+            if roads_pers is not None:
+                self.__in_use[db_name] = self.__in_use.get(db_name, 0) + 1
+                if next(reversed(self.__indexes)) != db_name:
+                    # Cambio de provincia: las teselas de la anterior siguen cargadas hasta superar el límite de memoria
+                    self.__indexes.move_to_end(db_name)
+                    self.__evict()
+        if roads_pers is None:
+            self.request_load(db_name)
+            return None
+        try:
+            return roads_pers.get_record_by_coordinates(coords, heading)
+        finally:
+            with self.__lock:
+                self.__in_use[db_name] -= 1
+                if self.__in_use[db_name] == 0:
+                    del self.__in_use[db_name]
+                    self.__evict()
+
+    def request_load(self, db_name: str) -> None:
+        """
+        Solicita la carga en segundo plano de las carreteras de una provincia, si no están cargadas ni solicitadas
+        """
+        with self.__lock:
+            if db_name in self.__indexes or db_name in self.__pending:
+                return
+            self.__pending.add(db_name)
+        Logs.get_logger().info(f"Solicitada la carga de carreteras de {db_name}", extra=__info__)
+        self.__queue.put(db_name)
+
+    def _run(self):
+        while not super().need_stop():
+            try:
+                db_name = self.__queue.get(timeout=self.QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+            try:
+                self.__load(db_name)
+            except Exception as e:
+                Logs.get_logger().error(f"Error al cargar las carreteras de {db_name}: {e}", extra=__info__)
+            finally:
+                with self.__lock:
+                    self.__pending.discard(db_name)
+
+    def __load(self, db_name: str) -> None:
+        roads_pers = _RoadsPersistence(db_name, self.__tile_size)
+        roads_pers.start()
+        if not roads_pers.is_loaded():
+            raise Exception(f"No se pudieron cargar las carreteras de {db_name}")
+        with self.__lock:
+            self.__indexes[db_name] = roads_pers
+            self.__evict()
+        Logs.get_logger().info(f"Carreteras de {db_name} disponibles", extra=__info__)
+
+    def __evict(self) -> None:
+        """
+        Cierra las provincias usadas hace más tiempo mientras se supere el límite de memoria, salvo la más reciente y
+        las que tienen consultas en curso, que se cierran al terminar la última. Se llama con el cerrojo tomado.
+        """
+        memory_usage = sum(roads_pers.get_memory_usage() for roads_pers in self.__indexes.values())
+        for db_name in list(self.__indexes)[:-1]:
+            if memory_usage <= self.__max_memory:
+                break
+            if db_name in self.__in_use:
+                continue
+            roads_pers = self.__indexes.pop(db_name)
+            memory_usage -= roads_pers.get_memory_usage()
+            roads_pers.stop()
+            Logs.get_logger().info(f"Carreteras de {db_name} descargadas por límite de memoria", extra=__info__)
+
+    def is_loaded(self, db_name: str) -> bool:
+        with self.__lock:
+            return db_name in self.__indexes
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            return {"loaded": list(self.__indexes), "pending": list(self.__pending),
+                    "memory_mb": round(sum(roads_pers.get_memory_usage()
+                                           for roads_pers in self.__indexes.values()) / (1024 * 1024), 1)}
+
+
+class RoadIndexManagerSingleton:
+    __instance = None
+
+    def __new__(cls):
+        if RoadIndexManagerSingleton.__instance is None:
+            RoadIndexManagerSingleton.__instance = _RoadIndexManager()
+        return RoadIndexManagerSingleton.__instance
@@ -0,0 +1,163 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "DataPersistence"
+__module__ = "roadsBenchmark"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Benchmark de la búsqueda de la carretera actual sobre la base de datos de carreteras de una provincia. Genera puntos
+# de consulta junto a carreteras aleatorias y compara la búsqueda anterior (vecino más cercano del índice y recorrido
+# lineal de las geometrías con equals para obtener el id) con la actual (candidatas en un radio e id desde el array
+# paralelo y teselas cargadas bajo demanda), reportando latencias p50/p95/p99. Además recorre una ruta en línea recta
+# con consultas cada --step metros y el rumbo del vehículo, como el controlador GPS, de modo que las teselas se precargan
+# en la dirección de avance y se descargan al alejarse; se reportan sus latencias y la memoria de las teselas:
+#     python -m tfm_muaii_rpi4.DataPersistence.roadsBenchmark --db DB_roads_alicante.db --queries 1000 --step 250
+# La búsqueda anterior recorre todas las geometrías en cada consulta, por lo que se limita a --legacy-queries puntos.
+
+import argparse
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+from shapely.geometry import LineString, Point
+from shapely.strtree import STRtree
+
+from tfm_muaii_rpi4.DataPersistence.roadsPersistence import RoadsDB, _RoadsPersistence
+from tfm_muaii_rpi4.Utils.db.sqlite import SqlUtils
+from tfm_muaii_rpi4.Utils.geolocation.geoMath import LocalProjection
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
+from tfm_muaii_rpi4.Utils.metrics.memoryStats import get_peak_rss_mb
+
+
+class RoadsStages:
+    LOAD = "load"
+    LEGACY_NEAREST = "legacy_nearest"
+    NEAREST = "nearest"
+    ROUTE_RECORD = "route_record"
+
+
+def load_legacy_roads(path_db: str) -> list:
+    """
+    Carga las geometrías como lo hacía la versión anterior, en una lista de (id, LineString)
+    """
+    fields = ["id", "geometry"]
+    _, record_list = SqlUtils(path_db).query_sql("SELECT id, geometry FROM ROADS", (), fields)
+    return [(row["id"], LineString(json.loads(row["geometry"])["coordinates"])) for row in record_list]
+
+
+def legacy_nearest_road_id(strtree: STRtree, line_strings: list, coords: tuple) -> int:
+    nearest_geom = strtree.geometries[strtree.nearest(Point(coords))]
+    return next(road_id for road_id, geom in line_strings if geom.equals(nearest_geom))
+
+
+def sample_queries(line_strings: list, queries: int, radius: float, seed: int) -> list:
+    """
+    Puntos (longitud, latitud) a menos de radius metros de un vértice de una carretera aleatoria
+    """
+    rng = np.random.default_rng(seed)
+    points: list = []
+    for index in rng.integers(0, len(line_strings), queries):
+        coords = np.asarray(line_strings[index][1].coords)
+        longitude, latitude = coords[rng.integers(0, len(coords))][:2]
+        projection = LocalProjection(latitude, longitude)
+        latitude, longitude = projection.to_geodetic(*rng.uniform(-radius, radius, 2))
+        points.append((longitude, latitude))
+    return points
+
+
+def sample_route(strtree: STRtree, queries: int, step: float, seed: int) -> list:
+    """
+    Puntos (longitud, latitud, rumbo) cada step metros de una ruta en línea recta desde un punto aleatorio, que rebota
+    en los límites de la provincia
+    """
+    rng = np.random.default_rng(seed)
+    min_lon, min_lat, max_lon, max_lat = strtree.geometries[0].bounds
+    for geom in strtree.geometries:
+        bounds = geom.bounds
+        min_lon, min_lat = min(min_lon, bounds[0]), min(min_lat, bounds[1])
+        max_lon, max_lat = max(max_lon, bounds[2]), max(max_lat, bounds[3])
+    longitude, latitude = rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)
+    heading = rng.uniform(0, 360)
+    route: list = []
+    for _ in range(queries):
+        route.append((longitude, latitude, heading))
+        projection = LocalProjection(latitude, longitude)
+        latitude, longitude = projection.to_geodetic(step * np.sin(np.radians(heading)),
+                                                     step * np.cos(np.radians(heading)))
+        if not min_lon <= longitude <= max_lon:
+            heading, longitude = (360 - heading) % 360, float(np.clip(longitude, min_lon, max_lon))
+        if not min_lat <= latitude <= max_lat:
+            heading, latitude = (180 - heading) % 360, float(np.clip(latitude, min_lat, max_lat))
+    return route
+
+
+def run_benchmark(db_name: str, queries: int, legacy_queries: int, radius: float, step: float, seed: int) -> dict:
+    stats = LatencyStats([RoadsStages.LOAD, RoadsStages.LEGACY_NEAREST, RoadsStages.NEAREST,
+                          RoadsStages.ROUTE_RECORD],
+                         window=max(queries, LatencyStats.WINDOW))
+    roads_pers = _RoadsPersistence(db_name)
+    with stats.measure(RoadsStages.LOAD):
+        roads_pers.start()
+
+    line_strings = load_legacy_roads(roads_pers.path_db)
+    strtree = STRtree([geom for _, geom in line_strings])
+    points = sample_queries(line_strings, queries, radius, seed)
+    same_road = 0
+    for coords in points[:legacy_queries]:
+        with stats.measure(RoadsStages.LEGACY_NEAREST):
+            legacy_id = legacy_nearest_road_id(strtree, line_strings, coords)
+        same_road += legacy_id == roads_pers.get_nearest_road_id(coords)
+    for coords in points:
+        with stats.measure(RoadsStages.NEAREST):
+            roads_pers.get_nearest_road_id(coords)
+    route_roads = 0
+    for longitude, latitude, heading in sample_route(strtree, queries, step, seed):
+        with stats.measure(RoadsStages.ROUTE_RECORD):
+            route_roads += roads_pers.get_record_by_coordinates((longitude, latitude), heading) is not None
+        # Las consultas del controlador GPS están separadas location_period segundos: se deja tiempo a la precarga
+        time.sleep(0.001)
+    compared = min(legacy_queries, len(points))
+
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "db": db_name,
+        "roads": len(line_strings),
+        "queries": len(points),
+        "legacy_queries": compared,
+        # La búsqueda anterior elige el vecino más cercano en grados, por lo que puede diferir de la actual
+        "same_road_rate": round(same_road / compared, 3) if compared > 0 else 0.0,
+        "route_step_m": step,
+        "route_found_rate": round(route_roads / queries, 3) if queries > 0 else 0.0,
+        "tiles": roads_pers.get_tile_stats(),
+        "peak_rss_mb": round(get_peak_rss_mb(), 2),
+        "stages": stats.summary()
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda de la carretera actual")
+    parser.add_argument("--db", default=RoadsDB.DB_NAME_ALICANTE, help="Base de datos de carreteras de la provincia")
+    parser.add_argument("--queries", type=int, default=1000, help="Número de puntos de consulta")
+    parser.add_argument("--legacy-queries", type=int, default=100,
+                        help="Número de puntos de consulta con la búsqueda anterior")
+    parser.add_argument("--radius", type=float, default=50.0, help="Distancia máxima en metros de los puntos a la vía")
+    parser.add_argument("--step", type=float, default=250.0, help="Distancia en metros entre consultas de la ruta")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los puntos de consulta")
+    parser.add_argument("--output", default=None, help="Fichero JSON en el que guardar el informe")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.db, args.queries, args.legacy_queries, args.radius, args.step, args.seed)
+    print(f"Carreteras de {report['db']}: {report['roads']} geometrías, misma carretera en el "
+          f"{report['same_road_rate'] * 100:.1f} % de las consultas comparadas. Ruta: {report['tiles']['loaded_total']} "
+          f"teselas cargadas, {report['tiles']['tiles']} en memoria con {report['tiles']['memory_mb']} MB")
+    for stage, values in report["stages"].items():
+        print(f"    {stage}: n={values['count']} p50={values['p50_ms']} ms p95={values['p95_ms']} ms "
+              f"p99={values['p99_ms']} ms media={values['mean_ms']} ms max={values['max_ms']} ms")
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Informe guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,22 @@ __module__ = "roadsPersistence"
 __version__ = "1.0"
 __info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
 
+import math
 import os
+import sys
 import time
-from shapely.geometry import Point, LineString
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import numpy as np
+import shapely
+from shapely.geometry import Point, LineString, box
 from shapely.strtree import STRtree
 import json
 
 from tfm_muaii_rpi4.Environment.env import EnvSingleton
 from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.geolocation.geoMath import LocalProjection, point_segment_distance
+from tfm_muaii_rpi4.Utils.geolocation.speedLimits import offline_speed_limit
 from tfm_muaii_rpi4.Utils.utils import Service, ServiceDB
 
 Logs = LogsSingleton()
@@ -23,13 +31,93 @@ class RoadsDB:
     DB_NAME_CASTELLON = "db_roads_castellon.db"
 
 
-class _RoadsPersistence(Service, ServiceDB):
+class _RoadTile:
+    """
+    Carreteras de una tesela: índice espacial y atributos por posición en el índice, con los textos guardados como
+    códigos de sus valores y la velocidad máxima precalculada
+    """
+    # Memoria estimada de las geometrías en GEOS y Shapely, medida con carreteras sintéticas
+    COORDINATE_BYTES: int = 24
+    GEOMETRY_BYTES: int = 300
+
+    def __init__(self, record_list: list):
+        count = len(record_list)
+        self.road_ids: np.ndarray = np.fromiter((row["id"] for row in record_list), dtype=np.int64, count=count)
+        self.carriles: np.ndarray = np.fromiter(
+            (row["carriles"] if row["carriles"] is not None else -1 for row in record_list), dtype=np.int16,
+            count=count)
+        self.codes: dict = {}
+        self.labels: dict = {}
+        for field in ("sentido", "clase", "tipo_via", "nombre"):
+            self.codes[field], self.labels[field] = self.__encode([row[field] for row in record_list])
+        self.max_speeds: np.ndarray = self.__get_max_speeds()
+        self.strtree: STRtree = STRtree([LineString(json.loads(row["geometry"])["coordinates"])
+                                         for row in record_list])
+        self.memory_usage: int = self.__estimate_memory_usage()
+
+    def get_record(self, index: int) -> dict:
+        """
+        Registro de la carretera en la posición index del índice, sin la geometría y con la velocidad máxima
+        """
+        carriles = int(self.carriles[index])
+        record = {"id": int(self.road_ids[index]), "carriles": carriles if carriles >= 0 else None}
+        for field, codes in self.codes.items():
+            record[field] = self.labels[field][codes[index]]
+        record["max_speed"] = int(self.max_speeds[index])
+        return record
+
+    @staticmethod
+    def __encode(values: list) -> (np.ndarray, list):
+        """
+        :return: Código de cada valor y lista de valores distintos, de modo que values[i] == labels[codes[i]]
+        """
+        labels: dict = {}
+        codes = np.fromiter((labels.setdefault(value, len(labels)) for value in values), dtype=np.int32,
+                            count=len(values))
+        return codes, list(labels)
+
+    def __get_max_speeds(self) -> np.ndarray:
+        """
+        Velocidad máxima de cada carretera, calculada una vez por cada combinación de clase y tipo de vía
+        """
+        clases, tipos_via = self.labels["clase"], self.labels["tipo_via"]
+        pairs = self.codes["clase"].astype(np.int64) * max(len(tipos_via), 1) + self.codes["tipo_via"]
+        unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+        speeds = [offline_speed_limit(clases[pair // len(tipos_via)], tipos_via[pair % len(tipos_via)])
+                  for pair in unique_pairs.tolist()]
+        return np.array(speeds, dtype=np.int16)[inverse]
+
+    def __estimate_memory_usage(self) -> int:
+        arrays = [self.road_ids, self.carriles, self.max_speeds] + list(self.codes.values())
+        labels = sum(sys.getsizeof(label) for labels in self.labels.values() for label in labels)
+        coordinates = int(shapely.get_num_coordinates(self.strtree.geometries).sum())
+        return (sum(array.nbytes for array in arrays) + labels + coordinates * self.COORDINATE_BYTES +
+                len(self.road_ids) * self.GEOMETRY_BYTES)
+
 
+class _RoadsPersistence(Service, ServiceDB):
+    """
+    Carreteras de una provincia, divididas en teselas de tile_size grados. La primera vez que se abre la base de datos
+    con un tamaño de tesela se guarda en la tabla ROAD_TILES la relación entre teselas y carreteras (una carretera
+    pertenece a todas las teselas que cruza su rectángulo envolvente). En memoria solo se mantienen las 3x3 teselas
+    alrededor del vehículo: las que necesita una consulta se cargan al momento, el resto del vecindario y la siguiente
+    fila en la dirección de avance se cargan en segundo plano, y las que quedan a más de EVICT_DISTANCE teselas se
+    descargan.
+    """
     _table_name: str = "ROADS"
     _list_fields: list = ["id", "carriles", "sentido", "clase", "tipo_via", "nombre", "geometry"]
     _list_fields_type: list = ["INTEGER", "INTEGER", "VARCHAR(20)", "VARCHAR(30)", "VARCHAR(20)", "VARCHAR(50)", "JSON"]
     _primary_key: str = "id AUTOINCREMENT"
 
+    _tiles_table_name: str = "ROAD_TILES"
+    _tiles_list_fields: list = ["tile_x", "tile_y", "road_id"]
+    _tiles_list_fields_type: list = ["INTEGER", "INTEGER", "INTEGER"]
+    _tiles_primary_key: str = "tile_x, tile_y, road_id"
+    _tiles_info_table_name: str = "ROAD_TILES_INFO"
+    _tiles_info_list_fields: list = ["tile_size", "roads"]
+    _tiles_info_list_fields_type: list = ["REAL", "INTEGER"]
+    _tiles_info_primary_key: str = "tile_size"
+
     POS_ID: int = 0
     POS_CARRILES: int = 1
     POS_SENTIDO: int = 2
@@ -38,15 +126,26 @@ class _RoadsPersistence(Service, ServiceDB):
     POS_NOMBRE: int = 5
     POS_GEOMETRY: int = 6
 
-    def __init__(self, db_name):
+    SEARCH_RADIUS: float = 100.0  # Radio en metros en el que se buscan las carreteras candidatas
+    TILE_SIZE: float = 0.05       # Grados, unos 5,5 km de latitud y 4,4 km de longitud en la Comunidad Valenciana
+    NEIGHBOURHOOD: int = 1        # Teselas alrededor de la actual que se mantienen cargadas (3x3)
+    EVICT_DISTANCE: int = 2       # Teselas más alejadas de la actual se descargan
+
+    def __init__(self, db_name, tile_size: float = TILE_SIZE):
         Service.__init__(self, __info__, is_thread=False)
+        self.__tile_size: float = tile_size
+        self.__tiles: dict = {}         # (tile_x, tile_y) -> _RoadTile
+        self.__pending: set = set()
+        self.__lock = Lock()
+        self.__executor: ThreadPoolExecutor = None
+        self.__ready: bool = False
+        self.__center: tuple = None
+        self.__loaded_tiles: int = 0
         try:
             if db_name not in (RoadsDB.DB_NAME_ALICANTE, RoadsDB.DB_NAME_VALENCIA, RoadsDB.DB_NAME_CASTELLON):
                 raise Exception(f"El nombre {db_name} no es una base de datos correcta para carreteras")
             self.DB_NAME = db_name
             env = EnvSingleton()
-            self.__line_strings: list = []
-            self.__strtree: STRtree = None
             db_path = env.get_path(env.DB_path)
             ServiceDB.__init__(self, db_name, db_path)
         except Exception as e:
@@ -57,61 +156,238 @@ class _RoadsPersistence(Service, ServiceDB):
             super().start()
             if not os.path.isfile(self.path_db):
                 raise Exception(f"No existe la base de datos {self.path_db}")
-            self.__load_road_db()
+            self.__prepare_tiles()
+            self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"THREAD_{__module__}")
+            self.__ready = True
         except Exception as e:
             super().critical_error(e, "start")
 
     def stop(self):
         try:
+            # Con el cerrojo tomado, ninguna consulta en curso puede solicitar teselas tras parar el cargador
+            with self.__lock:
+                self.__ready = False
+                self.__tiles.clear()
+                self.__pending.clear()
+                executor, self.__executor = self.__executor, None
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
             super().stop()
         except Exception as e:
             super().critical_error(e, "stop")
 
-    def __load_road_db(self) -> None:
-        #TODO: Cargar la base de datos que toca, por como lo tenía hecho se tendría que hacer en el arranque, analizar
-        # si realmente tiene que ser así
+    def __prepare_tiles(self) -> None:
+        """
+        Comprueba que la relación entre teselas y carreteras está generada para el tamaño de tesela configurado, y la
+        genera si no lo está
+        """
+        if not (self.create_table(self._tiles_table_name, self._tiles_list_fields, self._tiles_list_fields_type,
+                                  self._tiles_primary_key) and
+                self.create_table(self._tiles_info_table_name, self._tiles_info_list_fields,
+                                  self._tiles_info_list_fields_type, self._tiles_info_primary_key)):
+            raise Exception(f"Error al crear las tablas de teselas en {self.path_db}")
+        sql = f"SELECT {', '.join(self._tiles_info_list_fields)} FROM {self._tiles_info_table_name}"
+        res, record_list = self._db.query_sql(sql, (), self._tiles_info_list_fields)
+        if res and len(record_list) == 1 and math.isclose(record_list[0]["tile_size"], self.__tile_size):
+            return
+        self.__build_tiles()
 
-        #TODO: Quizás debería hacerlo a nivel de gpsController, pero entonces cada vez que cree una instancia de esta
-        # base de datos voy a tener que pasarle el nombre de la base de datos. ¿Utilizar nombre de provincia? Si ya está
-        # cargada, se puede utilizar, si no lo está o es diferente, entonces se vuelve a cargar.
-        Logs.get_logger().debug(f"Iniciando carga de geometrias de {self.DB_NAME}", extra=__info__)
-        init_load_db_time = time.time()
-        fields: list = list()
-        params: list = list()
-        fields.append(self._list_fields[self.POS_ID])
-        fields.append(self._list_fields[self.POS_GEOMETRY])
+    def __build_tiles(self) -> None:
+        Logs.get_logger().info(f"Generando teselas de {self.__tile_size} grados de {self.DB_NAME}", extra=__info__)
+        init_build_time = time.time()
+        fields: list = [self._list_fields[self.POS_ID], self._list_fields[self.POS_GEOMETRY]]
         sql = f"SELECT {', '.join(fields)} FROM {self._table_name}"
-        res, record_list = self._db.query_sql(sql, tuple(params), fields)
-        self.__line_strings = [(row[fields[0]], LineString(json.loads(row[fields[1]])["coordinates"])) for row in record_list]
-        self.__strtree = STRtree([geom for _, geom in self.__line_strings])
-        load_db_time = time.time() - init_load_db_time
-        Logs.get_logger().debug(f"Carga de geometrias de {self.DB_NAME} cargada en {load_db_time:.2f} s", extra=__info__)
+        res, record_list = self._db.query_sql(sql, (), fields)
+        if not res:
+            raise Exception(f"Error al leer las carreteras de {self.path_db}")
+        tiles: list = []
+        for row in record_list:
+            coordinates = np.asarray(json.loads(row["geometry"])["coordinates"], dtype=np.float64)[:, :2]
+            (min_x, min_y), (max_x, max_y) = (self.__get_tile_key(*coordinates.min(axis=0)),
+                                              self.__get_tile_key(*coordinates.max(axis=0)))
+            tiles.extend((tile_x, tile_y, row["id"]) for tile_x in range(min_x, max_x + 1)
+                         for tile_y in range(min_y, max_y + 1))
+        if not (self._db.update_sql(f"DELETE FROM {self._tiles_table_name}", ()) and
+                self._db.update_sql(f"DELETE FROM {self._tiles_info_table_name}", ()) and
+                self._db.insert_many_sql(f"INSERT INTO {self._tiles_table_name} "
+                                         f"({', '.join(self._tiles_list_fields)}) VALUES (?, ?, ?)", tiles) and
+                self._db.insert_sql(f"INSERT INTO {self._tiles_info_table_name} "
+                                    f"({', '.join(self._tiles_info_list_fields)}) VALUES (?, ?)",
+                                    (self.__tile_size, len(record_list)))):
+            raise Exception(f"Error al guardar las teselas en {self.path_db}")
+        build_time = time.time() - init_build_time
+        Logs.get_logger().info(f"Teselas de {self.DB_NAME} generadas en {build_time:.2f} s: {len(record_list)} "
+                               f"carreteras en {len({tile[:2] for tile in tiles})} teselas", extra=__info__)
 
-    def get_record_by_coordinates(self, coords: tuple) -> dict:
-        Logs.get_logger().debug(f"Obteniendo carretera actual...", extra=__info__)
-        init_get_road_time = time.time()
-        while self.__strtree is None:
-            Logs.get_logger().warning("Esperando carga de carreteras, proxima intento en 10 segundos", extra=__info__)
-            time.sleep(10)
+    def __get_tile_key(self, longitude: float, latitude: float) -> tuple:
+        return int(math.floor(longitude / self.__tile_size)), int(math.floor(latitude / self.__tile_size))
+
+    def __load_tile(self, key: tuple) -> _RoadTile:
+        """
+        :return: Tesela cargada, None si las carreteras se han cerrado mientras se cargaba
+        """
+        init_load_time = time.time()
         fields: list = list()
-        params: list = list()
         for i in range(0, len(self._list_fields)):
             fields.append(self._list_fields[i])
-        point = Point(coords)
-        nearest_line_index = self.__strtree.nearest(point)
-        nearest_road_index = next(id for id, geom in self.__line_strings if geom.equals(self.__line_strings[nearest_line_index][1]))
-        params.append(nearest_road_index)
-        sql = f"SELECT {', '.join(fields)} FROM {self._table_name} WHERE id = ?"
-        res, record_list = self._db.query_sql(sql, tuple(params), fields)
+        sql = (f"SELECT {', '.join('r.' + field for field in fields)} FROM {self._table_name} r "
+               f"JOIN {self._tiles_table_name} t ON t.road_id = r.id WHERE t.tile_x = ? AND t.tile_y = ?")
+        res, record_list = self._db.query_sql(sql, key, fields)
+        if not res:
+            raise Exception(f"Error al leer la tesela {key} de {self.path_db}")
+        tile = _RoadTile(record_list)
+        with self.__lock:
+            self.__pending.discard(key)
+            if not self.__ready:
+                return None
+            tile = self.__tiles.setdefault(key, tile)
+            self.__loaded_tiles += 1
+        Logs.get_logger().debug(f"Tesela {key} de {self.DB_NAME} con {len(record_list)} carreteras cargada en "
+                                f"{time.time() - init_load_time:.2f} s", extra=__info__)
+        return tile
+
+    def __load_tile_background(self, key: tuple) -> None:
+        try:
+            # El vehículo puede haberse alejado desde la solicitud
+            with self.__lock:
+                ready, center = self.__ready, self.__center
+            if not ready or max(abs(key[0] - center[0]), abs(key[1] - center[1])) > self.EVICT_DISTANCE:
+                with self.__lock:
+                    self.__pending.discard(key)
+                return
+            self.__load_tile(key)
+        except Exception as e:
+            with self.__lock:
+                self.__pending.discard(key)
+            Logs.get_logger().error(f"Error al cargar la tesela {key} de {self.DB_NAME}: {e}", extra=__info__)
+
+    def __get_tile(self, key: tuple) -> _RoadTile:
+        """
+        Tesela cargada, o cargada en el momento si no lo está. None si las carreteras se han cerrado.
+        """
+        with self.__lock:
+            if not self.__ready:
+                return None
+            tile = self.__tiles.get(key)
+        return tile if tile is not None else self.__load_tile(key)
+
+    def __update_neighbourhood(self, center: tuple, heading: float) -> bool:
+        """
+        Solicita en segundo plano las teselas del vecindario de center que faltan y, con rumbo conocido, las de la fila
+        siguiente en la dirección de avance. Descarga las teselas alejadas.
+        :return: Carreteras abiertas (True) - Cerradas (False)
+        """
+        center_x, center_y = center
+        offsets = range(-self.NEIGHBOURHOOD, self.NEIGHBOURHOOD + 1)
+        keys = {(center_x + i, center_y + j) for i in offsets for j in offsets}
+        if heading is not None:
+            step_x, step_y = round(math.sin(math.radians(heading))), round(math.cos(math.radians(heading)))
+            keys |= {(center_x + step_x + i, center_y + step_y + j) for i in offsets for j in offsets}
+        with self.__lock:
+            if not self.__ready:
+                return False
+            self.__center = center
+            for key in list(self.__tiles):
+                if max(abs(key[0] - center_x), abs(key[1] - center_y)) > self.EVICT_DISTANCE:
+                    del self.__tiles[key]
+            requested = [key for key in keys if key not in self.__tiles and key not in self.__pending]
+            self.__pending.update(requested)
+            for key in requested:
+                self.__executor.submit(self.__load_tile_background, key)
+        return True
+
+    def is_loaded(self) -> bool:
+        return self.__ready
+
+    def get_memory_usage(self) -> int:
+        """
+        :return: Memoria estimada en bytes de las teselas cargadas
+        """
+        with self.__lock:
+            return sum(tile.memory_usage for tile in self.__tiles.values())
+
+    def get_tile_stats(self) -> dict:
+        with self.__lock:
+            return {"tiles": len(self.__tiles), "pending": len(self.__pending), "loaded_total": self.__loaded_tiles,
+                    "memory_mb": round(sum(tile.memory_usage for tile in self.__tiles.values()) / (1024 * 1024), 2)}
+
+    def get_record_by_coordinates(self, coords: tuple, heading: float = None) -> dict:
+        """
+        :param coords: Coordenadas (longitud, latitud)
+        :param heading: Rumbo del vehículo en grados, para precargar las teselas hacia las que avanza
+        :return: Registro de la carretera más cercana, None si las carreteras no están disponibles o no hay ninguna en
+        las teselas cercanas
+        """
+        Logs.get_logger().debug(f"Obteniendo carretera actual...", extra=__info__)
+        init_get_road_time = time.time()
+        if not self.__ready:
+            Logs.get_logger().warning(f"Carreteras de {self.DB_NAME} no cargadas", extra=__info__)
+            return None
+        tile, index = self.__get_nearest_road(coords, heading)
+        if tile is None:
+            return None
+        record = tile.get_record(index)
         get_road_time = time.time() - init_get_road_time
-        Logs.get_logger().debug(f"Carretera actual obtenida en {get_road_time:.2f} s", extra=__info__)
-        return record_list[0]
+        Logs.get_logger().debug(f"Carretera actual obtenida en {get_road_time * 1000:.2f} ms", extra=__info__)
+        return record
 
+    def get_nearest_road_id(self, coords: tuple, heading: float = None) -> int:
+        """
+        :return: Id de la carretera más cercana a las coordenadas (longitud, latitud), None si las carreteras no están
+        disponibles o no hay ninguna en las teselas cercanas
+        """
+        if not self.__ready:
+            return None
+        tile, index = self.__get_nearest_road(coords, heading)
+        return int(tile.road_ids[index]) if tile is not None else None
 
-class RoadPersistenceSingleton:
-    __instance = None
+    def __get_nearest_road(self, coords: tuple, heading: float) -> (_RoadTile, int):
+        """
+        Carretera más cercana en metros a las coordenadas (longitud, latitud). El índice espacial de las teselas que
+        cruza el rectángulo de búsqueda selecciona las carreteras en un radio de SEARCH_RADIUS metros y la distancia a
+        sus segmentos se calcula en el plano local del punto; el vecino más cercano del índice en grados no es el más
+        cercano en metros, ya que un grado de longitud mide menos que uno de latitud. Sin carreteras en el radio, se
+        busca la más cercana de las teselas cargadas del vecindario.
+        :return: Tesela y posición de la carretera en su índice, (None, None) si no hay ninguna
+        """
+        longitude, latitude = coords
+        projection = LocalProjection(latitude, longitude)
+        east_scale, north_scale = projection.get_meters_per_degree()
+        bounds = (longitude - self.SEARCH_RADIUS / east_scale, latitude - self.SEARCH_RADIUS / north_scale,
+                  longitude + self.SEARCH_RADIUS / east_scale, latitude + self.SEARCH_RADIUS / north_scale)
+        (min_x, min_y), (max_x, max_y) = self.__get_tile_key(*bounds[:2]), self.__get_tile_key(*bounds[2:])
+        search_box = box(*bounds)
+        candidates: list = []
+        for key in [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]:
+            tile = self.__get_tile(key)
+            if tile is None:
+                return None, None
+            indexes = tile.strtree.query(search_box)
+            if len(indexes) > 0:
+                candidates.append((tile, indexes))
+        if not self.__update_neighbourhood(self.__get_tile_key(longitude, latitude), heading):
+            return None, None
+        if len(candidates) == 0:
+            with self.__lock:
+                tiles = list(self.__tiles.values())
+            for tile in tiles:
+                index = tile.strtree.nearest(Point(coords))
+                if index is not None:
+                    candidates.append((tile, np.array([index])))
+        if len(candidates) == 0:
+            return None, None
+        if len(candidates) == 1 and len(candidates[0][1]) == 1:
+            return candidates[0][0], int(candidates[0][1][0])
 
-    def __new__(cls, db_name):
-        if RoadPersistenceSingleton.__instance is None:
-            RoadPersistenceSingleton.__instance = _RoadsPersistence(db_name)
-        return RoadPersistenceSingleton.__instance
\ No newline at end of file
+        points, lines, owners = [], [], []
+        for tile, indexes in candidates:
+            tile_points, tile_lines = shapely.get_coordinates(tile.strtree.geometries.take(indexes), return_index=True)
+            points.append(tile_points)
+            lines.append(tile_lines + len(owners))
+            owners.extend((tile, int(index)) for index in indexes)
+        points, lines = np.concatenate(points), np.concatenate(lines)
+        east, north = projection.to_enu(points[:, 1], points[:, 0])
+        distances = point_segment_distance(0.0, 0.0, east[:-1], north[:-1], east[1:], north[1:])
+        # Los segmentos entre el final de una carretera y el inicio de la siguiente no existen
+        distances[lines[:-1] != lines[1:]] = np.inf
+        return owners[lines[np.argmin(distances)]]
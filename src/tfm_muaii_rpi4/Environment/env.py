@@ -18,6 +18,7 @@ class _Env:
     DEFAULT = "test"
     PATHS = "paths"
     HOSTS = "hosts"
+    SERVICES = "services"
 
     # variables
     font_path = "font_path"
@@ -32,6 +33,11 @@ class _Env:
     raspberry = "raspberry"
     IP = "IP"
 
+    # servicios
+    people_detector = "people_detector"
+    gps_controller = "gps_controller"
+    connectivity_monitor = "connectivity_monitor"
+
     def __init__(self):
         env: str = os.getenv("APP_ENVIRONMENT")
         if env is None:
@@ -68,6 +74,14 @@ class _Env:
             logging.error(f"No existe el host {service}", extra=__info__)
             return None
 
+    def get_service_conf(self, service: str) -> dict:
+        if self.SERVICES in self._conf and service in self._conf[self.SERVICES]:
+            return self._conf[self.SERVICES][service]
+        else:
+            logging.warning(f"No existe configuración para el servicio {service}, se usan valores por defecto",
+                            extra=__info__)
+            return {}
+
     def get_app_path(self) -> str:
         return self.app_path
 
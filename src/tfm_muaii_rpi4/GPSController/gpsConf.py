@@ -0,0 +1,37 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "GPSController"
+__module__ = "gpsConf"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+
+
+class GPSConf:
+    """
+    Configuración del controlador GPS (sección services.gps_controller de settings.json) con sus valores por defecto.
+    """
+    PORT: str = "/dev/ttyAMA4"
+    BAUDRATE: int = 9600
+    TIMEOUT: float = 0.5
+    LOCATION_PERIOD: float = 10.0
+    UBX_ENABLED: bool = False
+    UBX_BAUDRATE: int = 115200
+    UBX_RATE_HZ: float = 5.0
+    UBX_MESSAGES: list = ["NAV-PVT", "NAV-SOL"]
+
+    def __init__(self):
+        env = EnvSingleton()
+        self.__conf: dict = env.get_service_conf(env.gps_controller)
+        self.port: str = self.__conf.get("port", self.PORT)
+        self.baudrate: int = int(self.__conf.get("baudrate", self.BAUDRATE))
+        self.timeout: float = float(self.__conf.get("timeout", self.TIMEOUT))
+        self.location_period: float = float(self.__conf.get("location_period", self.LOCATION_PERIOD))
+        self.motion: dict = self.__conf.get("motion", {})
+        self.geocoding: dict = self.__conf.get("geocoding", {})
+        ubx: dict = self.__conf.get("ubx", {})
+        self.ubx_enabled: bool = bool(ubx.get("enabled", self.UBX_ENABLED))
+        self.ubx_baudrate: int = int(ubx.get("baudrate", self.UBX_BAUDRATE))
+        self.ubx_rate_hz: float = float(ubx.get("rate_hz", self.UBX_RATE_HZ))
+        self.ubx_messages: list = ubx.get("messages", self.UBX_MESSAGES)
+        self.ubx_keep_nmea: list = ubx.get("keep_nmea", [])
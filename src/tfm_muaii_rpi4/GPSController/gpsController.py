@@ -7,30 +7,38 @@ __info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __
 import time
 
 from tfm_muaii_rpi4.Logger.logger import LogsSingleton
-from tfm_muaii_rpi4.DataPersistence.roadsPersistence import RoadPersistenceSingleton
+from tfm_muaii_rpi4.DataPersistence.roadIndexManager import RoadIndexManagerSingleton
 from tfm_muaii_rpi4.DataPersistence.municipiosPersistence import MunicipiosPersistenceSingleton
 from tfm_muaii_rpi4.DataPersistence.contextVarsMgr import ContextVarsMgrSingleton, ContextVarsConst, DefaultVarsConst
-from tfm_muaii_rpi4.Utils.geolocation.NEO6Mv2 import NEO6Mv2
+from tfm_muaii_rpi4.GPSController.gpsConf import GPSConf
+from tfm_muaii_rpi4.GPSController.locationEnricher import LocationEnricher
+from tfm_muaii_rpi4.Utils.geolocation.NEO6Mv2 import NEO6Mv2, GpsFix
 from tfm_muaii_rpi4.Utils.geolocation.geoUtils import Coordinates, GeoUtils
-from tfm_muaii_rpi4.Utils.utils import Service, internet_access
+from tfm_muaii_rpi4.Utils.geolocation.motionEstimator import MotionEstimator
+from tfm_muaii_rpi4.Utils.network.connectivityMonitor import ConnectivityMonitorSingleton
+from tfm_muaii_rpi4.Utils.utils import Service
 
 Logs = LogsSingleton()
 
 
 class _GPSController(Service):
-    PORT: str = "/dev/ttyAMA4"
-    BAUDRATE: int = 9600
-    TIMEOUT: float = 0.5
+    FIX_TIMEOUT: float = 5.0  # Sin fijaciones nuevas durante este tiempo el GPS se considera no disponible
 
     def __init__(self):
         super().__init__(__info__, is_thread=True)
         self._context_vars = ContextVarsMgrSingleton()
         self._municipios_pers = MunicipiosPersistenceSingleton()
-        self._roads_pers: RoadPersistenceSingleton = None
-        self._geo_utils = GeoUtils()
+        self._connectivity = ConnectivityMonitorSingleton()
+        self._road_index = RoadIndexManagerSingleton()
+        self.__conf = GPSConf()
+        self._geo_utils = GeoUtils(self.__conf.geocoding)
         self.__gps_module: NEO6Mv2 = None
+        self.__current_fix: GpsFix = None
+        self.__last_fix_sequence: int = 0
+        self.__motion_estimator = MotionEstimator(self.__conf.motion)
         self.__current_coordinates: Coordinates = None
-        self.__last_coordinates: Coordinates = None
+        self.__last_location_update: float = 0.0
+        self.__location_enricher = LocationEnricher(self.__get_speed_and_location_info, self.__set_location_info)
         self.__gps_ready: bool = False
         self.sleep_period = 10
 
@@ -43,14 +51,27 @@ class _GPSController(Service):
                     time.sleep(30)
                 break
             self._municipios_pers.start()
+            self._connectivity.start()
+            self._road_index.start()
+            self.__location_enricher.start()
             super().start()
         except Exception as e:
             super().critical_error(e, "start")
 
     def _start_gps(self) -> bool:
         try:
-            self.__gps_module = NEO6Mv2(self.PORT, self.BAUDRATE, self.TIMEOUT)
-            return self.__gps_module.open()
+            self.__gps_module = NEO6Mv2(self.__conf.port, self.__conf.baudrate, self.__conf.timeout)
+            # La secuencia de fijaciones del nuevo módulo empieza de nuevo en 0
+            self.__last_fix_sequence = 0
+            if not self.__gps_module.open():
+                return False
+            self.__gps_module.start_reader()
+            if self.__conf.ubx_enabled and not self.__gps_module.configure_ubx(
+                    self.__conf.ubx_baudrate, self.__conf.ubx_rate_hz, self.__conf.ubx_messages,
+                    self.__conf.ubx_keep_nmea):
+                Logs.get_logger().warning("No se pudo configurar el receptor GPS por UBX, se mantiene NMEA",
+                                          extra=__info__)
+            return True
         except Exception as e:
             Logs.get_logger().error(f"Error al iniciar GPS: {e}", extra=__info__)
             return False
@@ -58,6 +79,9 @@ class _GPSController(Service):
     def stop(self):
         try:
             self.__stop_gps()
+            self.__location_enricher.stop()
+            self._connectivity.stop()
+            self._road_index.stop()
             super().stop()
         except Exception as e:
             super().critical_error(e, "stop")
@@ -71,116 +95,114 @@ class _GPSController(Service):
             return False
 
     def _run(self):
-        while not super().need_stop() and not self.is_gps_ready():
-            super().sleep_period()
-            self.__check_gps(sentences_to_read=10)
         while not super().need_stop():
             try:
-                if self.is_gps_ready():
-                    if not self.__read_gps_sentence():
-                        self.__set_gps_ready(False)
-                        super().sleep_period()
-                        continue
-                    if self.__set_initial_coordinates():
-                        continue
-                    if self.__process_current_coordinates():
-                        continue
-                    self.__update_vehicle_status()
-                    self.__update_location_info()
-                else:
-                    self.__check_gps(sentences_to_read=5)
-                super().sleep_period()
+                # El movimiento se estima con cada fijación. La ubicación se solicita cada location_period segundos
+                # al hilo de LocationEnricher, que la publica al obtenerla sin detener la lectura de fijaciones
+                if not self.__wait_gps_fix():
+                    super().sleep_period()
+                    continue
+                if self.__process_current_coordinates():
+                    continue
+                self.__update_vehicle_status()
+                if time.time() - self.__last_location_update >= self.__conf.location_period:
+                    self.__last_location_update = time.time()
+                    self.__location_enricher.submit(self.__current_coordinates)
             except Exception as e:
                 Logs.get_logger().error(f"Error hilo GPS: {e}", extra=__info__)
 
-    def __check_gps(self, sentences_to_read: int):
-        for i in range(sentences_to_read):
-            try:
-                res = self.__gps_module.read_sentence()
-                if res is None:
-                    self.__set_default_gps_context_vars()
-                    Logs.get_logger().warning("Servicio GPS no disponible, próximo intento en 30 segundos",
-                                              extra=__info__)
-                    self.sleep_period = 30
-                    break
-                if not self.is_gps_ready() and res is True:
-                    self.__set_gps_ready(True)
-                time.sleep(0.1)
-            except UnicodeDecodeError:
-                Logs.get_logger().error("Sentencia NMEA del módulo GPS incompleta.", extra=__info__)
-            except Exception as e:
-                self.sleep_period = 10
-                Logs.get_logger().error(f"Error al leer sentencia NMEA del GPS: {e}", extra=__info__)
-
-    def __read_gps_sentence(self) -> bool:
-        res = self.__gps_module.read_sentence()
-        if res is None:
+    def __wait_gps_fix(self) -> bool:
+        """
+        Obtiene la fijación más reciente publicada por el lector del módulo GPS, esperando como mucho FIX_TIMEOUT
+        segundos si no hay ninguna nueva desde la última procesada
+        :return: Fijación nueva disponible (True) - GPS no disponible (False)
+        """
+        if not self.__gps_module.is_reader_alive():
+            Logs.get_logger().warning("Lector del módulo GPS detenido, se reinicia la conexión serie", extra=__info__)
+            self.__gps_module.close()
+            self._start_gps()
+        fix = self.__gps_module.wait_for_fix(self.__last_fix_sequence, self.FIX_TIMEOUT)
+        if fix is None:
+            if self.is_gps_ready():
+                Logs.get_logger().warning(f"Sin fijaciones del módulo GPS en {self.FIX_TIMEOUT} s", extra=__info__)
+                self.__set_default_gps_context_vars()
             return False
-        return res
+        self.__current_fix = fix
+        self.__last_fix_sequence = fix.sequence
+        self.__set_gps_ready(True)
+        return True
 
     def __set_default_gps_context_vars(self) -> None:
         Logs.get_logger().warning("Cargando valores por defecto para el módulo GPS", extra=__info__)
         self.__set_gps_ready(False)
         self.__current_coordinates = None
+        self.__motion_estimator.reset()
         self._context_vars.set_context_var(ContextVarsConst.COORDENADAS_GPS, Coordinates(0, 0))
         self._context_vars.set_context_var(ContextVarsConst.VELOCIDAD_ACTUAL, DefaultVarsConst.CURRENT_SPEED)
         self._context_vars.set_context_var(ContextVarsConst.VELOCIDAD_MAXIMA, DefaultVarsConst.MAX_SPEED)
         self._context_vars.set_context_var(ContextVarsConst.UBICACION_INFO, DefaultVarsConst.LOCATION_INFO)
 
-    def __set_initial_coordinates(self) -> bool:
-        if self.__current_coordinates is None:
-            self.__current_coordinates = self.get_coordinates()
-            return True
-        self.__last_coordinates = self.__current_coordinates
-        return False
-
     def __process_current_coordinates(self) -> bool:
         """
-        Método encargado de procesar las coordenadas actuales y las anteriores. En caso de no que no sean válidas, se
+        Método encargado de procesar las coordenadas de la última fijación. En caso de no que no sean válidas, se
         deberán volver a procesar.
         :return bool: Coordenadas no validas (True) - Coordenadas validas (False)
         """
-        if not self.__last_coordinates.valid_coordinates():
-            self.__set_default_gps_context_vars()
-            return True
-        self.__current_coordinates = self.get_coordinates()
+        self.__current_coordinates = self.__current_fix.coordinates
         if not self.__current_coordinates.valid_coordinates():
             self.__set_default_gps_context_vars()
             return True
         return False
 
     def __update_vehicle_status(self) -> None:
-        current_speed = self._geo_utils.calculate_speed(self.__last_coordinates, self.__current_coordinates)
-        Logs.get_logger().info(f"Velocidad actual: {current_speed} km/h", extra=__info__)
+        motion = self.__motion_estimator.update(self.__current_fix)
+        current_speed = round(motion.speed)
+        Logs.get_logger().debug(f"Velocidad actual: {current_speed} km/h, rumbo {motion.heading}", extra=__info__)
         self._context_vars.set_context_var(ContextVarsConst.VELOCIDAD_ACTUAL, current_speed)
-        # TODO: Cambiar a: current_speed < 2 o current_speed < 5?
-        self._context_vars.set_context_var(ContextVarsConst.VEHICULO_PARADO, current_speed == 0)
+        self._context_vars.set_context_var(ContextVarsConst.VEHICULO_PARADO, motion.stopped)
 
-    def __update_location_info(self) -> None:
-        max_speed, location_info = self.__get_speed_and_location_info()
+    def __set_location_info(self, max_speed: int, location_info: str) -> None:
+        """
+        Publica el resultado de LocationEnricher, salvo si el GPS dejó de estar disponible mientras se obtenía
+        """
+        if not self.is_gps_ready():
+            return
         self._context_vars.set_context_var(ContextVarsConst.VELOCIDAD_MAXIMA, max_speed)
         self._context_vars.set_context_var(ContextVarsConst.UBICACION_INFO, location_info)
 
-    def __get_speed_and_location_info(self) -> (int, str):
-        if internet_access():
-            max_speed, location_info = self._geo_utils.get_online_max_speed_and_location(self.__current_coordinates)
-            self.__update_online_road_persistence(location_info)
-            return max_speed, location_info
+    def __get_speed_and_location_info(self, coordinates: Coordinates) -> (int, str):
+        """
+        Se ejecuta en el hilo de LocationEnricher
+        """
+        if self._connectivity.is_online():
+            try:
+                max_speed, location_info = self._geo_utils.get_online_max_speed_and_location(coordinates)
+                Logs.get_logger().debug(f"Caché de geolocalización: {self._geo_utils.get_cache_stats()}",
+                                        extra=__info__)
+                self.__update_online_road_persistence(location_info)
+                return max_speed, location_info
+            except Exception as e:
+                Logs.get_logger().warning(f"Error en la geolocalización online, se usa la offline: {e}", extra=__info__)
+                self._connectivity.request_probe()
         else:
             Logs.get_logger().warning("No hay conexión a internet para realizar la geolocalización", extra=__info__)
-            current_municipio = self._municipios_pers.get_current_municipio()
-            record_municipio = self._municipios_pers.get_record_municipio(self.__current_coordinates)
-            provincia = self._municipios_pers.get_current_provincia()
-            if self._roads_pers is None or record_municipio["municipio"] != current_municipio:
-                road_db_name = self._geo_utils.convert_provincia_to_road_db(provincia)
-                self._roads_pers = RoadPersistenceSingleton(road_db_name)
-                self._roads_pers.start()
-            current_road = self._roads_pers.get_record_by_coordinates(self.__current_coordinates.get_coordinates()[::-1])
-            self.__current_road_name = current_road["nombre"]
-            current_road.update({"provincia": provincia})
-            current_road.update({"municipio": record_municipio["municipio"]})
-            self.__update_offline_road_persistence(current_road)
-            return self._geo_utils.get_offline_max_speed_and_location(current_road)
+        return self.__get_offline_speed_and_location_info(coordinates)
+
+    def __get_offline_speed_and_location_info(self, coordinates: Coordinates) -> (int, str):
+        record_municipio = self._municipios_pers.get_record_municipio(coordinates)
+        provincia = self._municipios_pers.get_current_provincia()
+        # Al cambiar de provincia sus carreteras se cargan en segundo plano; mientras, se usan los valores por defecto
+        road_db_name = self._geo_utils.convert_provincia_to_road_db(provincia)
+        motion = self.__motion_estimator.get_state()
+        current_road = self._road_index.get_record_by_coordinates(road_db_name, coordinates.get_lon_lat(),
+                                                                  motion.heading if motion is not None else None)
+        if current_road is None:
+            return DefaultVarsConst.MAX_SPEED, DefaultVarsConst.LOCATION_INFO
+        self.__current_road_name = current_road["nombre"]
+        current_road.update({"provincia": provincia})
+        current_road.update({"municipio": record_municipio["municipio"]})
+        self.__update_offline_road_persistence(current_road)
+        return self._geo_utils.get_offline_max_speed_and_location(current_road)
 
     def __update_online_road_persistence(self, road_info: str):
         pass
@@ -0,0 +1,83 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "GPSController"
+__module__ = "locationEnricher"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import queue
+import time
+
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.geolocation.geoUtils import Coordinates
+from tfm_muaii_rpi4.Utils.utils import Service
+
+Logs = LogsSingleton()
+
+
+class LocationEnricher(Service):
+    """
+    Obtención de la velocidad máxima y la descripción de la ubicación en un hilo propio, ya que puede bloquearse en la
+    geolocalización online o en la carga de las carreteras de una provincia. El controlador GPS encola las coordenadas
+    sin esperar y sigue procesando fijaciones; la cola es acotada y, si está llena, las coordenadas más antiguas se
+    descartan, ya que solo interesa la ubicación más reciente.
+    """
+    QUEUE_SIZE: int = 1
+    QUEUE_TIMEOUT: float = 1.0
+
+    def __init__(self, enrich_function, result_function, queue_size: int = QUEUE_SIZE):
+        """
+        :param enrich_function: Función que devuelve la velocidad máxima y la ubicación de unas coordenadas
+        :param result_function: Función que recibe la velocidad máxima y la ubicación obtenidas
+        :param queue_size: Coordenadas pendientes como máximo
+        """
+        super().__init__(__info__, is_thread=True)
+        self.__enrich_function = enrich_function
+        self.__result_function = result_function
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__discarded: int = 0
+        self.__processed: int = 0
+
+    def start(self):
+        try:
+            super().start()
+        except Exception as e:
+            super().critical_error(e, "start")
+
+    def stop(self):
+        try:
+            super().stop()
+        except Exception as e:
+            super().critical_error(e, "stop")
+
+    def submit(self, coordinates: Coordinates) -> None:
+        """
+        Encola unas coordenadas sin bloquear, descartando las más antiguas si la cola está llena
+        """
+        while True:
+            try:
+                self.__queue.put_nowait(coordinates)
+                return
+            except queue.Full:
+                try:
+                    self.__queue.get_nowait()
+                    self.__discarded += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while not super().need_stop():
+            try:
+                coordinates = self.__queue.get(timeout=self.QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+            try:
+                init_time = time.time()
+                max_speed, location_info = self.__enrich_function(coordinates)
+                self.__result_function(max_speed, location_info)
+                self.__processed += 1
+                Logs.get_logger().debug(f"Ubicación obtenida en {time.time() - init_time:.2f} s", extra=__info__)
+            except Exception as e:
+                Logs.get_logger().error(f"Error al obtener la información de la ubicación: {e}", extra=__info__)
+
+    def get_stats(self) -> dict:
+        return {"pending": self.__queue.qsize(), "processed": self.__processed, "discarded": self.__discarded}
@@ -0,0 +1,132 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "benchmark"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Benchmark del detector de personas sin cámara, en cualquier equipo Linux. Ejecuta las etapas de detección y recuento
+# sobre un corpus fijo de imágenes (o un vídeo, o fotogramas sintéticos) fotograma a fotograma, sin descartar ninguno,
+# y reporta fotogramas/s, latencias p50/p95/p99 por etapa y el pico de memoria residente:
+#     python -m tfm_muaii_rpi4.PeopleDetector.benchmark --source images --path /ruta/imagenes
+#     python -m tfm_muaii_rpi4.PeopleDetector.benchmark --source synthetic --frames 300 --output informe.json
+# Con varias cámaras configuradas, el mismo fotograma ocupa la entrada de todas ellas.
+
+import argparse
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectionPipeline import DetectionPipeline, DetectorStages
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.frameSource import FrameSource, FrameSources, create_frame_source
+from tfm_muaii_rpi4.PeopleDetector.peopleTracker import PeopleTracker
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
+from tfm_muaii_rpi4.Utils.metrics.memoryStats import get_peak_rss_mb, get_rss_mb
+
+BENCHMARK_STAGES: list = [DetectorStages.CAPTURE, DetectorStages.PREPROCESS, DetectorStages.FORWARD,
+                          DetectorStages.NMS, DetectorStages.COUNT]
+SYNTHETIC_FRAMES: int = 300
+
+
+def run_benchmark(conf: DetectorConf, source: FrameSource, max_frames: int, warmup_runs: int) -> dict:
+    """
+    Ejecuta el benchmark sobre la fuente hasta agotarla o alcanzar max_frames
+    :param conf: Configuración del detector
+    :param source: Fuente de fotogramas
+    :param max_frames: Número máximo de fotogramas, 0 para recorrer la fuente completa
+    :param warmup_runs: Inferencias de calentamiento antes de medir
+    """
+    stats = LatencyStats(BENCHMARK_STAGES, window=max(max_frames, LatencyStats.WINDOW))
+    rss_init = get_rss_mb()
+    pipeline = DetectionPipeline(conf, stats)
+    pipeline.load_model(warmup_runs)
+    rss_model = get_rss_mb()
+    trackers: list = [PeopleTracker(conf.tracker) for _ in conf.cameras]
+    capture_width, capture_height = conf.capture_size
+    frame = np.empty((capture_height, capture_width, 3), dtype=np.uint8)
+
+    frames = 0
+    counts: list = []
+    init_time = time.perf_counter()
+    while max_frames == 0 or frames < max_frames:
+        with stats.measure(DetectorStages.CAPTURE):
+            if not source.read(frame):
+                break
+        preds, _ = pipeline.detect([frame] * len(trackers))
+        with stats.measure(DetectorStages.COUNT):
+            now = time.time()
+            counts.append(sum(tracker.update(pred[:, :5].cpu().numpy(), now)
+                              for tracker, pred in zip(trackers, preds)))
+        frames += 1
+    elapsed = time.perf_counter() - init_time
+
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "model": conf.model_name,
+        "backend": conf.backend,
+        "quantized": conf.quantized,
+        "input_shape": list(pipeline.get_input_shape()),
+        "cameras": len(trackers),
+        "frames": frames,
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_people": round(float(np.mean(counts)), 3) if counts else 0.0,
+        "rss_model_mb": round(rss_model - rss_init, 2),
+        "peak_rss_mb": round(get_peak_rss_mb(), 2),
+        "stages": stats.summary()
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark del detector de personas sin cámara")
+    parser.add_argument("--source", choices=[FrameSources.IMAGES, FrameSources.VIDEO, FrameSources.SYNTHETIC],
+                        default=FrameSources.IMAGES, help="Fuente de fotogramas")
+    parser.add_argument("--path", default=None,
+                        help="Carpeta de imágenes o fichero de vídeo, por defecto images_test_path")
+    parser.add_argument("--frames", type=int, default=0,
+                        help="Número de fotogramas; por defecto el corpus completo una vez (300 en sintético)")
+    parser.add_argument("--warmup", type=int, default=DetectionPipeline.WARMUP_RUNS,
+                        help="Inferencias de calentamiento antes de medir")
+    parser.add_argument("--backend", default=None, help="Motor de inferencia, por defecto el de settings.json")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="Tamaño de inferencia, por defecto el de settings.json")
+    parser.add_argument("--output", default=None, help="Fichero JSON en el que guardar el informe")
+    args = parser.parse_args()
+
+    conf = DetectorConf()
+    if args.backend is not None:
+        conf.backend = args.backend
+    if args.inference_size is not None:
+        conf.inference_size = args.inference_size
+        # Sin lores_size, el tamaño de captura del stream lores depende del tamaño de inferencia
+        conf.capture_size = conf.get_capture_size()
+    max_frames = args.frames
+    if args.source == FrameSources.SYNTHETIC and max_frames == 0:
+        max_frames = SYNTHETIC_FRAMES
+    path = args.path
+    if path is None and args.source == FrameSources.IMAGES:
+        env = EnvSingleton()
+        path = env.get_path(env.images_test_path)
+    # Con un número de fotogramas fijo el corpus se repite hasta alcanzarlo
+    source = create_frame_source({"name": "benchmark", "source": args.source, "path": path,
+                                  "loop": max_frames > 0, "frames": max_frames}, conf)
+
+    report = run_benchmark(conf, source, max_frames, args.warmup)
+    source.stop()
+    print(f"Modelo {report['model']} ({report['backend']}) con entrada {report['input_shape']}: "
+          f"{report['frames']} fotogramas en {report['elapsed_s']} s, {report['fps']} fotogramas/s, "
+          f"pico de memoria {report['peak_rss_mb']} MB")
+    for stage, values in report["stages"].items():
+        print(f"    {stage}: p50={values['p50_ms']} ms p95={values['p95_ms']} ms p99={values['p99_ms']} ms "
+              f"media={values['mean_ms']} ms max={values['max_ms']} ms")
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Informe guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
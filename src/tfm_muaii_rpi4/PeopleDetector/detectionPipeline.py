@@ -0,0 +1,121 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "detectionPipeline"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+import torch
+import torchvision
+
+from yolov5.utils.general import non_max_suppression
+
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.framePreprocessor import create_preprocessor
+from tfm_muaii_rpi4.PeopleDetector.frameSource import FrameSource
+from tfm_muaii_rpi4.PeopleDetector.inferenceBackend import InferenceBackend, create_backend
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
+
+Logs = LogsSingleton()
+
+
+class DetectorStages:
+    CAPTURE = FrameSource.CAPTURE_STAGE
+    MOTION = "movimiento"
+    PREPROCESS = "preprocesado"
+    FORWARD = "inferencia"
+    NMS = "nms"
+    COUNT = "recuento"
+
+    ALL: list = [CAPTURE, MOTION, PREPROCESS, FORWARD, NMS, COUNT]
+
+
+class DetectionPipeline:
+    """
+    Etapas de detección comunes al servicio y al benchmark: preprocesado conjunto de las cámaras, inferencia por lotes,
+    NMS de la clase persona y unión de las detecciones por asientos. El recuento con los trackers queda fuera, ya que
+    depende del estado de cada cámara.
+    """
+    CONF_THRESHOLD: float = 0.1
+    IOU_THRESHOLD: float = 0.5
+    WARMUP_RUNS: int = 2
+
+    def __init__(self, conf: DetectorConf, stats: LatencyStats):
+        """
+        :param conf: Configuración del detector
+        :param stats: Contadores de latencia en los que se acumulan las etapas de detección
+        """
+        self.__conf = conf
+        self.__stats = stats
+        self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.__preprocessor = create_preprocessor(conf, self.__device)
+        Logs.get_logger().info(f"Tamaño de entrada del modelo: {self.__preprocessor.get_input_shape()}",
+                               extra=__info__)
+        self.__classes: dict = conf.load_classes()
+        self.__person_class: int = conf.get_person_class(self.__classes)
+        # Con la cabeza reducida el modelo solo predice personas; si no, se descartan el resto de clases antes del NMS
+        self.__nms_classes: list = None if conf.single_class_head else [self.__person_class]
+        self.__model: InferenceBackend = None
+
+    def load_model(self, warmup_runs: int = WARMUP_RUNS) -> None:
+        """
+        Carga el motor de inferencia y ejecuta las inferencias de calentamiento
+        """
+        input_shape = self.__preprocessor.get_input_shape()
+        model = create_backend(self.__conf, input_shape, self.__device, self.__person_class)
+        init_time = time.perf_counter()
+        model.warmup(input_shape, warmup_runs)
+        Logs.get_logger().info(f"Calentamiento del modelo completado en {time.perf_counter() - init_time:.2f} s",
+                               extra=__info__)
+        self.__model = model
+
+    def get_input_shape(self) -> tuple:
+        return self.__preprocessor.get_input_shape()
+
+    def get_classes(self) -> dict:
+        return self.__classes
+
+    def detect(self, frames: list) -> (list, dict):
+        """
+        Detecta personas en los fotogramas de todas las cámaras con una única inferencia por lotes
+        :param frames: Fotograma de cada cámara, en el orden de las cámaras
+        :return: Detecciones (N, 6) de cada cámara en coordenadas de su fotograma y ocupación de los asientos
+        """
+        with torch.inference_mode():
+            with self.__stats.measure(DetectorStages.PREPROCESS):
+                img = self.__preprocessor(frames)  # Tensor de entrada preasignado, rellenado en el sitio
+
+            with self.__stats.measure(DetectorStages.FORWARD):
+                pred = self.__model(img)
+            with self.__stats.measure(DetectorStages.NMS):
+                preds = non_max_suppression(pred, self.CONF_THRESHOLD, self.IOU_THRESHOLD,
+                                            classes=self.__nms_classes)
+                for index, pred in enumerate(preds):
+                    self.__preprocessor.scale_boxes(pred, index)
+
+                camera_preds: list = []
+                occupancy: dict = {}
+                for camera_index in range(self.__preprocessor.get_num_cameras()):
+                    batch_preds = preds[self.__preprocessor.get_camera_slice(camera_index)]
+                    seat_names = self.__preprocessor.get_seat_names(camera_index)
+                    if seat_names:
+                        camera_name = self.__conf.cameras[camera_index]["name"]
+                        camera_preds.append(self.__merge_seat_detections(camera_name, seat_names, batch_preds,
+                                                                         occupancy))
+                    else:
+                        camera_preds.append(batch_preds[0])
+        return camera_preds, occupancy
+
+    def __merge_seat_detections(self, camera_name: str, seat_names: list, preds: list, occupancy: dict):
+        """
+        Añade a occupancy la ocupación de cada asiento de la cámara, con clave "<cámara>/<asiento>" para que no
+        colisionen asientos con el mismo nombre en cámaras distintas, y une las detecciones de todos sus asientos en
+        coordenadas del fotograma, eliminando los duplicados de personas que aparecen en regiones de asiento solapadas
+        """
+        threshold = self.__conf.seat_threshold
+        occupancy.update({f"{camera_name}/{name}": bool(len(pred) > 0 and pred[:, 4].max() >= threshold)
+                          for name, pred in zip(seat_names, preds)})
+        pred = torch.cat(preds)
+        keep = torchvision.ops.nms(pred[:, :4], pred[:, 4], self.IOU_THRESHOLD)
+        return pred[keep]
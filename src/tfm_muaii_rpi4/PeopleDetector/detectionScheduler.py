@@ -0,0 +1,88 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "detectionScheduler"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+from threading import Lock
+
+from tfm_muaii_rpi4.DataPersistence.contextVarsMgr import ContextVarsMgrSingleton, ContextVarsConst
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+
+Logs = LogsSingleton()
+
+
+class SchedulerModes:
+    STOPPED = "parado"
+    GRACE = "arranque"
+    MOVING = "en marcha"
+
+
+class DetectionScheduler:
+    """
+    Planificador de la frecuencia de detección según el estado del vehículo. El recuento de personas solo se muestra
+    con el vehículo parado, así que en ese estado (y durante una ventana de gracia tras arrancar, mientras terminan de
+    acomodarse los pasajeros) se detecta a la máxima frecuencia, y en marcha se pasa a un modo de mantenimiento que
+    libera CPU para el GPS y la búsqueda de carreteras.
+    """
+    STOPPED_PERIOD: float = 0.0
+    GRACE_PERIOD: float = 30.0
+    MOVING_PERIOD: float = 10.0
+
+    def __init__(self, conf: dict = None):
+        """
+        :param conf: Configuración scheduler del detector (enabled, stopped_period, grace_period, moving_period), en
+        segundos. Un periodo 0 significa ejecutar tan rápido como permita el modelo.
+        """
+        conf = conf or {}
+        self._context_vars_mgr = ContextVarsMgrSingleton()
+        self.__enabled: bool = bool(conf.get("enabled", True))
+        self.__stopped_period: float = float(conf.get("stopped_period", self.STOPPED_PERIOD))
+        self.__grace_period: float = float(conf.get("grace_period", self.GRACE_PERIOD))
+        self.__moving_period: float = float(conf.get("moving_period", self.MOVING_PERIOD))
+        self.__moving_since: float = None
+        self.__last_run: float = 0.0
+        self.__mode: str = SchedulerModes.STOPPED
+        self.__lock = Lock()
+
+    def get_mode(self, now: float = None) -> str:
+        if now is None:
+            now = time.time()
+        vehiculo_parado = self._context_vars_mgr.get_context_var(ContextVarsConst.VEHICULO_PARADO)
+        with self.__lock:
+            if vehiculo_parado:
+                self.__moving_since = None
+                mode = SchedulerModes.STOPPED
+            else:
+                if self.__moving_since is None:
+                    self.__moving_since = now
+                in_grace = now - self.__moving_since < self.__grace_period
+                mode = SchedulerModes.GRACE if in_grace else SchedulerModes.MOVING
+            if mode != self.__mode:
+                Logs.get_logger().info(f"Detector de personas en modo {mode}, periodo de detección "
+                                       f"{self.__get_mode_period(mode)} s", extra=__info__)
+                self.__mode = mode
+        return mode
+
+    def __get_mode_period(self, mode: str) -> float:
+        if mode == SchedulerModes.MOVING:
+            return self.__moving_period
+        return self.__stopped_period
+
+    def get_period(self, now: float = None) -> float:
+        if not self.__enabled:
+            return self.__stopped_period
+        return self.__get_mode_period(self.get_mode(now))
+
+    def time_until_next_run(self, now: float = None) -> float:
+        """
+        Segundos que faltan para la siguiente detección. Se recalcula con el estado actual del vehículo, por lo que al
+        detenerse el vehículo la detección se adelanta sin esperar al periodo de mantenimiento.
+        """
+        if now is None:
+            now = time.time()
+        return self.__last_run + self.get_period(now) - now
+
+    def mark_run(self, now: float = None) -> None:
+        self.__last_run = now if now is not None else time.time()
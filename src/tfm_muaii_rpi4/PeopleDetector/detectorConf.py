@@ -0,0 +1,115 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "detectorConf"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import os
+import yaml
+
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+
+
+class DetectorConf:
+    """
+    Configuración del detector de personas (sección services.people_detector de settings.json) con sus valores por
+    defecto.
+    """
+    MODEL_NAME: str = "yolov5n"
+    BACKEND: str = "pytorch"
+    FRAME_SIZE: tuple = (640, 480)
+    INFERENCE_SIZE: int = 640
+    NUM_THREADS: int = 0
+    QUANTIZED: bool = False
+    SINGLE_CLASS_HEAD: bool = False
+    DETECT_EVERY: int = 1
+    SEAT_SIZE: int = 192
+    SEAT_THRESHOLD: float = 0.4
+    LORES: bool = False
+    LORES_ALIGN: int = 64
+    DEFAULT_CAMERA: str = "principal"
+    CLASSES_FILE: str = "coco.yaml"
+    PERSON_CLASS_NAME: str = "person"
+
+    def __init__(self):
+        env = EnvSingleton()
+        self.__conf: dict = env.get_service_conf(env.people_detector)
+        self.models_path: str = env.get_path(env.yolo_models_path)
+        self.classes_path: str = env.get_path(env.yolo_classes_path)
+        self.model_name: str = self.__conf.get("model", self.MODEL_NAME)
+        self.backend: str = self.__conf.get("backend", self.BACKEND)
+        self.frame_size: tuple = tuple(self.__conf.get("frame_size", self.FRAME_SIZE))
+        self.inference_size: int = int(self.__conf.get("inference_size", self.INFERENCE_SIZE))
+        self.num_threads: int = int(self.__conf.get("num_threads", self.NUM_THREADS))
+        self.quantized: bool = bool(self.__conf.get("quantized", self.QUANTIZED))
+        self.single_class_head: bool = bool(self.__conf.get("single_class_head", self.SINGLE_CLASS_HEAD))
+        self.motion_gate: dict = self.__conf.get("motion_gate", {})
+        self.scheduler: dict = self.__conf.get("scheduler", {})
+        self.tracker: dict = self.__conf.get("tracker", {})
+        self.process: dict = self.__conf.get("process", {})
+        self.detect_every: int = max(1, int(self.__conf.get("detect_every", self.DETECT_EVERY)))
+        self.seats: list = self.__conf.get("seats", [])
+        self.seat_size: int = int(self.__conf.get("seat_size", self.SEAT_SIZE))
+        self.seat_threshold: float = float(self.__conf.get("seat_threshold", self.SEAT_THRESHOLD))
+        self.lores: bool = bool(self.__conf.get("lores", self.LORES))
+        self.capture_size: tuple = self.get_capture_size()
+        self.cameras: list = self.__get_cameras()
+
+    def __get_cameras(self) -> list:
+        """
+        Cámaras del detector ("cameras": [{"name": ..., "index": ..., "seats": [...]}]). Cada cámara puede indicar su
+        fuente de fotogramas (source, ver frameSource). Sin la clave cameras se usa una única cámara con los asientos de
+        la sección principal. Todas las cámaras se infieren en un mismo lote, por lo que o todas tienen asientos
+        configurados o ninguna.
+        """
+        cameras: list = []
+        for index, camera in enumerate(self.__conf.get("cameras", [{"name": self.DEFAULT_CAMERA, "index": 0}])):
+            cameras.append(dict(camera, name=camera.get("name", f"camara_{index}"),
+                                index=int(camera.get("index", index)),
+                                seats=camera.get("seats", self.seats if index == 0 else [])))
+        if len({len(camera["seats"]) > 0 for camera in cameras}) > 1:
+            raise Exception("Todas las cámaras del detector deben tener asientos configurados o ninguna")
+        if len({camera["name"] for camera in cameras}) != len(cameras):
+            raise Exception("Los nombres de las cámaras del detector deben ser únicos")
+        return cameras
+
+    def get_capture_size(self) -> tuple:
+        """
+        Tamaño (ancho, alto) de los fotogramas que recibe el detector. Sin stream lores es el del stream principal; con
+        él, el indicado en lores_size o, por defecto, el tamaño de inferencia, de forma que el ISP hace el redimensionado.
+        El ancho se alinea a LORES_ALIGN para que el stride del buffer YUV420 coincida con el ancho. Si se modifican
+        frame_size, lores o inference_size tras crear la configuración, hay que volver a asignar capture_size.
+        """
+        if not self.lores:
+            return self.frame_size
+        if "lores_size" in self.__conf:
+            return tuple(self.__conf["lores_size"])
+        width, height = self.frame_size
+        ratio = min(self.inference_size / width, self.inference_size / height, 1.0)
+        lores_width = max(self.LORES_ALIGN, int(width * ratio) // self.LORES_ALIGN * self.LORES_ALIGN)
+        lores_height = int(round(lores_width * height / width / 2)) * 2
+        return lores_width, lores_height
+
+    def get(self, key: str, default: any = None) -> any:
+        return self.__conf.get(key, default)
+
+    def load_classes(self) -> dict:
+        """
+        Carga los nombres de las clases del modelo como diccionario {índice: nombre}
+        """
+        with open(os.path.join(self.classes_path, self.CLASSES_FILE), "r", encoding="utf-8") as f:
+            names = yaml.safe_load(f)["names"]
+        if isinstance(names, list):
+            names = dict(enumerate(names))
+        return names
+
+    def get_person_class(self, classes: dict = None) -> int:
+        """
+        Índice de la clase persona en el modelo completo (80 clases de COCO)
+        """
+        if classes is None:
+            classes = self.load_classes()
+        for index, name in classes.items():
+            if name.lower() == self.PERSON_CLASS_NAME:
+                return int(index)
+        raise Exception(f"No existe la clase {self.PERSON_CLASS_NAME} en {self.CLASSES_FILE}")
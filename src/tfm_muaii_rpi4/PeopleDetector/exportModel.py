@@ -0,0 +1,43 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "exportModel"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Exportación del modelo del detector de personas a TorchScript u ONNX. Se ejecuta una única vez por cada tamaño de
+# inferencia configurado, y el artefacto se guarda en yolo_models_path:
+#     python -m tfm_muaii_rpi4.PeopleDetector.exportModel --backend onnx
+# El artefacto TorchScript se exporta congelado y con Conv+BN fusionadas, lo que reduce el tiempo de arranque respecto
+# al .pt en cada reinicio de la RPi4:
+#     python -m tfm_muaii_rpi4.PeopleDetector.exportModel --backend torchscript
+
+import argparse
+import torch
+from dotenv import load_dotenv
+
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.framePreprocessor import create_preprocessor
+from tfm_muaii_rpi4.PeopleDetector.inferenceBackend import InferenceBackends, export_model
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Exporta el modelo YOLOv5 del detector de personas")
+    parser.add_argument("--backend", choices=[InferenceBackends.TORCHSCRIPT, InferenceBackends.ONNX],
+                        default=InferenceBackends.ONNX, help="Formato de exportación")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="Tamaño de inferencia, por defecto el de settings.json")
+    args = parser.parse_args()
+
+    conf = DetectorConf()
+    if args.inference_size is not None:
+        conf.inference_size = args.inference_size
+        # Sin lores_size, el tamaño de captura del stream lores depende del tamaño de inferencia
+        conf.capture_size = conf.get_capture_size()
+    input_shape = create_preprocessor(conf, torch.device("cpu")).get_input_shape()
+    artifact_file = export_model(conf, args.backend, input_shape)
+    print(f"Modelo exportado: {artifact_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "frameBuffer"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+import numpy as np
+from threading import Condition
+
+
+class FrameRingBuffer:
+    """
+    Buffer circular de fotogramas con memoria preasignada. El hilo de captura escribe siempre en un hueco que no está
+    siendo leído ni es el último publicado, y el hilo de inferencia obtiene únicamente el fotograma más reciente. Los
+    fotogramas que se sobrescriben sin haber sido consumidos se contabilizan como descartados, por lo que nunca se
+    acumula retraso entre captura e inferencia.
+    """
+    MIN_SLOTS: int = 3
+
+    def __init__(self, shape: tuple, dtype=np.uint8, slots: int = MIN_SLOTS):
+        if slots < self.MIN_SLOTS:
+            raise Exception(f"El buffer de fotogramas necesita al menos {self.MIN_SLOTS} huecos")
+        self.__frames = np.empty((slots,) + tuple(shape), dtype=dtype)
+        self.__sequences: list = [0] * slots
+        self.__timestamps: list = [0.0] * slots
+        self.__condition = Condition()
+        self.__latest_slot: int = -1
+        self.__reading_slot: int = -1
+        self.__last_sequence: int = 0
+        self.__last_consumed_sequence: int = 0
+        self.__written: int = 0
+        self.__dropped: int = 0
+
+    def write(self, frame: np.ndarray) -> int:
+        """
+        Copia el fotograma en un hueco libre y lo publica como el más reciente
+        :param frame: Fotograma capturado, con la misma forma que el buffer
+        :return: Número de secuencia asignado al fotograma
+        """
+        slot, slot_frame = self.begin_write()
+        np.copyto(slot_frame, frame)
+        return self.commit_write(slot)
+
+    def begin_write(self) -> (int, np.ndarray):
+        """
+        Reserva un hueco libre para que el productor escriba directamente en él (p.ej. como destino de una conversión
+        de color), evitando copias intermedias. El hueco no es visible para el consumidor hasta commit_write().
+        :return: Índice del hueco y vista del fotograma a rellenar
+        """
+        with self.__condition:
+            slot = self.__get_free_slot()
+        return slot, self.__frames[slot]
+
+    def commit_write(self, slot: int) -> int:
+        """
+        Publica el hueco escrito como el fotograma más reciente
+        :param slot: Índice devuelto por begin_write()
+        :return: Número de secuencia asignado al fotograma
+        """
+        with self.__condition:
+            if self.__latest_slot != -1 and \
+                    self.__sequences[self.__latest_slot] > self.__last_consumed_sequence:
+                self.__dropped += 1
+            self.__last_sequence += 1
+            self.__sequences[slot] = self.__last_sequence
+            self.__timestamps[slot] = time.time()
+            self.__latest_slot = slot
+            self.__written += 1
+            self.__condition.notify_all()
+            return self.__last_sequence
+
+    def __get_free_slot(self) -> int:
+        for slot in range(len(self.__sequences)):
+            if slot != self.__latest_slot and slot != self.__reading_slot:
+                return slot
+
+    def acquire_latest(self, last_sequence: int, timeout: float) -> (int, np.ndarray, float):
+        """
+        Espera a que exista un fotograma más reciente que last_sequence y lo reserva para su lectura. El fotograma
+        devuelto es una vista del buffer, que no se sobrescribirá hasta llamar a release().
+        :param last_sequence: Secuencia del último fotograma procesado por el consumidor
+        :param timeout: Tiempo máximo de espera en segundos
+        :return: Secuencia, fotograma y timestamp de captura; (None, None, None) si se agota el tiempo
+        """
+        with self.__condition:
+            new_frame = self.__condition.wait_for(
+                lambda: self.__latest_slot != -1 and self.__sequences[self.__latest_slot] > last_sequence, timeout)
+            if not new_frame:
+                return None, None, None
+            slot = self.__latest_slot
+            self.__reading_slot = slot
+            self.__last_consumed_sequence = self.__sequences[slot]
+            return self.__sequences[slot], self.__frames[slot], self.__timestamps[slot]
+
+    def release(self) -> None:
+        with self.__condition:
+            self.__reading_slot = -1
+
+    def get_written(self) -> int:
+        return self.__written
+
+    def get_dropped(self) -> int:
+        return self.__dropped
@@ -0,0 +1,302 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "framePreprocessor"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import bisect
+import cv2
+import numpy as np
+import torch
+
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+
+
+class FramePreprocessor:
+    """
+    Preprocesado de fotogramas para YOLOv5 sin reservas de memoria por fotograma. El tensor de entrada se reserva una
+    única vez en formato channels-last (NHWC en memoria) y se rellena en el sitio: el redimensionado (letterbox) escribe
+    en un buffer uint8 preasignado, la conversión a float se hace en la copia al tensor y la normalización es in-place.
+    """
+    STRIDE: int = 32
+    PAD_VALUE: int = 114
+
+    def __init__(self, frame_size: tuple, inference_size: int, device: torch.device):
+        """
+        :param frame_size: Tamaño (ancho, alto) de los fotogramas de entrada
+        :param inference_size: Lado máximo de la imagen que recibe el modelo (p.ej. 320, 416 o 640)
+        :param device: Dispositivo en el que reside el tensor de entrada
+        """
+        width, height = frame_size
+        self.__ratio: float = min(inference_size / width, inference_size / height, 1.0)
+        self.__resized_width: int = int(round(width * self.__ratio))
+        self.__resized_height: int = int(round(height * self.__ratio))
+        # Padding mínimo hasta múltiplo del stride del modelo (letterbox rectangular, como auto=True en YOLOv5)
+        input_width = int(np.ceil(self.__resized_width / self.STRIDE) * self.STRIDE)
+        input_height = int(np.ceil(self.__resized_height / self.STRIDE) * self.STRIDE)
+        self.__pad_left: int = (input_width - self.__resized_width) // 2
+        self.__pad_top: int = (input_height - self.__resized_height) // 2
+        self.__needs_resize: bool = (self.__resized_width, self.__resized_height) != (width, height)
+
+        self.__resized: np.ndarray = None
+        if self.__needs_resize:
+            self.__resized = np.empty((self.__resized_height, self.__resized_width, 3), dtype=np.uint8)
+        self.bind_input(torch.full((1, 3, input_height, input_width), self.PAD_VALUE / 255.0, dtype=torch.float32,
+                                   device=device).contiguous(memory_format=torch.channels_last))
+
+    def bind_input(self, input_tensor: torch.Tensor) -> None:
+        """
+        Asigna el tensor de entrada que rellena el preprocesador, p.ej. el tramo de una cámara dentro del lote conjunto
+        de todas las cámaras. Debe tener la forma de get_input_shape() y estar inicializado con el color de padding.
+        """
+        self.__input = input_tensor
+        self.__input_region = self.__input[0, :, self.__pad_top:self.__pad_top + self.__resized_height,
+                                           self.__pad_left:self.__pad_left + self.__resized_width]
+
+    def __call__(self, frame: np.ndarray) -> torch.Tensor:
+        """
+        Rellena el tensor de entrada con el fotograma. El tensor devuelto se reutiliza en la siguiente llamada.
+        :param frame: Fotograma HWC uint8
+        :return: Tensor (1, 3, H, W) float32 normalizado en [0, 1] y en formato channels-last
+        """
+        if self.__needs_resize:
+            cv2.resize(frame, (self.__resized_width, self.__resized_height), dst=self.__resized,
+                       interpolation=cv2.INTER_LINEAR)
+            frame = self.__resized
+        # Vista HWC -> CHW sin copia: coincide con el orden en memoria del tensor channels-last
+        self.__input_region.copy_(torch.from_numpy(frame).permute(2, 0, 1))
+        self.__input_region.mul_(1 / 255.0)
+        return self.__input
+
+    def get_input_shape(self) -> tuple:
+        return tuple(self.__input.shape)
+
+    def get_batch_size(self) -> int:
+        return 1
+
+    def scale_boxes(self, boxes: torch.Tensor, index: int = 0) -> torch.Tensor:
+        """
+        Convierte in-place cajas xyxy del espacio de inferencia al espacio del fotograma original
+        :param boxes: Tensor (N, 4) con cajas xyxy
+        :param index: Índice dentro del lote (con el fotograma completo solo existe el 0)
+        :return: El mismo tensor con las cajas reescaladas
+        """
+        boxes[:, [0, 2]] -= self.__pad_left
+        boxes[:, [1, 3]] -= self.__pad_top
+        boxes[:, :4] /= self.__ratio
+        return boxes
+
+
+class SeatRegion:
+    """
+    Región de un asiento en el fotograma, definida en settings.json como rectángulo ("rect": [x1, y1, x2, y2]) o como
+    polígono ("polygon": [[x, y], ...]). De los polígonos se recorta su rectángulo envolvente y se rellena con el color
+    de padding todo lo que queda fuera del polígono.
+    """
+    def __init__(self, seat: dict, frame_size: tuple, capture_size: tuple):
+        """
+        :param seat: Configuración del asiento, en coordenadas del stream principal (frame_size)
+        :param frame_size: Tamaño (ancho, alto) del stream principal
+        :param capture_size: Tamaño (ancho, alto) de los fotogramas que se recortan (distinto con el stream lores)
+        """
+        self.name: str = seat["name"]
+        width, height = capture_size
+        scale = np.array([capture_size[0] / frame_size[0], capture_size[1] / frame_size[1]])
+        if "polygon" in seat:
+            polygon = np.round(np.array(seat["polygon"]) * scale).astype(np.int32)
+            x1, y1 = polygon.min(axis=0)
+            x2, y2 = polygon.max(axis=0)
+        else:
+            x1, y1, x2, y2 = np.round(np.array(seat["rect"]).reshape(2, 2) * scale).astype(np.int32).ravel()
+            polygon = None
+        self.x1: int = int(max(0, x1))
+        self.y1: int = int(max(0, y1))
+        self.x2: int = int(min(width, x2))
+        self.y2: int = int(min(height, y2))
+        if self.x2 <= self.x1 or self.y2 <= self.y1:
+            raise Exception(f"La región del asiento {self.name} está fuera del fotograma")
+        self.outside_mask: np.ndarray = None
+        if polygon is not None:
+            inside = np.zeros((self.y2 - self.y1, self.x2 - self.x1), dtype=np.uint8)
+            cv2.fillPoly(inside, [polygon - np.array([self.x1, self.y1], dtype=np.int32)], 1)
+            self.outside_mask = inside == 0
+
+    def get_size(self) -> tuple:
+        return self.x2 - self.x1, self.y2 - self.y1
+
+
+class SeatBatchPreprocessor:
+    """
+    Preprocesado por asientos: recorta la región de cada asiento, la redimensiona a una entrada cuadrada pequeña y
+    rellena un único tensor (S, 3, seat_size, seat_size) para ejecutar todos los asientos en una sola inferencia por
+    lotes. Igual que FramePreprocessor, todos los buffers se reservan una única vez.
+    """
+    def __init__(self, seats: list, frame_size: tuple, capture_size: tuple, seat_size: int, device: torch.device):
+        """
+        :param seats: Lista de asientos de la configuración del detector
+        :param frame_size: Tamaño (ancho, alto) del stream principal, en el que se definen los asientos
+        :param capture_size: Tamaño (ancho, alto) de los fotogramas de entrada
+        :param seat_size: Lado de la entrada del modelo por asiento, múltiplo de 32 (p.ej. 160 o 192)
+        :param device: Dispositivo en el que reside el tensor de entrada
+        """
+        seat_size = int(np.ceil(seat_size / FramePreprocessor.STRIDE) * FramePreprocessor.STRIDE)
+        self.__regions: list = [SeatRegion(seat, frame_size, capture_size) for seat in seats]
+        self.__ratios: list = []
+        self.__pads: list = []
+        self.__resized: list = []
+        self.__masked: list = []
+        for region in self.__regions:
+            width, height = region.get_size()
+            ratio = min(seat_size / width, seat_size / height)
+            resized_width, resized_height = int(round(width * ratio)), int(round(height * ratio))
+            pad_left, pad_top = (seat_size - resized_width) // 2, (seat_size - resized_height) // 2
+            self.__ratios.append(ratio)
+            self.__pads.append((pad_left, pad_top))
+            self.__resized.append(np.empty((resized_height, resized_width, 3), dtype=np.uint8))
+            self.__masked.append(np.empty((height, width, 3), dtype=np.uint8)
+                                 if region.outside_mask is not None else None)
+        self.bind_input(torch.full((len(self.__regions), 3, seat_size, seat_size),
+                                   FramePreprocessor.PAD_VALUE / 255.0, dtype=torch.float32,
+                                   device=device).contiguous(memory_format=torch.channels_last))
+
+    def bind_input(self, input_tensor: torch.Tensor) -> None:
+        """
+        Asigna el tensor de entrada que rellena el preprocesador (ver FramePreprocessor.bind_input)
+        """
+        self.__input = input_tensor
+        self.__input_regions: list = []
+        for index, ((pad_left, pad_top), resized) in enumerate(zip(self.__pads, self.__resized)):
+            self.__input_regions.append(self.__input[index, :, pad_top:pad_top + resized.shape[0],
+                                                     pad_left:pad_left + resized.shape[1]])
+
+    def __call__(self, frame: np.ndarray) -> torch.Tensor:
+        """
+        Rellena el tensor de entrada con los recortes de todos los asientos. El tensor se reutiliza entre llamadas.
+        :param frame: Fotograma HWC uint8 completo
+        :return: Tensor (S, 3, seat_size, seat_size) float32 normalizado y en formato channels-last
+        """
+        for index, region in enumerate(self.__regions):
+            crop = frame[region.y1:region.y2, region.x1:region.x2]
+            if region.outside_mask is not None:
+                np.copyto(self.__masked[index], crop)
+                self.__masked[index][region.outside_mask] = FramePreprocessor.PAD_VALUE
+                crop = self.__masked[index]
+            resized = self.__resized[index]
+            cv2.resize(crop, (resized.shape[1], resized.shape[0]), dst=resized, interpolation=cv2.INTER_AREA)
+            self.__input_regions[index].copy_(torch.from_numpy(resized).permute(2, 0, 1))
+            self.__input_regions[index].mul_(1 / 255.0)
+        return self.__input
+
+    def get_input_shape(self) -> tuple:
+        return tuple(self.__input.shape)
+
+    def get_batch_size(self) -> int:
+        return len(self.__regions)
+
+    def get_seat_names(self) -> list:
+        return [region.name for region in self.__regions]
+
+    def scale_boxes(self, boxes: torch.Tensor, index: int = 0) -> torch.Tensor:
+        """
+        Convierte in-place cajas xyxy del recorte de un asiento al espacio del fotograma original
+        :param boxes: Tensor (N, 4) con cajas xyxy
+        :param index: Índice del asiento dentro del lote
+        :return: El mismo tensor con las cajas reescaladas
+        """
+        pad_left, pad_top = self.__pads[index]
+        region = self.__regions[index]
+        boxes[:, [0, 2]] -= pad_left
+        boxes[:, [1, 3]] -= pad_top
+        boxes[:, :4] /= self.__ratios[index]
+        boxes[:, [0, 2]] += region.x1
+        boxes[:, [1, 3]] += region.y1
+        return boxes
+
+
+class CameraBatchPreprocessor:
+    """
+    Preprocesado conjunto de todas las cámaras del detector. Cada cámara tiene su propio preprocesador (de fotograma
+    completo o por asientos), que rellena directamente su tramo de un único tensor (B, 3, H, W) con las entradas de
+    todas las cámaras, de modo que se ejecuta una sola inferencia por lotes por ciclo en lugar de una por cámara.
+    """
+    def __init__(self, preprocessors: list, device: torch.device):
+        """
+        :param preprocessors: Preprocesador de cada cámara, en el orden de las cámaras
+        :param device: Dispositivo en el que reside el tensor de entrada
+        """
+        self.__preprocessors: list = preprocessors
+        input_shapes = {preprocessor.get_input_shape()[1:] for preprocessor in preprocessors}
+        if len(input_shapes) != 1:
+            raise Exception(f"Todas las cámaras deben tener el mismo tamaño de entrada del modelo: {input_shapes}")
+        self.__offsets: list = []
+        batch_size = 0
+        for preprocessor in preprocessors:
+            self.__offsets.append(batch_size)
+            batch_size += preprocessor.get_batch_size()
+        self.__batch_size: int = batch_size
+        # Con una única cámara su tensor de entrada ya es el lote completo y no se reserva otro
+        self.__input: torch.Tensor = None
+        if len(preprocessors) > 1:
+            self.__input = torch.full((batch_size,) + input_shapes.pop(), FramePreprocessor.PAD_VALUE / 255.0,
+                                      dtype=torch.float32,
+                                      device=device).contiguous(memory_format=torch.channels_last)
+            for offset, preprocessor in zip(self.__offsets, preprocessors):
+                preprocessor.bind_input(self.__input[offset:offset + preprocessor.get_batch_size()])
+
+    def __call__(self, frames: list) -> torch.Tensor:
+        """
+        Rellena el tensor de entrada con los fotogramas de todas las cámaras
+        :param frames: Fotograma HWC uint8 de cada cámara, en el orden de las cámaras
+        :return: Tensor (B, 3, H, W) float32 normalizado y en formato channels-last
+        """
+        img = None
+        for preprocessor, frame in zip(self.__preprocessors, frames):
+            img = preprocessor(frame)
+        return img if self.__input is None else self.__input
+
+    def get_input_shape(self) -> tuple:
+        return (self.__batch_size,) + self.__preprocessors[0].get_input_shape()[1:]
+
+    def get_batch_size(self) -> int:
+        return self.__batch_size
+
+    def get_num_cameras(self) -> int:
+        return len(self.__preprocessors)
+
+    def get_camera_slice(self, camera_index: int) -> slice:
+        """
+        Tramo del lote (y de la lista de predicciones) que corresponde a una cámara
+        """
+        offset = self.__offsets[camera_index]
+        return slice(offset, offset + self.__preprocessors[camera_index].get_batch_size())
+
+    def get_seat_names(self, camera_index: int) -> list:
+        preprocessor = self.__preprocessors[camera_index]
+        return preprocessor.get_seat_names() if isinstance(preprocessor, SeatBatchPreprocessor) else []
+
+    def scale_boxes(self, boxes: torch.Tensor, index: int = 0) -> torch.Tensor:
+        """
+        Convierte in-place cajas xyxy de una entrada del lote al espacio del fotograma de su cámara
+        :param boxes: Tensor (N, 4) con cajas xyxy
+        :param index: Índice dentro del lote conjunto
+        :return: El mismo tensor con las cajas reescaladas
+        """
+        camera_index = bisect.bisect_right(self.__offsets, index) - 1
+        return self.__preprocessors[camera_index].scale_boxes(boxes, index - self.__offsets[camera_index])
+
+
+def create_preprocessor(conf: DetectorConf, device: torch.device) -> CameraBatchPreprocessor:
+    """
+    Crea el preprocesador conjunto de las cámaras configuradas. El de cada cámara es por asientos si tiene regiones de
+    asiento configuradas y de fotograma completo en caso contrario.
+    :param conf: Configuración del detector
+    :param device: Dispositivo de inferencia
+    """
+    preprocessors: list = []
+    for camera in conf.cameras:
+        if len(camera["seats"]) > 0:
+            preprocessors.append(SeatBatchPreprocessor(camera["seats"], conf.frame_size, conf.capture_size,
+                                                       conf.seat_size, device))
+        else:
+            preprocessors.append(FramePreprocessor(conf.capture_size, conf.inference_size, device))
+    return CameraBatchPreprocessor(preprocessors, device)
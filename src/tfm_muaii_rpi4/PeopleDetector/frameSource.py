@@ -0,0 +1,332 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "frameSource"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import os
+import time
+import cv2
+import numpy as np
+from threading import Event, Thread
+
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectionScheduler import DetectionScheduler
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.frameBuffer import FrameRingBuffer
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
+
+Logs = LogsSingleton()
+
+
+class FrameSources:
+    PICAMERA = "picamera"
+    IMAGES = "images"
+    VIDEO = "video"
+    SYNTHETIC = "synthetic"
+
+    IMAGE_EXTENSIONS: tuple = ('.jpg', '.png', '.jpeg')
+
+
+class FrameSource:
+    """
+    Fuente de fotogramas del detector de personas. Cada fuente rellena fotogramas BGR del tamaño de captura del
+    detector con read(), que también se usa directamente sin hilos en el benchmark. En el servicio, un hilo de captura
+    propio publica los fotogramas en un buffer circular, de forma que la fuente nunca espera a la inferencia y el
+    detector siempre lee el fotograma más reciente de cada fuente.
+    """
+    name: str = ""
+    FRAME_BUFFER_SLOTS: int = 3
+    FRAME_TIMEOUT: float = 2.0
+    SCHEDULER_CHECK_PERIOD: float = 1.0
+    CAPTURE_LEAD_TIME: float = 0.2
+    CAPTURE_STAGE: str = "captura"
+
+    def __init__(self, camera: dict, conf: DetectorConf):
+        """
+        :param camera: Configuración de la cámara (name, source, path, fps, loop...)
+        :param conf: Configuración del detector
+        """
+        self.name = camera["name"]
+        self._conf = conf
+        self._capture_size: tuple = conf.capture_size
+        self._fps: float = float(camera.get("fps", 0))
+        self.__scheduler: DetectionScheduler = None
+        self.__stats: LatencyStats = None
+        self.__stop_event: Event = None
+        self.__capture_thread: Thread = None
+        capture_width, capture_height = conf.capture_size
+        self.__frame_buffer = FrameRingBuffer((capture_height, capture_width, 3), slots=self.FRAME_BUFFER_SLOTS)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def is_open(self) -> bool:
+        return True
+
+    def read(self, frame: np.ndarray) -> bool:
+        """
+        Rellena el fotograma con la siguiente imagen de la fuente
+        :param frame: Array HWC uint8 del tamaño de captura en el que se escribe la imagen
+        :return: False si la fuente no tiene más imágenes
+        """
+        raise NotImplementedError
+
+    def get_snapshot(self, timeout: float = FRAME_TIMEOUT):
+        """
+        Obtiene una instantánea a resolución completa de la fuente
+        :param timeout: Tiempo máximo de espera en segundos
+        :return: Fotograma o None si la fuente no lo permite
+        """
+        return None
+
+    def start_capture(self, scheduler: DetectionScheduler, stats: LatencyStats, stop_event: Event) -> None:
+        """
+        Arranca el hilo de captura
+        :param scheduler: Planificador de detecciones, para no capturar fotogramas que se van a descartar
+        :param stats: Contadores de latencia del detector, en los que se acumula la etapa de captura
+        :param stop_event: Evento de parada del servicio
+        """
+        self.__scheduler = scheduler
+        self.__stats = stats
+        self.__stop_event = stop_event
+        self.__capture_thread = Thread(target=self.__run_capture)
+        self.__capture_thread.daemon = True
+        self.__capture_thread.name = f"THREAD_{__info__['module_name']}_{self.name}"
+        self.__capture_thread.start()
+
+    def stop_capture(self) -> None:
+        if self.__capture_thread is not None:
+            self.__capture_thread.join(self.FRAME_TIMEOUT)
+            if self.__capture_thread.is_alive():
+                Logs.get_logger().warning(f"No fue posible la salida del hilo de captura de la fuente {self.name}",
+                                          extra=__info__)
+
+    def __run_capture(self):
+        """
+        Hilo productor: captura fotogramas de la fuente de forma continua y los publica en el buffer circular. Las
+        fuentes sin cámara se limitan a su fps configurado para simular una cámara real.
+        """
+        while not self.__stop_event.is_set():
+            try:
+                # Entre detecciones espaciadas no se capturan fotogramas que se iban a descartar
+                wait_time = self.__scheduler.time_until_next_run() - self.CAPTURE_LEAD_TIME
+                if wait_time > 0:
+                    self.__stop_event.wait(min(wait_time, self.SCHEDULER_CHECK_PERIOD))
+                    continue
+                init_time = time.perf_counter()
+                slot, slot_frame = self.__frame_buffer.begin_write()
+                if not self.read(slot_frame):
+                    Logs.get_logger().info(f"La fuente {self.name} no tiene más fotogramas", extra=__info__)
+                    break
+                self.__frame_buffer.commit_write(slot)
+                elapsed = time.perf_counter() - init_time
+                self.__stats.add(self.CAPTURE_STAGE, elapsed)
+                if self._fps > 0 and elapsed < 1 / self._fps:
+                    self.__stop_event.wait(1 / self._fps - elapsed)
+            except Exception as e:
+                Logs.get_logger().error(f"Error en la captura de fotogramas de la fuente {self.name}: {e}",
+                                        extra=__info__)
+                self.__stop_event.wait(1)
+
+    def acquire_latest(self, last_sequence: int, timeout: float = FRAME_TIMEOUT) -> (int, np.ndarray, float):
+        """
+        Reserva el fotograma más reciente de la fuente (ver FrameRingBuffer.acquire_latest)
+        """
+        return self.__frame_buffer.acquire_latest(last_sequence, timeout)
+
+    def release(self) -> None:
+        self.__frame_buffer.release()
+
+    def summary_str(self) -> str:
+        return (f"fuente {self.name}: fotogramas capturados {self.__frame_buffer.get_written()}, descartados "
+                f"{self.__frame_buffer.get_dropped()}")
+
+
+class PicameraSource(FrameSource):
+    MAIN_STREAM: str = "main"
+    LORES_STREAM: str = "lores"
+
+    def __init__(self, camera: dict, conf: DetectorConf):
+        super().__init__(camera, conf)
+        self.__capture_stream: str = self.MAIN_STREAM
+        self.__snapshot_requested = Event()
+        self.__snapshot_ready = Event()
+        self.__snapshot = None
+        self.__init_camara(int(camera.get("index", 0)))
+
+    def __init_camara(self, camera_index: int):
+        # Importación diferida: el resto de fuentes funcionan en cualquier equipo sin picamera2
+        from picamera2 import Picamera2
+        self.__camera = Picamera2(camera_index)
+        main_config = {"size": self._conf.frame_size, "format": "RGB888"}
+        if self._conf.lores:
+            # En la RPi4 el stream lores solo admite YUV420; el ISP escala al tamaño de inferencia
+            lores_config = {"size": self._capture_size, "format": "YUV420"}
+            camera_config = self.__camera.create_preview_configuration(main=main_config, lores=lores_config)
+        else:
+            camera_config = self.__camera.create_preview_configuration(main=main_config)
+        self.__camera.configure(camera_config)
+        if self._conf.lores:
+            lores_stride = camera_config[self.LORES_STREAM].get("stride", self._capture_size[0])
+            if lores_stride != self._capture_size[0]:
+                raise Exception(f"El stride del stream lores ({lores_stride}) no coincide con su ancho "
+                                f"{self._capture_size[0]}, es necesario ajustar lores_size")
+            self.__capture_stream = self.LORES_STREAM
+        Logs.get_logger().info(f"Camara {self.name} ({camera_index}): captura desde el stream {self.__capture_stream} "
+                               f"con tamaño {self._capture_size}", extra=__info__)
+
+    def start(self) -> None:
+        self.__camera.start()
+
+    def stop(self) -> None:
+        self.__camera.stop()
+
+    def is_open(self) -> bool:
+        return self.__camera.is_open
+
+    def read(self, frame: np.ndarray) -> bool:
+        """
+        Captura una petición de la cámara y escribe el fotograma directamente desde el buffer mapeado de la cámara:
+        una única copia para el stream principal, o la conversión YUV420 -> BGR con destino en el fotograma para el
+        stream lores. El stream principal solo se copia aparte si se ha pedido una instantánea.
+        """
+        from picamera2 import MappedArray
+        request = self.__camera.capture_request()
+        try:
+            with MappedArray(request, self.__capture_stream) as mapped:
+                if self.__capture_stream == self.LORES_STREAM:
+                    cv2.cvtColor(mapped.array, cv2.COLOR_YUV420p2BGR, dst=frame)
+                else:
+                    np.copyto(frame, mapped.array)
+            if self.__snapshot_requested.is_set():
+                self.__snapshot = request.make_array(self.MAIN_STREAM)
+                self.__snapshot_requested.clear()
+                self.__snapshot_ready.set()
+        finally:
+            request.release()
+        return True
+
+    def get_snapshot(self, timeout: float = FrameSource.FRAME_TIMEOUT):
+        self.__snapshot_ready.clear()
+        self.__snapshot_requested.set()
+        if not self.__snapshot_ready.wait(timeout):
+            Logs.get_logger().warning(f"No se pudo obtener una instantánea de la camara {self.name}", extra=__info__)
+            return None
+        return self.__snapshot
+
+
+class ImageFolderSource(FrameSource):
+    """
+    Fuente de imágenes de una carpeta, en orden alfabético. Con loop se repiten indefinidamente.
+    """
+    def __init__(self, camera: dict, conf: DetectorConf):
+        super().__init__(camera, conf)
+        self.__path: str = camera["path"]
+        self.__loop: bool = bool(camera.get("loop", True))
+        self.__image_files: list = sorted(os.path.join(self.__path, f) for f in os.listdir(self.__path)
+                                          if f.lower().endswith(FrameSources.IMAGE_EXTENSIONS))
+        if len(self.__image_files) == 0:
+            raise Exception(f"No hay imágenes en {self.__path}")
+        self.__next_image: int = 0
+
+    def read(self, frame: np.ndarray) -> bool:
+        for _ in range(len(self.__image_files)):
+            if self.__next_image >= len(self.__image_files):
+                return False
+            image_file = self.__image_files[self.__next_image]
+            self.__next_image += 1
+            if self.__loop:
+                self.__next_image %= len(self.__image_files)
+            image = cv2.imread(image_file)
+            if image is None:
+                Logs.get_logger().error(f"Error al leer la imagen: {image_file}", extra=__info__)
+                continue
+            cv2.resize(image, self._capture_size, dst=frame, interpolation=cv2.INTER_AREA)
+            return True
+        return False
+
+    def get_num_images(self) -> int:
+        return len(self.__image_files)
+
+
+class VideoFileSource(FrameSource):
+    """
+    Fuente de fotogramas de un fichero de vídeo. Con loop se vuelve al inicio al terminar.
+    """
+    def __init__(self, camera: dict, conf: DetectorConf):
+        super().__init__(camera, conf)
+        self.__path: str = camera["path"]
+        self.__loop: bool = bool(camera.get("loop", True))
+        self.__capture = cv2.VideoCapture(self.__path)
+        if not self.__capture.isOpened():
+            raise Exception(f"No se pudo abrir el vídeo {self.__path}")
+        if self._fps == 0:
+            self._fps = self.__capture.get(cv2.CAP_PROP_FPS) or 0
+
+    def stop(self) -> None:
+        self.__capture.release()
+
+    def is_open(self) -> bool:
+        return self.__capture.isOpened()
+
+    def read(self, frame: np.ndarray) -> bool:
+        ret, image = self.__capture.read()
+        if not ret and self.__loop:
+            self.__capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.__capture.read()
+        if not ret:
+            return False
+        cv2.resize(image, self._capture_size, dst=frame, interpolation=cv2.INTER_AREA)
+        return True
+
+
+class SyntheticSource(FrameSource):
+    """
+    Fuente sintética con ruido de sensor y rectángulos en movimiento, reproducible con una semilla. Sirve para medir
+    el coste del pipeline sin imágenes; los recuentos no son significativos.
+    """
+    NUM_OBJECTS: int = 3
+
+    def __init__(self, camera: dict, conf: DetectorConf):
+        super().__init__(camera, conf)
+        self.__random = np.random.default_rng(int(camera.get("seed", 0)))
+        self.__num_frames: int = int(camera.get("frames", 0))
+        self.__frame_index: int = 0
+        width, height = self._capture_size
+        self.__background = self.__random.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        self.__positions = self.__random.uniform(0, 1, (self.NUM_OBJECTS, 2)) * [width, height]
+        self.__velocities = self.__random.uniform(-0.02, 0.02, (self.NUM_OBJECTS, 2)) * [width, height]
+        self.__colors = self.__random.integers(0, 256, (self.NUM_OBJECTS, 3))
+
+    def read(self, frame: np.ndarray) -> bool:
+        if 0 < self.__num_frames <= self.__frame_index:
+            return False
+        self.__frame_index += 1
+        width, height = self._capture_size
+        np.copyto(frame, self.__background)
+        self.__positions = np.mod(self.__positions + self.__velocities, [width, height])
+        for (x, y), color in zip(self.__positions.astype(int), self.__colors):
+            cv2.rectangle(frame, (x, y), (x + width // 8, y + height // 3), tuple(int(c) for c in color), -1)
+        return True
+
+
+def create_frame_source(camera: dict, conf: DetectorConf) -> FrameSource:
+    """
+    Crea la fuente de fotogramas de una cámara del detector según su clave source (por defecto picamera)
+    :param camera: Configuración de la cámara
+    :param conf: Configuración del detector
+    """
+    source = camera.get("source", FrameSources.PICAMERA)
+    if source == FrameSources.PICAMERA:
+        return PicameraSource(camera, conf)
+    elif source == FrameSources.IMAGES:
+        return ImageFolderSource(camera, conf)
+    elif source == FrameSources.VIDEO:
+        return VideoFileSource(camera, conf)
+    elif source == FrameSources.SYNTHETIC:
+        return SyntheticSource(camera, conf)
+    raise Exception(f"Fuente de fotogramas {source} no soportada")
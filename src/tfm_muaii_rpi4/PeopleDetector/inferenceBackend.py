@@ -0,0 +1,236 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "inferenceBackend"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import os
+import time
+import numpy as np
+import torch
+
+from yolov5.models.experimental import attempt_load
+from yolov5.models.yolo import Detect
+
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+
+Logs = LogsSingleton()
+
+
+class InferenceBackends:
+    PYTORCH = "pytorch"
+    TORCHSCRIPT = "torchscript"
+    ONNX = "onnx"
+
+    EXTENSIONS: dict = {
+        PYTORCH: ".pt",
+        TORCHSCRIPT: ".torchscript",
+        ONNX: ".onnx"
+    }
+    QUANTIZED_SUFFIX: str = "_int8"
+    SINGLE_CLASS_SUFFIX: str = "_person"
+
+
+class InferenceBackend:
+    """
+    Interfaz común de los motores de inferencia. Todos reciben el tensor preprocesado (B, 3, H, W) y devuelven la
+    predicción cruda de YOLOv5 (B, N, 5 + clases) como tensor de PyTorch, lista para el NMS.
+    """
+    name: str = ""
+
+    def __init__(self, model_file: str, device: torch.device):
+        self._model_file = model_file
+        self._device = device
+
+    def load(self) -> None:
+        pass
+
+    def __call__(self, img: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+    def warmup(self, input_shape: tuple, runs: int = 1) -> None:
+        """
+        Ejecuta inferencias sobre una entrada vacía para que la primera detección real no pague la inicialización
+        perezosa del motor (reserva de memoria, selección de kernels y, en TorchScript, la optimización del grafo)
+        :param input_shape: Forma del tensor de entrada
+        :param runs: Número de inferencias de calentamiento
+        """
+        dummy_input = torch.zeros(input_shape, dtype=torch.float32,
+                                  device=self._device).contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode():
+            for _ in range(runs):
+                self(dummy_input)
+
+
+class PytorchBackend(InferenceBackend):
+    name = InferenceBackends.PYTORCH
+
+    def __init__(self, model_file: str, device: torch.device, single_class: int = None):
+        """
+        :param single_class: Si se indica, la cabeza de detección se reduce a esa única clase al cargar el modelo
+        """
+        super().__init__(model_file, device)
+        self.__single_class = single_class
+
+    def load(self) -> None:
+        # attempt_load fusiona las capas Conv+BN en cada arranque; el artefacto TorchScript ya se exporta fusionado
+        self.__model = attempt_load(self._model_file, device=self._device, fuse=True)
+        if self.__single_class is not None:
+            prune_detect_head(self.__model, self.__single_class)
+        self.__model.to(self._device, memory_format=torch.channels_last).eval()
+
+    def get_model(self) -> torch.nn.Module:
+        return self.__model
+
+    def __call__(self, img: torch.Tensor) -> torch.Tensor:
+        return self.__model(img)[0]
+
+
+class TorchScriptBackend(InferenceBackend):
+    name = InferenceBackends.TORCHSCRIPT
+
+    def load(self) -> None:
+        self.__model = torch.jit.load(self._model_file, map_location=self._device)
+        self.__model.eval()
+
+    def __call__(self, img: torch.Tensor) -> torch.Tensor:
+        return self.__model(img)[0]
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    name = InferenceBackends.ONNX
+
+    def __init__(self, model_file: str, device: torch.device, num_threads: int = 0):
+        super().__init__(model_file, device)
+        self.__num_threads = num_threads
+
+    def load(self) -> None:
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.__num_threads > 0:
+            options.intra_op_num_threads = self.__num_threads
+        self.__session = onnxruntime.InferenceSession(self._model_file, sess_options=options,
+                                                      providers=["CPUExecutionProvider"])
+        self.__input_name = self.__session.get_inputs()[0].name
+
+    def __call__(self, img: torch.Tensor) -> torch.Tensor:
+        # ONNX Runtime necesita un array NCHW contiguo
+        input_array = np.ascontiguousarray(img.numpy())
+        outputs = self.__session.run(None, {self.__input_name: input_array})
+        return torch.from_numpy(outputs[0])
+
+
+def prune_detect_head(model: torch.nn.Module, class_index: int) -> None:
+    """
+    Reduce la cabeza Detect de YOLOv5 a una única clase. De cada anchor se conservan las salidas de caja y objectness y
+    la de la clase indicada, con lo que la última convolución pasa de na*(5+80) a na*6 canales y el NMS no tiene que
+    recorrer el resto de clases. Tras la poda, la clase conservada pasa a ser la 0.
+    """
+    for module in model.modules():
+        if isinstance(module, Detect):
+            keep: list = []
+            for anchor in range(module.na):
+                offset = anchor * module.no
+                keep.extend(range(offset, offset + 5))
+                keep.append(offset + 5 + class_index)
+            keep_index = torch.tensor(keep, dtype=torch.long)
+            for i, conv in enumerate(module.m):
+                pruned_conv = torch.nn.Conv2d(conv.in_channels, len(keep), conv.kernel_size, conv.stride, bias=True)
+                pruned_conv.weight.data = conv.weight.data[keep_index].clone()
+                pruned_conv.bias.data = conv.bias.data[keep_index].clone()
+                module.m[i] = pruned_conv.to(conv.weight.device)
+            module.nc = 1
+            module.no = 6
+    Logs.get_logger().info(f"Cabeza de detección reducida a la clase {class_index}", extra=__info__)
+
+
+def get_artifact_file(models_path: str, model_name: str, backend: str, input_shape: tuple,
+                      quantized: bool = False, single_class: bool = False) -> str:
+    """
+    Ruta del modelo para un motor de inferencia. Los artefactos exportados tienen el tamaño de entrada fijo, por lo que
+    se incluye en el nombre (p.ej. yolov5n_480x640.onnx, yolov5n_480x640_person.onnx con la cabeza reducida a personas
+    o yolov5n_480x640_int8.onnx para el modelo cuantizado). Con lotes de más de una imagen (asientos) el tamaño del
+    lote se antepone: yolov5n_4x192x192.onnx.
+    """
+    if backend == InferenceBackends.PYTORCH:
+        return os.path.join(models_path, f"{model_name}{InferenceBackends.EXTENSIONS[backend]}")
+    batch, height, width = input_shape[0], input_shape[2], input_shape[3]
+    if batch > 1:
+        model_name = f"{model_name}_{batch}x{height}x{width}"
+    else:
+        model_name = f"{model_name}_{height}x{width}"
+    suffix = InferenceBackends.SINGLE_CLASS_SUFFIX if single_class else ""
+    suffix += InferenceBackends.QUANTIZED_SUFFIX if quantized else ""
+    return os.path.join(models_path, f"{model_name}{suffix}{InferenceBackends.EXTENSIONS[backend]}")
+
+
+def create_backend(conf: DetectorConf, input_shape: tuple, device: torch.device,
+                   person_class: int) -> InferenceBackend:
+    """
+    Crea y carga el motor de inferencia indicado en la configuración del detector
+    :param conf: Configuración del detector de personas
+    :param input_shape: Forma del tensor de entrada
+    :param device: Dispositivo de inferencia
+    :param person_class: Índice de la clase persona, necesario para reducir la cabeza de detección
+    """
+    init_time = time.perf_counter()
+    backend = conf.backend
+    if conf.quantized and backend != InferenceBackends.ONNX:
+        raise Exception(f"El modelo cuantizado INT8 solo está disponible con el motor {InferenceBackends.ONNX}")
+    model_file = get_artifact_file(conf.models_path, conf.model_name, backend, input_shape, conf.quantized,
+                                   conf.single_class_head)
+    if backend == InferenceBackends.PYTORCH:
+        inference_backend = PytorchBackend(model_file, device, person_class if conf.single_class_head else None)
+    elif backend == InferenceBackends.TORCHSCRIPT:
+        inference_backend = TorchScriptBackend(model_file, device)
+    elif backend == InferenceBackends.ONNX:
+        inference_backend = OnnxRuntimeBackend(model_file, device, conf.num_threads)
+    else:
+        raise Exception(f"Motor de inferencia {backend} no soportado")
+    if not os.path.isfile(model_file):
+        raise Exception(f"No existe el modelo {model_file} para el motor {backend}, es necesario exportarlo")
+    if conf.num_threads > 0 and backend != InferenceBackends.ONNX:
+        torch.set_num_threads(conf.num_threads)
+    inference_backend.load()
+    Logs.get_logger().info(f"Motor de inferencia {backend} cargado desde {model_file} en "
+                           f"{time.perf_counter() - init_time:.2f} s", extra=__info__)
+    return inference_backend
+
+
+def export_model(conf: DetectorConf, backend: str, input_shape: tuple) -> str:
+    """
+    Exporta el modelo de PyTorch al formato del motor indicado y lo guarda junto al original, en yolo_models_path. Si
+    está activado single_class_head, se exporta con la cabeza de detección reducida a la clase persona. El artefacto
+    TorchScript se guarda congelado (pesos como constantes y Conv+BN fusionadas), de modo que al arrancar basta con
+    torch.jit.load, sin deserializar el .pt ni reconstruir y fusionar el modelo.
+    :return: Ruta del artefacto generado
+    """
+    device = torch.device("cpu")
+    single_class = conf.get_person_class() if conf.single_class_head else None
+    pytorch_backend = PytorchBackend(get_artifact_file(conf.models_path, conf.model_name, InferenceBackends.PYTORCH,
+                                                       input_shape), device, single_class)
+    pytorch_backend.load()
+    model = pytorch_backend.get_model().to(memory_format=torch.contiguous_format)
+    for module in model.modules():
+        if isinstance(module, Detect):
+            # Igual que en yolov5/export.py: la cabeza devuelve solo la predicción concatenada
+            module.inplace = False
+            module.export = True
+    dummy_input = torch.zeros(input_shape, dtype=torch.float32, device=device)
+    model(dummy_input)  # Inicializa las rejillas de la cabeza de detección
+    artifact_file = get_artifact_file(conf.models_path, conf.model_name, backend, input_shape,
+                                      single_class=conf.single_class_head)
+    if backend == InferenceBackends.TORCHSCRIPT:
+        traced_model = torch.jit.trace(model, dummy_input, strict=False)
+        frozen_model = torch.jit.freeze(traced_model.eval())
+        frozen_model(dummy_input)  # Comprueba que el modelo congelado se ejecuta antes de guardarlo
+        frozen_model.save(artifact_file)
+    elif backend == InferenceBackends.ONNX:
+        torch.onnx.export(model, dummy_input, artifact_file, opset_version=12, do_constant_folding=True,
+                          input_names=["images"], output_names=["output"])
+    else:
+        raise Exception(f"No se puede exportar el modelo al motor {backend}")
+    Logs.get_logger().info(f"Modelo {conf.model_name} exportado a {artifact_file}", extra=__info__)
+    return artifact_file
@@ -0,0 +1,94 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "motionGate"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Filtro de movimiento previo al detector. Cada fotograma se reduce a una imagen en escala de grises de baja resolución
+    y se compara con la del último fotograma en el que se ejecutó el detector. Solo se ejecuta la inferencia si la
+    fracción de píxeles que han cambiado supera un umbral o si ha pasado demasiado tiempo desde la última, de modo que
+    con el habitáculo estático se reutiliza el último recuento.
+    """
+    WIDTH: int = 80
+    PIXEL_THRESHOLD: int = 25
+    CHANGE_THRESHOLD: float = 0.02
+    MAX_STALENESS: float = 30.0
+
+    def __init__(self, frame_size: tuple, conf: dict = None):
+        """
+        :param frame_size: Tamaño (ancho, alto) de los fotogramas
+        :param conf: Configuración motion_gate del detector (enabled, width, pixel_threshold, threshold, max_staleness)
+        """
+        conf = conf or {}
+        self.__enabled: bool = bool(conf.get("enabled", True))
+        width = int(conf.get("width", self.WIDTH))
+        height = max(1, round(width * frame_size[1] / frame_size[0]))
+        self.__size: tuple = (width, height)
+        self.__pixel_threshold: int = int(conf.get("pixel_threshold", self.PIXEL_THRESHOLD))
+        self.__change_threshold: float = float(conf.get("threshold", self.CHANGE_THRESHOLD))
+        self.__max_staleness: float = float(conf.get("max_staleness", self.MAX_STALENESS))
+
+        self.__small = np.empty((height, width, 3), dtype=np.uint8)
+        self.__gray = np.empty((height, width), dtype=np.uint8)
+        self.__reference = np.empty((height, width), dtype=np.uint8)
+        self.__diff = np.empty((height, width), dtype=np.uint8)
+        self.__has_reference: bool = False
+        self.__last_inference_time: float = 0.0
+        self.__last_change: float = 0.0
+
+        self.__skipped: int = 0
+        self.__motion_triggered: int = 0
+        self.__staleness_triggered: int = 0
+
+    def should_infer(self, frame: np.ndarray, now: float = None) -> bool:
+        """
+        Indica si el fotograma ha cambiado lo suficiente para ejecutar el detector
+        :param frame: Fotograma BGR/RGB completo
+        :param now: Instante actual, por defecto time.time()
+        """
+        if not self.__enabled:
+            return True
+        if now is None:
+            now = time.time()
+        cv2.resize(frame, self.__size, dst=self.__small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.__small, cv2.COLOR_BGR2GRAY, dst=self.__gray)
+        if not self.__has_reference:
+            return True
+        cv2.absdiff(self.__gray, self.__reference, dst=self.__diff)
+        cv2.threshold(self.__diff, self.__pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.__diff)
+        self.__last_change = cv2.countNonZero(self.__diff) / self.__diff.size
+        if self.__last_change > self.__change_threshold:
+            self.__motion_triggered += 1
+            return True
+        if now - self.__last_inference_time > self.__max_staleness:
+            self.__staleness_triggered += 1
+            return True
+        self.__skipped += 1
+        return False
+
+    def mark_inferred(self, now: float = None) -> None:
+        """
+        Toma el último fotograma evaluado como referencia tras ejecutar el detector sobre él
+        """
+        if not self.__enabled:
+            return
+        np.copyto(self.__reference, self.__gray)
+        self.__has_reference = True
+        self.__last_inference_time = now if now is not None else time.time()
+
+    def get_skipped(self) -> int:
+        return self.__skipped
+
+    def get_last_change(self) -> float:
+        return self.__last_change
+
+    def summary_str(self) -> str:
+        return (f"inferencias omitidas: {self.__skipped}, por movimiento: {self.__motion_triggered}, "
+                f"por antigüedad: {self.__staleness_triggered}")
@@ -4,151 +4,225 @@ __module__ = "peopleCounter"
 __version__ = "0.1"
 __info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
 
-import os
+import time
 import cv2
-import torch
-import yaml
+from threading import Event, Thread
 
-from picamera2 import Picamera2
-from yolov5.models.experimental import attempt_load
-from yolov5.utils.general import non_max_suppression, xyxy2xywh
+from yolov5.utils.general import xyxy2xywh
 
 from tfm_muaii_rpi4.Environment.env import EnvSingleton
 from tfm_muaii_rpi4.DataPersistence.contextVarsMgr import ContextVarsMgrSingleton, ContextVarsConst
 from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectionPipeline import DetectionPipeline, DetectorStages
+from tfm_muaii_rpi4.PeopleDetector.detectionScheduler import DetectionScheduler
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.frameSource import FrameSource, create_frame_source
+from tfm_muaii_rpi4.PeopleDetector.motionGate import MotionGate
+from tfm_muaii_rpi4.PeopleDetector.peopleTracker import PeopleTracker
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
 from tfm_muaii_rpi4.Utils.utils import Service
 
 Logs = LogsSingleton()
 
 
+class _CameraDetection:
+    """
+    Estado de detección de una cámara: su fuente de fotogramas, el filtro de movimiento, el tracker y el último
+    recuento. Cada cámara sigue a sus propias personas; el total del vehículo es la suma de las cámaras.
+    """
+    def __init__(self, source: FrameSource, conf: DetectorConf):
+        self.source: FrameSource = source
+        self.motion_gate = MotionGate(conf.capture_size, conf.motion_gate)
+        self.tracker = PeopleTracker(conf.tracker)
+        self.last_sequence: int = 0
+        self.people: int = 0
+
+
 class _PeopleCounter(Service):
-    CONF_THRESHOLD: float = 0.1
-    IOU_THRESHOLD: float = 0.5
-    FILTER_FACTOR: float = 0.8
+    FRAME_TIMEOUT: float = 2.0
+    STATS_LOG_PERIOD: int = 60
+    SCHEDULER_CHECK_PERIOD: float = 1.0
 
     def __init__(self, show_image=False):
         super().__init__(__info__, is_thread=True)
         self._env = EnvSingleton()
         self._context_vars_mgr = ContextVarsMgrSingleton()
+        self.__conf = DetectorConf()
 
-        self.__smoothed_person_count: int = 0  # Inicializar el contador suavizado
+        self.__current_people: int = 0
         self.__show_image: bool = show_image
-        self.__classes: list = []
+        self.__model_ready = Event()
+        self.__model_error: Exception = None
+        self.__model_thread: Thread = None
+        self.__start_time: float = None
+        self.__first_count_logged: bool = False
+        self.__scheduler = DetectionScheduler(self.__conf.scheduler)
+        self.__stats = LatencyStats(DetectorStages.ALL)
         self.__init_camara()
 
         self.sleep_period = 1
 
     def __init_camara(self):
-        self.__device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model_path = self._env.get_path(self._env.yolo_models_path)
-        model_file = os.path.join(model_path, "yolov5n.pt")
-        self.__model = attempt_load(model_file, device=self.__device)
-        self.__model.to(self.__device).eval()
-
-        class_path = self._env.get_path(self._env.yolo_classes_path)
-        class_file = os.path.join(class_path, "coco.yaml")
-        self._load_yaml(class_file)
-
-        self.__camera = Picamera2()
-        camera_config = self.__camera.create_preview_configuration(main={"size": (640, 480), "format": "RGB888" })
-        self.__camera.configure(camera_config)
-
-    def _load_yaml(self, yaml_file):
-        with open(yaml_file, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            self.__classes = data["names"]
+        self.__pipeline = DetectionPipeline(self.__conf, self.__stats)
+        self.__cameras: list = [_CameraDetection(create_frame_source(camera, self.__conf), self.__conf)
+                                for camera in self.__conf.cameras]
 
     def start(self):
         try:
-            self.__camera.start()
+            self.__start_time = time.time()
+            self.__first_count_logged = False
+            # La carga y el calentamiento del modelo se solapan con el arranque de la cámara y del resto de servicios
+            self.__start_model_loading()
+            for camera in self.__cameras:
+                camera.source.start()
             super().start()
         except Exception as e:
             super().critical_error(e, "start")
 
     def stop(self):
         try:
-            self.__camera.stop()
+            # Primero se paran los hilos de captura e inferencia para que no queden bloqueados leyendo de la cámara
             super().stop()
+            for camera in self.__cameras:
+                camera.source.stop()
         except Exception as e:
             super().critical_error(e, "stop")
 
-    def _run(self):
+    def __start_model_loading(self):
+        if self.__model_ready.is_set() or (self.__model_thread is not None and self.__model_thread.is_alive()):
+            return
+        self.__model_error = None
+        self.__model_thread = Thread(target=self.__load_model)
+        self.__model_thread.daemon = True
+        self.__model_thread.name = f"THREAD_{__info__['module_name']}_model"
+        self.__model_thread.start()
+
+    def __load_model(self):
+        """
+        Carga el motor de inferencia y ejecuta las inferencias de calentamiento en segundo plano
+        """
         try:
-            if not self.__camera.is_open:
-                raise Exception("La camara no está lista para capturar imagenes.")
+            self.__pipeline.load_model()
+        except Exception as e:
+            Logs.get_logger().error(f"Error al cargar el modelo del detector de personas: {e}", extra=__info__)
+            self.__model_error = e
+        finally:
+            self.__model_ready.set()
+
+    def __wait_model(self) -> bool:
+        """
+        Espera a que el modelo esté cargado y calentado
+        :return: False si se ha pedido la parada del servicio antes de que el modelo esté listo
+        """
+        while not self.__model_ready.wait(self.SCHEDULER_CHECK_PERIOD):
+            if super().need_stop():
+                return False
+        if self.__model_error is not None:
+            raise self.__model_error
+        return True
 
+    def _run(self):
+        try:
+            for camera in self.__cameras:
+                if not camera.source.is_open():
+                    raise Exception(f"La camara {camera.source.name} no está lista para capturar imagenes.")
+                camera.source.start_capture(self.__scheduler, self.__stats, self._stop_thread)
+            if not self.__wait_model():
+                return
+            cycles_since_detection: int = self.__conf.detect_every
+            last_stats_time = time.time()
             while not super().need_stop():
-                frame = self.__camera.capture_array()
-                if frame is None:
-                    Logs.get_logger().error("Error al leer el fotograma de la camara", extra=__info__)
-                else:
-                    self.__process_frame(frame)
-                super().sleep_period()
+                wait_time = self.__scheduler.time_until_next_run()
+                if wait_time > 0:
+                    # Espera acotada para reaccionar a tiempo si el vehículo se detiene
+                    self._stop_thread.wait(min(wait_time, self.SCHEDULER_CHECK_PERIOD))
+                    continue
+                frames = self.__acquire_frames()
+                if frames is None:
+                    continue
+                try:
+                    with self.__stats.measure(DetectorStages.MOTION):
+                        run_detector = [camera.motion_gate.should_infer(frame) or camera.tracker.has_missed_tracks()
+                                        for camera, (frame, _) in zip(self.__cameras, frames)]
+                    # Sin cambios en ninguna cámara se mantiene el último recuento publicado, salvo que alguna
+                    # trayectoria confirmada haya dejado de detectarse: la referencia de la puerta de movimiento ya es
+                    # la escena sin la persona, así que se sigue infiriendo hasta descartarla. Con cambios, el detector
+                    # solo se ejecuta cada detect_every ciclos, sobre todas las cámaras en un único lote, y los
+                    # trackers mantienen las personas entre medias.
+                    cycles_since_detection += 1
+                    if any(run_detector) and cycles_since_detection >= self.__conf.detect_every:
+                        self.__process_frames(frames)
+                        for camera in self.__cameras:
+                            camera.motion_gate.mark_inferred()
+                        cycles_since_detection = 0
+                    else:
+                        for camera, camera_run, (_, timestamp) in zip(self.__cameras, run_detector, frames):
+                            if camera_run:
+                                camera.tracker.predict(timestamp)
+                finally:
+                    for camera in self.__cameras:
+                        camera.source.release()
+                self.__scheduler.mark_run()
+                if time.time() - last_stats_time > self.STATS_LOG_PERIOD:
+                    self.__log_stats()
+                    last_stats_time = time.time()
         except Exception as e:
             Logs.get_logger().error(f"Error en el run del detector de personas: {e}", extra=__info__)
             super().critical_error(e, "_run")
-
-    # def _run_cv2(self):
-    #     try:
-    #         cap = cv2.VideoCapture(0)
-    #
-    #         if not cap.isOpened():
-    #             Logs.get_logger().critical("No se pudo abrir la cámara para obtener imagenes.", extra=__info__)
-    #             raise Exception("No se pudo abrir la cámara para obtener imagenes.")
-    #
-    #         while not super().need_stop():
-    #             ret, frame = cap.read()
-    #             if not ret:
-    #                 Logs.get_logger().error("Error al leer el fotograma de la camara", extra=__info__)
-    #             else:
-    #                 self.__process_frame(frame)
-    #                 Logs.get_logger().info(f"Recuento de personas: {round(self.__smoothed_person_count)}",
-    #                                        extra=__info__)
-    #             super().sleep_period()
-    #
-    #         cap.release()
-    #         cv2.destroyAllWindows()
-    #     except Exception as e:
-    #         Logs.get_logger().error(f"Error en el run del detector de personas: {e}", extra=__info__)
-    #         super().critical_error(e, "_run")
-
-    # def _run_test_images(self):
-    #     try:
-    #         image_folder = self._env.get_path(self._env.images_test_path)
-    #         image_files = [f for f in os.listdir(image_folder) if f.endswith(('.jpg', '.png', '.jpeg'))]
-    #
-    #         for image_file in image_files:
-    #             image_path = os.path.join(image_folder, image_file)
-    #             frame = cv2.imread(image_path)
-    #
-    #             if frame is not None:
-    #                 self.__process_frame(frame)
-    #                 Logs.get_logger().info(f"Recuento de personas: {round(self._person_count)}", extra=__info__)
-    #             else:
-    #                 Logs.get_logger().error(f"Error al leer la imagen: {image_path}", extra=__info__)
-    #
-    #             super().sleep_period()
-    #
-    #     except Exception as e:
-    #         Logs.get_logger().error(f"Error en la ejecución del detector de personas: {e}", extra=__info__)
-    #         super().critical_error(e, "_run")
-
-    def __process_frame(self, frame):
-        pred = self.__detect(frame)
-        if pred is not None and len(pred) > 0:
+        finally:
+            for camera in self.__cameras:
+                camera.source.stop_capture()
+
+    def __acquire_frames(self):
+        """
+        Reserva el fotograma más reciente de cada cámara para el ciclo de detección
+        :return: Lista de (fotograma, timestamp) en el orden de las cámaras, o None si alguna cámara no tiene
+        fotogramas nuevos
+        """
+        frames: list = []
+        for camera in self.__cameras:
+            sequence, frame, timestamp = camera.source.acquire_latest(camera.last_sequence, self.FRAME_TIMEOUT)
+            if frame is None:
+                Logs.get_logger().warning(f"No se han recibido fotogramas nuevos de la camara {camera.source.name}",
+                                          extra=__info__)
+                for acquired_camera in self.__cameras[:len(frames)]:
+                    acquired_camera.source.release()
+                return None
+            camera.last_sequence = sequence
+            frames.append((frame, timestamp))
+        return frames
+
+    def get_snapshot(self, camera_index: int = 0, timeout: float = FRAME_TIMEOUT):
+        """
+        Obtiene una instantánea a resolución completa de una cámara (ver FrameSource.get_snapshot)
+        """
+        return self.__cameras[camera_index].source.get_snapshot(timeout)
+
+    def __log_stats(self):
+        cameras_str = ", ".join(camera.source.summary_str() for camera in self.__cameras)
+        gates_str = ", ".join(f"camara {camera.source.name}: {camera.motion_gate.summary_str()}"
+                              for camera in self.__cameras)
+        Logs.get_logger().info(f"{cameras_str}. {gates_str}. Latencias: {self.__stats.summary_str()}",
+                               extra=__info__)
+
+    def get_stats(self) -> dict:
+        return self.__stats.summary()
+
+    def __process_frames(self, frames: list):
+        preds, occupancy = self.__pipeline.detect([frame for frame, _ in frames])
+        for camera, pred, (_, timestamp) in zip(self.__cameras, preds, frames):
             # det = pred  # Todas las detecciones
             # det[:, :4] = xyxy2xywh(det[:, :4])  # Convertir coordenadas a xywh
 
             #xywh = det[:, :4].tolist()
-            labels_detected = pred[:, 5].int().tolist()
             # confidences = pred[:, 4].tolist()
 
             # for label, confidence, bbox in zip(labels, confidences, xywh):
-            #     object_name = self.__classes[label]
+            #     object_name = self.__pipeline.get_classes()[label]
             #     # print(f"Object detected: {object_name}, Confidence: {confidence:.2f}, Bounding Box: {bbox}")
             #     self._draw_bounding_box(frame, bbox, object_name, confidence)
 
-            self.__count_people(labels_detected)
+            self.__count_people(camera, pred, timestamp)
 
             # Mostrar el frame con las detecciones
             # if self.__show_image:
@@ -157,16 +231,9 @@ class _PeopleCounter(Service):
             #     # Salir al presionar 'q'
             #     if cv2.waitKey(1) & 0xFF == ord('q'):
             #         self.stop()
-
-    def __detect(self, frame):
-        img = torch.from_numpy(frame).to(self.__device)
-        img = img.float() / 255.0
-        img = img.permute(2, 0, 1).unsqueeze(0)  # Cambiar el orden de los canales y agregar dimensión batch
-
-        pred = self.__model(img)[0]
-        pred = non_max_suppression(pred, self.CONF_THRESHOLD, self.IOU_THRESHOLD)[0]
-
-        return pred
+        if occupancy:
+            self._context_vars_mgr.set_context_var(ContextVarsConst.OCUPACION_ASIENTOS, occupancy)
+        self.__update_people_count()
 
     # @staticmethod
     # def _draw_bounding_box(frame, bbox, label, confidence):
@@ -179,28 +246,33 @@ class _PeopleCounter(Service):
     #         cv2.rectangle(frame, (x1, y1), (x2, y2), color=(0, 255, 0), thickness=2)
     #         cv2.putText(frame, f"{label}: {confidence:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-    def __count_people(self, labels):
-        person_count = sum(1 for label in labels if self.__classes[label].lower() == 'person')
-        self.__update_people_count(person_count)
-
-    def __update_people_count(self, person_count):
-        Logs.get_logger().debug(f"Nueva detección de personas {self.get_current_people()} -> {person_count}",
-                                extra=__info__)
-        if self.get_current_people() == 0:  # Se le da mayor importancia a las nuevas personas detectadas
-            self.__smoothed_person_count = (
-                (1 - self.FILTER_FACTOR) * self.__smoothed_person_count + self.FILTER_FACTOR * person_count
-            )
-        else: # Se le da mayor importancia a las personas anteriormente detectadas
-            self.__smoothed_person_count = (
-                    self.FILTER_FACTOR * self.__smoothed_person_count + (1 - self.FILTER_FACTOR) * person_count
-            )
+    def __count_people(self, camera: _CameraDetection, pred, timestamp: float):
+        with self.__stats.measure(DetectorStages.COUNT):
+            # El NMS ya filtra por la clase persona: cada detección (caja xyxy y confianza) alimenta el tracker de su
+            # cámara y el recuento es el número de personas confirmadas
+            camera.people = camera.tracker.update(pred[:, :5].cpu().numpy(), timestamp)
+
+    def __update_people_count(self):
+        person_count = sum(camera.people for camera in self.__cameras)
+        if person_count != self.__current_people:
+            Logs.get_logger().debug(f"Nueva detección de personas {self.__current_people} -> {person_count}",
+                                    extra=__info__)
+        self.__current_people = person_count
         self.__set_current_people()
+        if not self.__first_count_logged:
+            self.__first_count_logged = True
+            Logs.get_logger().info(f"Primer recuento de personas publicado {time.time() - self.__start_time:.2f} s "
+                                   f"tras el arranque del servicio", extra=__info__)
 
     def __set_current_people(self):
+        self._context_vars_mgr.set_context_var(ContextVarsConst.PERSONAS_CAMARAS, self.get_people_by_camera())
         self._context_vars_mgr.set_context_var(ContextVarsConst.PERSONAS, self.get_current_people())
 
-    def get_current_people(self):
-        return round(self.__smoothed_person_count)
+    def get_current_people(self) -> int:
+        return self.__current_people
+
+    def get_people_by_camera(self) -> dict:
+        return {camera.source.name: camera.people for camera in self.__cameras}
 
 
 class PeopleCounterSingleton:
@@ -208,5 +280,10 @@ class PeopleCounterSingleton:
 
     def __new__(cls):
         if PeopleCounterSingleton.__instance is None:
-            PeopleCounterSingleton.__instance = _PeopleCounter()
+            if DetectorConf().process.get("enabled", False):
+                # Importación diferida: el módulo del proceso hijo importa este mismo módulo
+                from tfm_muaii_rpi4.PeopleDetector.peopleCounterProcess import _PeopleCounterProcess
+                PeopleCounterSingleton.__instance = _PeopleCounterProcess()
+            else:
+                PeopleCounterSingleton.__instance = _PeopleCounter()
         return PeopleCounterSingleton.__instance
@@ -0,0 +1,219 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "peopleCounterProcess"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import multiprocessing
+import time
+from threading import Lock
+
+from tfm_muaii_rpi4.DataPersistence.contextVarsMgr import ContextVarsMgrSingleton, ContextVarsConst
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.Utils.utils import Service
+
+Logs = LogsSingleton()
+
+
+class ProcessMessages:
+    CONTEXT_VARS = "context_vars"
+    STATS = "stats"
+
+    # Variables de contexto que publica el detector en el proceso hijo y se replican en el proceso principal
+    REPORTED_VARS: list = [ContextVarsConst.PERSONAS, ContextVarsConst.PERSONAS_CAMARAS,
+                           ContextVarsConst.OCUPACION_ASIENTOS]
+    # Variables de contexto del proceso principal que necesita el detector (planificador)
+    FORWARDED_VARS: list = [ContextVarsConst.VEHICULO_PARADO]
+
+
+REPORT_PERIOD: float = 1.0
+
+
+def run_people_counter_process(conn, stop_event) -> None:
+    """
+    Punto de entrada del proceso hijo: ejecuta el detector de personas en su propio intérprete y envía por la tubería
+    sus variables de contexto y latencias cada REPORT_PERIOD segundos, que sirven también de latido para el proceso
+    principal. Termina al activarse stop_event, al cerrarse la tubería o si el hilo del detector se detiene.
+    """
+    from tfm_muaii_rpi4.PeopleDetector.peopleCounter import _PeopleCounter
+    context_vars_mgr = ContextVarsMgrSingleton()
+    people_counter = _PeopleCounter()
+    people_counter.start()
+    try:
+        while not stop_event.is_set():
+            while conn.poll():
+                for var, value in conn.recv().items():
+                    context_vars_mgr.set_context_var(var, value)
+            if not people_counter._get_run_status():
+                raise Exception("El hilo del detector de personas ha terminado")
+            conn.send({ProcessMessages.CONTEXT_VARS: {var: context_vars_mgr.get_context_var(var)
+                                                      for var in ProcessMessages.REPORTED_VARS},
+                       ProcessMessages.STATS: people_counter.get_stats()})
+            stop_event.wait(REPORT_PERIOD)
+    except (EOFError, BrokenPipeError):
+        Logs.get_logger().warning("Se ha perdido la comunicación con el proceso principal", extra=__info__)
+    finally:
+        people_counter.stop()
+        conn.close()
+
+
+class _PeopleCounterProcess(Service):
+    """
+    Detector de personas en un proceso hijo, para que su pre y postprocesado en Python no compita por el GIL con los
+    hilos del GPS, la pantalla y el acelerómetro. Ofrece la misma interfaz que el detector en hilo: el proceso principal
+    recibe el recuento por una tubería y lo publica en sus variables de contexto. El hilo del servicio supervisa el
+    proceso hijo y lo reinicia si termina o deja de enviar latidos.
+    """
+    POLL_PERIOD: float = 1.0
+    STARTUP_TIMEOUT: float = 120.0
+    HEARTBEAT_TIMEOUT: float = 10.0
+    RESTART_DELAY: float = 5.0
+    MAX_RESTARTS: int = 0
+    STOP_TIMEOUT: float = 10.0
+    START_METHOD: str = "spawn"
+
+    def __init__(self):
+        super().__init__(__info__, is_thread=True)
+        self._context_vars_mgr = ContextVarsMgrSingleton()
+        conf: dict = DetectorConf().process
+        self.__startup_timeout: float = float(conf.get("startup_timeout", self.STARTUP_TIMEOUT))
+        self.__heartbeat_timeout: float = float(conf.get("heartbeat_timeout", self.HEARTBEAT_TIMEOUT))
+        self.__restart_delay: float = float(conf.get("restart_delay", self.RESTART_DELAY))
+        self.__max_restarts: int = int(conf.get("max_restarts", self.MAX_RESTARTS))
+        # Con spawn el hijo arranca un intérprete limpio, sin heredar los hilos ni los singletons del proceso principal
+        self.__mp_context = multiprocessing.get_context(self.START_METHOD)
+        self.__process = None
+        self.__conn = None
+        self.__process_stop = None
+        self.__process_lock = Lock()
+        self.__current_people: int = 0
+        self.__people_by_camera: dict = {}
+        self.__stats: dict = {}
+        self.__restarts: int = 0
+
+        self.sleep_period = 1
+
+    def start(self):
+        try:
+            super().start()
+        except Exception as e:
+            super().critical_error(e, "start")
+
+    def stop(self):
+        try:
+            # Se para antes el proceso hijo para que el hilo supervisor no lo reinicie
+            self._stop_thread.set()
+            self.__stop_process()
+            super().stop()
+        except Exception as e:
+            super().critical_error(e, "stop")
+
+    def _run(self):
+        try:
+            while not super().need_stop():
+                self.__start_process()
+                self.__supervise()
+                self.__stop_process()
+                if super().need_stop():
+                    break
+                self.__restarts += 1
+                if 0 < self.__max_restarts < self.__restarts:
+                    raise Exception(f"Superado el número máximo de reinicios ({self.__max_restarts}) del proceso del "
+                                    f"detector de personas")
+                Logs.get_logger().warning(f"Reinicio {self.__restarts} del proceso del detector de personas en "
+                                          f"{self.__restart_delay} s", extra=__info__)
+                self._stop_thread.wait(self.__restart_delay)
+        except Exception as e:
+            Logs.get_logger().error(f"Error en la supervisión del proceso del detector de personas: {e}",
+                                    extra=__info__)
+            super().critical_error(e, "_run")
+        finally:
+            self.__stop_process()
+
+    def __start_process(self):
+        with self.__process_lock:
+            self.__conn, child_conn = self.__mp_context.Pipe()
+            self.__process_stop = self.__mp_context.Event()
+            self.__process = self.__mp_context.Process(target=run_people_counter_process,
+                                                       args=(child_conn, self.__process_stop),
+                                                       name=f"PROCESS_{__info__['module_name']}", daemon=True)
+            self.__process.start()
+            child_conn.close()
+        Logs.get_logger().info(f"Proceso del detector de personas iniciado (pid {self.__process.pid})",
+                               extra=__info__)
+
+    def __stop_process(self):
+        with self.__process_lock:
+            if self.__process is None:
+                return
+            self.__process_stop.set()
+            self.__process.join(self.STOP_TIMEOUT)
+            if self.__process.is_alive():
+                Logs.get_logger().warning("El proceso del detector de personas no ha terminado, se fuerza su salida",
+                                          extra=__info__)
+                self.__process.terminate()
+                self.__process.join(self.STOP_TIMEOUT)
+            Logs.get_logger().info(f"Proceso del detector de personas terminado con código {self.__process.exitcode}",
+                                   extra=__info__)
+            self.__conn.close()
+            self.__process = None
+
+    def __supervise(self):
+        """
+        Reenvía al proceso hijo las variables de contexto que necesita y publica los recuentos que recibe. Vuelve
+        cuando se pide la parada del servicio o cuando el proceso hijo termina o deja de enviar latidos.
+        """
+        # Referencias locales: stop() puede cerrar la tubería y liberar el proceso desde otro hilo
+        process, conn = self.__process, self.__conn
+        start_time = time.time()
+        last_message: float = None
+        forwarded: dict = {}
+        while not super().need_stop():
+            try:
+                for var in ProcessMessages.FORWARDED_VARS:
+                    value = self._context_vars_mgr.get_context_var(var)
+                    if var not in forwarded or forwarded[var] != value:
+                        conn.send({var: value})
+                        forwarded[var] = value
+                if conn.poll(self.POLL_PERIOD):
+                    self.__process_message(conn.recv())
+                    last_message = time.time()
+                    continue
+            except (EOFError, OSError) as e:
+                if not super().need_stop():
+                    Logs.get_logger().error(f"Error en la comunicación con el proceso del detector de personas: {e}",
+                                            extra=__info__)
+                return
+            if not process.is_alive():
+                Logs.get_logger().error(f"El proceso del detector de personas ha terminado con código "
+                                        f"{process.exitcode}", extra=__info__)
+                return
+            if last_message is None and time.time() - start_time > self.__startup_timeout:
+                Logs.get_logger().error(f"El proceso del detector de personas no ha respondido en "
+                                        f"{self.__startup_timeout} s tras su arranque", extra=__info__)
+                return
+            if last_message is not None and time.time() - last_message > self.__heartbeat_timeout:
+                Logs.get_logger().error(f"El proceso del detector de personas no envía latidos desde hace "
+                                        f"{self.__heartbeat_timeout} s", extra=__info__)
+                return
+
+    def __process_message(self, message: dict):
+        context_vars: dict = message.get(ProcessMessages.CONTEXT_VARS, {})
+        for var, value in context_vars.items():
+            self._context_vars_mgr.set_context_var(var, value)
+        self.__current_people = context_vars.get(ContextVarsConst.PERSONAS, self.__current_people)
+        self.__people_by_camera = context_vars.get(ContextVarsConst.PERSONAS_CAMARAS, self.__people_by_camera)
+        self.__stats = message.get(ProcessMessages.STATS, self.__stats)
+
+    def get_current_people(self) -> int:
+        return self.__current_people
+
+    def get_people_by_camera(self) -> dict:
+        return self.__people_by_camera
+
+    def get_stats(self) -> dict:
+        return self.__stats
+
+    def get_restarts(self) -> int:
+        return self.__restarts
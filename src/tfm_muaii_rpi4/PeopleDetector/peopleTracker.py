@@ -0,0 +1,196 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "peopleTracker"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+import numpy as np
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Matriz de IoU entre dos conjuntos de cajas xyxy
+    :param boxes_a: Array (N, 4)
+    :param boxes_b: Array (M, 4)
+    :return: Array (N, M)
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:4], boxes_b[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:4] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:4] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def greedy_match(iou: np.ndarray, iou_threshold: float) -> (list, list, list):
+    """
+    Asociación voraz por IoU descendente. Con pocas personas en el habitáculo da el mismo resultado que el algoritmo
+    húngaro sin depender de scipy.
+    :return: Parejas (fila, columna), filas sin asociar y columnas sin asociar
+    """
+    matches: list = []
+    if iou.size > 0:
+        candidates = np.argwhere(iou >= iou_threshold)
+        order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]])
+        used_rows: set = set()
+        used_cols: set = set()
+        for row, col in candidates[order]:
+            if row in used_rows or col in used_cols:
+                continue
+            matches.append((int(row), int(col)))
+            used_rows.add(row)
+            used_cols.add(col)
+    matched_rows = {row for row, _ in matches}
+    matched_cols = {col for _, col in matches}
+    unmatched_rows = [row for row in range(iou.shape[0]) if row not in matched_rows]
+    unmatched_cols = [col for col in range(iou.shape[1]) if col not in matched_cols]
+    return matches, unmatched_rows, unmatched_cols
+
+
+class _Track:
+    """
+    Persona seguida con un filtro de Kalman de velocidad constante sobre el estado [cx, cy, s, r, vx, vy, vs] (centro,
+    área y relación de aspecto de la caja, como en SORT). Las velocidades se expresan por segundo para que el modelo
+    sea válido con detecciones a intervalos irregulares.
+    """
+    MEASUREMENT_NOISE = np.diag([1.0, 1.0, 10.0, 0.01]).astype(np.float64)
+    PROCESS_NOISE = np.diag([1.0, 1.0, 1.0, 0.01, 0.1, 0.1, 0.01]).astype(np.float64)
+    H = np.eye(4, 7, dtype=np.float64)
+
+    def __init__(self, track_id: int, box: np.ndarray, now: float):
+        self.track_id: int = track_id
+        self.hits: int = 1
+        self.misses: int = 0
+        self.confirmed: bool = False
+        self.__state = np.zeros(7, dtype=np.float64)
+        self.__state[:4] = self.__box_to_measurement(box)
+        self.__covariance = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+        self.__last_time: float = now
+
+    @staticmethod
+    def __box_to_measurement(box: np.ndarray) -> np.ndarray:
+        width = box[2] - box[0]
+        height = box[3] - box[1]
+        return np.array([box[0] + width / 2, box[1] + height / 2, width * height, width / max(height, 1e-6)])
+
+    def predict(self, now: float) -> None:
+        dt = max(now - self.__last_time, 0.0)
+        self.__last_time = now
+        if dt == 0:
+            return
+        if self.__state[2] + self.__state[6] * dt <= 0:
+            self.__state[6] = 0.0
+        transition = np.eye(7, dtype=np.float64)
+        transition[0, 4] = transition[1, 5] = transition[2, 6] = dt
+        self.__state = transition @ self.__state
+        self.__covariance = transition @ self.__covariance @ transition.T + self.PROCESS_NOISE * dt
+
+    def update(self, box: np.ndarray) -> None:
+        innovation = self.__box_to_measurement(box) - self.H @ self.__state
+        innovation_cov = self.H @ self.__covariance @ self.H.T + self.MEASUREMENT_NOISE
+        gain = self.__covariance @ self.H.T @ np.linalg.inv(innovation_cov)
+        self.__state = self.__state + gain @ innovation
+        self.__covariance = (np.eye(7) - gain @ self.H) @ self.__covariance
+        self.hits += 1
+        self.misses = 0
+
+    def get_box(self) -> np.ndarray:
+        cx, cy, area, ratio = self.__state[:4]
+        width = np.sqrt(max(area, 0.0) * max(ratio, 1e-6))
+        height = area / width if width > 0 else 0.0
+        return np.array([cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2])
+
+
+class PeopleTracker:
+    """
+    Seguimiento multi-objeto de personas por IoU con filtro de Kalman, en dos etapas al estilo de ByteTrack: las
+    detecciones de alta confianza se asocian primero y pueden crear nuevas trayectorias, y las de baja confianza solo
+    sirven para mantener trayectorias existentes (personas parcialmente ocultas). Una trayectoria cuenta como persona
+    cuando se ha confirmado en min_hits detecciones y deja de contar tras max_misses inferencias sin asociarse. Los
+    fotogramas sin inferencia no envejecen las trayectorias, por lo que el recuento se mantiene estable aunque el
+    detector solo se ejecute cada N fotogramas; mientras alguna trayectoria confirmada acumule fallos
+    (has_missed_tracks), el detector debe seguir ejecutándose para confirmar o descartar su salida.
+    """
+    HIGH_THRESHOLD: float = 0.4
+    IOU_THRESHOLD: float = 0.3
+    MIN_HITS: int = 2
+    MAX_MISSES: int = 3
+
+    def __init__(self, conf: dict = None):
+        """
+        :param conf: Configuración tracker del detector (high_threshold, iou_threshold, min_hits, max_misses)
+        """
+        conf = conf or {}
+        self.__high_threshold: float = float(conf.get("high_threshold", self.HIGH_THRESHOLD))
+        self.__iou_threshold: float = float(conf.get("iou_threshold", self.IOU_THRESHOLD))
+        self.__min_hits: int = int(conf.get("min_hits", self.MIN_HITS))
+        self.__max_misses: int = int(conf.get("max_misses", self.MAX_MISSES))
+        self.__tracks: list = []
+        self.__next_id: int = 1
+
+    def predict(self, now: float = None) -> None:
+        """
+        Avanza las trayectorias sin detecciones, para fotogramas en los que no se ejecuta el detector
+        """
+        if now is None:
+            now = time.time()
+        for track in self.__tracks:
+            track.predict(now)
+
+    def update(self, detections: np.ndarray, now: float = None) -> int:
+        """
+        Actualiza las trayectorias con las detecciones de una inferencia
+        :param detections: Array (N, 5) con cajas xyxy en coordenadas del fotograma y confianza
+        :param now: Instante de la captura
+        :return: Número de personas confirmadas
+        """
+        if now is None:
+            now = time.time()
+        self.predict(now)
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 5)
+        high = detections[detections[:, 4] >= self.__high_threshold]
+        low = detections[detections[:, 4] < self.__high_threshold]
+
+        # Etapa 1: detecciones de alta confianza contra todas las trayectorias
+        track_boxes = np.array([track.get_box() for track in self.__tracks]).reshape(-1, 4)
+        matches, unmatched_tracks, unmatched_high = greedy_match(iou_matrix(track_boxes, high[:, :4]),
+                                                                 self.__iou_threshold)
+        for track_index, detection_index in matches:
+            self.__tracks[track_index].update(high[detection_index, :4])
+
+        # Etapa 2: detecciones de baja confianza contra las trayectorias restantes
+        remaining = [self.__tracks[index] for index in unmatched_tracks]
+        remaining_boxes = np.array([track.get_box() for track in remaining]).reshape(-1, 4)
+        matches, unmatched_remaining, _ = greedy_match(iou_matrix(remaining_boxes, low[:, :4]), self.__iou_threshold)
+        for track_index, detection_index in matches:
+            remaining[track_index].update(low[detection_index, :4])
+        for track_index in unmatched_remaining:
+            remaining[track_index].misses += 1
+
+        for detection_index in unmatched_high:
+            self.__tracks.append(_Track(self.__next_id, high[detection_index, :4], now))
+            self.__next_id += 1
+
+        for track in self.__tracks:
+            if track.hits >= self.__min_hits:
+                track.confirmed = True
+        self.__tracks = [track for track in self.__tracks if track.misses <= self.__max_misses]
+        return self.get_count()
+
+    def has_missed_tracks(self) -> bool:
+        """
+        Indica si alguna trayectoria confirmada no se asoció en la última inferencia (posible persona que ha salido)
+        """
+        return any(track.confirmed and track.misses > 0 for track in self.__tracks)
+
+    def get_count(self) -> int:
+        return sum(1 for track in self.__tracks if track.confirmed)
+
+    def get_tracks(self) -> list:
+        """
+        Trayectorias confirmadas como lista de (id, caja xyxy)
+        """
+        return [(track.track_id, track.get_box()) for track in self.__tracks if track.confirmed]
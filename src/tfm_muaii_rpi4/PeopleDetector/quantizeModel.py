@@ -0,0 +1,171 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "PeopleDetector"
+__module__ = "quantizeModel"
+__version__ = "0.1"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Cuantización INT8 estática del modelo ONNX del detector de personas, calibrada con una carpeta de imágenes, y
+# generación del informe de precisión frente a latencia respecto al modelo FP32:
+#     python -m tfm_muaii_rpi4.PeopleDetector.quantizeModel --images /ruta/imagenes_calibracion
+# El modelo se activa con "backend": "onnx" y "quantized": true en services.people_detector de settings.json.
+
+import argparse
+import json
+import os
+import time
+import cv2
+import onnx
+import torch
+from dotenv import load_dotenv
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from yolov5.utils.general import non_max_suppression
+
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.PeopleDetector.detectorConf import DetectorConf
+from tfm_muaii_rpi4.PeopleDetector.framePreprocessor import CameraBatchPreprocessor, create_preprocessor
+from tfm_muaii_rpi4.PeopleDetector.inferenceBackend import InferenceBackends, OnnxRuntimeBackend, export_model, \
+    get_artifact_file
+from tfm_muaii_rpi4.Utils.metrics.latencyStats import LatencyStats
+from tfm_muaii_rpi4.Utils.metrics.memoryStats import get_rss_mb
+
+Logs = LogsSingleton()
+
+IMAGE_EXTENSIONS: tuple = ('.jpg', '.png', '.jpeg')
+# La cabeza Detect es la capa 24 en todos los modelos YOLOv5 P5. La decodificación de cajas (sigmoid, rejillas, anchors)
+# se mantiene en float para no perder precisión en las coordenadas.
+DETECT_LAYER: str = "model.24"
+CONF_THRESHOLD: float = 0.1
+IOU_THRESHOLD: float = 0.5
+
+
+def load_images(image_folder: str, frame_size: tuple) -> list:
+    image_files = sorted(f for f in os.listdir(image_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    images: list = []
+    for image_file in image_files:
+        frame = cv2.imread(os.path.join(image_folder, image_file))
+        if frame is None:
+            Logs.get_logger().error(f"Error al leer la imagen: {image_file}", extra=__info__)
+            continue
+        images.append((image_file, cv2.resize(frame, frame_size)))
+    return images
+
+
+class _CalibrationReader(CalibrationDataReader):
+    def __init__(self, images: list, preprocessor: CameraBatchPreprocessor, input_name: str):
+        self.__images = iter(images)
+        self.__preprocessor = preprocessor
+        self.__input_name = input_name
+
+    def get_next(self) -> dict:
+        image = next(self.__images, None)
+        if image is None:
+            return None
+        frames = [image[1]] * self.__preprocessor.get_num_cameras()
+        return {self.__input_name: self.__preprocessor(frames).contiguous().numpy().copy()}
+
+
+def quantize_model(fp32_file: str, int8_file: str, images: list, preprocessor: CameraBatchPreprocessor) -> None:
+    onnx_model = onnx.load(fp32_file)
+    input_name = onnx_model.graph.input[0].name
+    nodes_to_exclude = [node.name for node in onnx_model.graph.node
+                        if DETECT_LAYER in node.name and node.op_type != "Conv"]
+    quantize_static(fp32_file, int8_file, _CalibrationReader(images, preprocessor, input_name),
+                    quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    per_channel=True, nodes_to_exclude=nodes_to_exclude)
+    Logs.get_logger().info(f"Modelo INT8 generado en {int8_file}", extra=__info__)
+
+
+def count_people(backend: OnnxRuntimeBackend, img: torch.Tensor, person_class: int, stats: LatencyStats,
+                 stage: str) -> int:
+    with torch.inference_mode():
+        with stats.measure(stage):
+            pred = backend(img)
+        preds = non_max_suppression(pred, CONF_THRESHOLD, IOU_THRESHOLD, classes=[person_class])
+    return sum(len(pred) for pred in preds)
+
+
+def build_report(conf: DetectorConf, fp32_file: str, int8_file: str, images: list,
+                 preprocessor: CameraBatchPreprocessor) -> dict:
+    """
+    Compara el recuento de personas y la latencia de los modelos FP32 e INT8 sobre el mismo conjunto de imágenes
+    """
+    person_class = 0 if conf.single_class_head else conf.get_person_class()
+    device = torch.device("cpu")
+    stats = LatencyStats([InferenceBackends.ONNX, "int8"])
+
+    rss_init = get_rss_mb()
+    fp32_backend = OnnxRuntimeBackend(fp32_file, device, conf.num_threads)
+    fp32_backend.load()
+    rss_fp32 = get_rss_mb()
+    int8_backend = OnnxRuntimeBackend(int8_file, device, conf.num_threads)
+    int8_backend.load()
+    rss_int8 = get_rss_mb()
+
+    per_image: list = []
+    for image_file, frame in images:
+        # Con varias cámaras la misma imagen ocupa la entrada de todas ellas
+        img = preprocessor([frame] * preprocessor.get_num_cameras())
+        fp32_count = count_people(fp32_backend, img, person_class, stats, InferenceBackends.ONNX)
+        int8_count = count_people(int8_backend, img, person_class, stats, "int8")
+        per_image.append({"image": image_file, "fp32": fp32_count, "int8": int8_count})
+
+    summary = stats.summary()
+    errors = [abs(result["fp32"] - result["int8"]) for result in per_image]
+    total = max(len(per_image), 1)
+    return {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "images": len(per_image),
+        "input_shape": list(preprocessor.get_input_shape()),
+        "count_exact_match": round(sum(1 for error in errors if error == 0) / total, 4),
+        "count_mean_abs_error": round(sum(errors) / total, 4),
+        "fp32": {"file_mb": round(os.path.getsize(fp32_file) / 2**20, 2),
+                 "rss_load_mb": round(rss_fp32 - rss_init, 2),
+                 "mean_ms": summary[InferenceBackends.ONNX]["mean_ms"],
+                 "max_ms": summary[InferenceBackends.ONNX]["max_ms"]},
+        "int8": {"file_mb": round(os.path.getsize(int8_file) / 2**20, 2),
+                 "rss_load_mb": round(rss_int8 - rss_fp32, 2),
+                 "mean_ms": summary["int8"]["mean_ms"],
+                 "max_ms": summary["int8"]["max_ms"]},
+        "per_image": per_image
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Cuantiza a INT8 el modelo del detector de personas")
+    parser.add_argument("--images", required=True, help="Carpeta de imágenes de calibración y evaluación")
+    parser.add_argument("--max-calibration-images", type=int, default=200)
+    parser.add_argument("--report-only", action="store_true", help="No cuantiza, solo genera el informe")
+    args = parser.parse_args()
+
+    conf = DetectorConf()
+    preprocessor = create_preprocessor(conf, torch.device("cpu"))
+    input_shape = preprocessor.get_input_shape()
+    fp32_file = get_artifact_file(conf.models_path, conf.model_name, InferenceBackends.ONNX, input_shape,
+                                  single_class=conf.single_class_head)
+    int8_file = get_artifact_file(conf.models_path, conf.model_name, InferenceBackends.ONNX, input_shape,
+                                  quantized=True, single_class=conf.single_class_head)
+    if not os.path.isfile(fp32_file):
+        export_model(conf, InferenceBackends.ONNX, input_shape)
+
+    images = load_images(args.images, conf.capture_size)
+    if len(images) == 0:
+        raise Exception(f"No hay imágenes en {args.images}")
+    if not args.report_only:
+        quantize_model(fp32_file, int8_file, images[:args.max_calibration_images], preprocessor)
+
+    report = build_report(conf, fp32_file, int8_file, images, preprocessor)
+    report_file = os.path.splitext(int8_file)[0] + "_report.json"
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Imágenes: {report['images']} - Recuentos idénticos: {report['count_exact_match'] * 100:.1f} % - "
+          f"Error medio: {report['count_mean_abs_error']} personas")
+    print(f"FP32: {report['fp32']['mean_ms']} ms/imagen, {report['fp32']['file_mb']} MB, "
+          f"RSS +{report['fp32']['rss_load_mb']} MB")
+    print(f"INT8: {report['int8']['mean_ms']} ms/imagen, {report['int8']['file_mb']} MB, "
+          f"RSS +{report['int8']['rss_load_mb']} MB")
+    print(f"Informe guardado en {report_file}")
+
+
+if __name__ == "__main__":
+    main()
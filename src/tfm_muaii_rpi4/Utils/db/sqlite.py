@@ -32,6 +32,25 @@ class SqlUtils:
                 connection.close()
         return check
 
+    def insert_many_sql(self, sql: str, params_list: list) -> bool:
+        """
+        Inserta varios registros con la misma sentencia en una única transacción
+        """
+        connection: Connection = None
+        check: bool = False
+        try:
+            connection = sqlite3.connect(self._path)
+            cursor = connection.cursor()
+            cursor.executemany(sql, params_list)
+            connection.commit()
+            check = True
+        except Exception as ex:
+            Logs.get_logger().error("Error al insertar en la base de datos: %s", ex, exc_info=True, extra=__file__)
+        finally:
+            if connection:
+                connection.close()
+        return check
+
     def update_sql(self, sql: str, params: tuple) -> bool:
         connection: Connection = None
         check: bool = False
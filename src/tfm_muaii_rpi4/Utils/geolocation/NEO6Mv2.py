@@ -4,9 +4,21 @@ __module__ = "NEO6Mv2"
 __version__ = "1.0"
 __info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
 
+import calendar
+import datetime
+import struct
+import time
+from functools import reduce
+from operator import xor
+from threading import Condition, Event, Thread
+from typing import NamedTuple
+
 from serial import Serial, SerialException
 
 from tfm_muaii_rpi4.Utils.geolocation.geoUtils import Coordinates
+from tfm_muaii_rpi4.Utils.geolocation.ubxProtocol import UbxMessages, NavSolution, build_ubx_message, \
+    cfg_msg_payload, cfg_prt_payload, cfg_rate_payload, get_ubx_frame_length, parse_ack, parse_nav_pvt, parse_nav_sol, \
+    parse_ubx_frame
 from tfm_muaii_rpi4.DataPersistence.contextVarsMgr import ContextVarsMgrSingleton, ContextVarsConst
 from tfm_muaii_rpi4.Logger.logger import LogsSingleton
 
@@ -20,6 +32,13 @@ class NmeaMessages():
     GPGSV = "$GPGSV"
     GPGSA = "$GPGSA"
 
+    # Tipos de sentencia sin el emisor: $GP (GPS), $GN (varias constelaciones), $GL (GLONASS)...
+    GGA = "GGA"
+    GLL = "GLL"
+    RMC = "RMC"
+    GSV = "GSV"
+    GSA = "GSA"
+
 
 class GPGGASentence:
     POS_UTC_TIME = 1
@@ -103,14 +122,74 @@ class GPGSASentence:
     POS_VERTICAL_PRECISION = 17
 
 
+class GpsFix(NamedTuple):
+    """
+    Fijación GPS publicada por el lector. Es inmutable: el lector publica una nueva en cada sentencia o mensaje UBX con
+    posición válida, combinando la posición con los últimos datos de velocidad, rumbo y precisión recibidos.
+    """
+    coordinates: Coordinates
+    sequence: int
+    received: float                 # Instante de recepción (time.time())
+    sentence: str                   # Sentencia o mensaje UBX que aportó la posición (GGA, GLL, RMC, NAV-PVT, NAV-SOL)
+    speed: float = None             # Velocidad sobre el suelo en km/h (RMC, UBX)
+    course: float = None            # Rumbo sobre el suelo en grados (RMC, UBX)
+    gps_time: float = None          # Hora UTC de la fijación según el receptor, en segundos desde epoch (RMC, UBX)
+    satellites_used: int = None     # Satélites utilizados en la fijación (GGA, UBX)
+    hdop: float = None              # Dilución horizontal de la precisión (GGA)
+    accuracy: float = None          # Precisión estimada de la posición en metros (UBX)
+
+    def age(self) -> float:
+        return time.time() - self.received
+
+
 class NEO6Mv2:
+    """
+    Módulo GPS NEO-6M. Un hilo lector consume el puerto serie de forma continua en un buffer de bytes incremental,
+    extrae las sentencias NMEA y los mensajes UBX completos, descarta los que no superan la suma de control y publica
+    de forma atómica la última fijación, de modo que el controlador siempre dispone de la más reciente sin perder
+    sentencias. Con configure_ubx el receptor pasa a enviar soluciones de navegación binarias a mayor frecuencia.
+    """
+    MAX_SENTENCE_LENGTH: int = 128  # NMEA limita las sentencias a 82 caracteres
+    KNOTS_TO_KMH: float = 1.852
+    READER_STOP_TIMEOUT: float = 2.0
+    ACK_TIMEOUT: float = 1.0
+    BAUDRATE_SWITCH_DELAY: float = 0.1
+
     def __init__(self, port: str = "/dev/ttyAMA4", baudrate: int = 9600, timeout: float = 0.5):
         self.__port = port
         self.__baudrate = baudrate
         self.__timeout = timeout
         self.__serial: Serial = None
-        self.__current_coordinates: Coordinates = None
         self._context_vars_mgr = ContextVarsMgrSingleton()
+        self.__buffer = bytearray()
+        self.__reader_thread: Thread = None
+        self.__reader_stop = Event()
+        self.__fix_condition = Condition()
+        self.__latest_fix: GpsFix = None
+        self.__sequence: int = 0
+        # Datos de la época actual que acompañan a la próxima posición publicada; solo los usa el hilo lector
+        self.__pending: dict = {}
+        self.__satellites_in_view: dict = {}
+        self.__utc_date: str = ""   # Fecha de la última RMC, para fechar las horas UTC de GGA y GLL
+        self.__valid_messages: int = 0
+        self.__invalid_messages: int = 0
+        self.__processors: dict = {
+            NmeaMessages.GGA: self.__process_gpgga_sentence,
+            NmeaMessages.GLL: self.__process_gpgll_sentence,
+            NmeaMessages.RMC: self.__process_gprmc_sentence,
+            NmeaMessages.GSV: self.__process_gpgsv_sentence,
+            NmeaMessages.GSA: self.__process_gpgsa_sentence
+        }
+        self.__ubx_processors: dict = {
+            UbxMessages.NAV_PVT: self.__process_nav_pvt,
+            UbxMessages.NAV_SOL: self.__process_nav_sol,
+            UbxMessages.ACK_ACK: self.__process_ack,
+            UbxMessages.ACK_NAK: self.__process_ack
+        }
+        # Confirmaciones de los mensajes de configuración: (clase, identificador) -> aceptado
+        self.__ack_condition = Condition()
+        self.__acks: dict = {}
+        self.__pvt_received: bool = False
 
     def open(self) -> bool:
         try:
@@ -126,43 +205,167 @@ class NEO6Mv2:
 
     def close(self):
         try:
+            self.stop_reader()
             if self.__serial and self.__serial.is_open:
                 self.__serial.close()
         except Exception as e:
             Logs.get_logger().error(f"Error al cerrar el puerto serie para el módulo GPS: {e}", extra=__info__)
 
-    def read_sentence(self):
+    def start_reader(self) -> None:
+        """
+        Arranca el hilo lector del puerto serie. El puerto debe estar abierto.
+        """
+        if self.is_reader_alive():
+            return
+        self.__reader_stop.clear()
+        self.__buffer.clear()
+        self.__reader_thread = Thread(target=self.__run_reader)
+        self.__reader_thread.daemon = True
+        self.__reader_thread.name = f"THREAD_{__info__['module_name']}"
+        self.__reader_thread.start()
+
+    def stop_reader(self) -> None:
+        self.__reader_stop.set()
+        if self.__reader_thread is not None:
+            self.__reader_thread.join(self.READER_STOP_TIMEOUT)
+            if self.__reader_thread.is_alive():
+                Logs.get_logger().warning("No fue posible la salida del hilo lector del módulo GPS", extra=__info__)
+            self.__reader_thread = None
+
+    def is_reader_alive(self) -> bool:
+        return self.__reader_thread is not None and self.__reader_thread.is_alive()
+
+    def __run_reader(self):
+        """
+        Hilo lector: lee todos los bytes disponibles (al menos uno, con el timeout del puerto) y procesa las sentencias
+        completas del buffer. Termina al pedir su parada o ante un error del puerto serie.
+        """
+        while not self.__reader_stop.is_set():
+            try:
+                data = self.__serial.read(max(self.__serial.in_waiting, 1))
+            except SerialException as e:
+                Logs.get_logger().error(f"GPS Serial Exception: {e}", extra=__info__)
+                break
+            if data:
+                self.__buffer += data
+                self.__process_buffer()
+
+    def __process_buffer(self) -> None:
+        """
+        Extrae del buffer las sentencias NMEA y los mensajes UBX completos y conserva el último incompleto para la
+        siguiente lectura
+        """
+        while True:
+            nmea_start = self.__buffer.find(b"$")
+            ubx_start = self.__buffer.find(UbxMessages.SYNC)
+            if ubx_start >= 0 and (nmea_start < 0 or ubx_start < nmea_start):
+                del self.__buffer[:ubx_start]
+                if not self.__process_ubx_buffer():
+                    return
+            elif nmea_start >= 0:
+                del self.__buffer[:nmea_start]
+                if not self.__process_nmea_buffer(ubx_start - nmea_start if ubx_start >= 0 else -1):
+                    return
+            else:
+                # Se conserva un posible primer byte de sincronismo UBX al final del buffer
+                del self.__buffer[:-1 if self.__buffer.endswith(UbxMessages.SYNC[:1]) else None]
+                return
+
+    def __process_nmea_buffer(self, ubx_start: int) -> bool:
+        """
+        Procesa la sentencia NMEA al inicio del buffer
+        :param ubx_start: Posición del siguiente mensaje UBX en el buffer, -1 si no hay ninguno
+        :return: Se puede seguir procesando el buffer (True) - Sentencia incompleta (False)
+        """
+        end = self.__buffer.find(b"\n")
+        if 0 <= ubx_start and (end < 0 or ubx_start < end):
+            # Sentencia truncada por un mensaje UBX
+            self.__invalid_messages += 1
+            del self.__buffer[:ubx_start]
+            return True
+        if end < 0:
+            if len(self.__buffer) <= self.MAX_SENTENCE_LENGTH:
+                return False
+            self.__invalid_messages += 1
+            del self.__buffer[:1]
+            return True
+        # Una sentencia truncada seguida de otra completa solo conserva la última
+        start = self.__buffer.rfind(b"$", 0, end)
+        line = bytes(self.__buffer[start:end])
+        del self.__buffer[:end + 1]
+        self.__process_line(line.rstrip(b"\r"))
+        return True
+
+    def __process_ubx_buffer(self) -> bool:
+        """
+        Procesa el mensaje UBX al inicio del buffer
+        :return: Se puede seguir procesando el buffer (True) - Mensaje incompleto (False)
+        """
+        if len(self.__buffer) < UbxMessages.HEADER_LENGTH:
+            return False
+        length = get_ubx_frame_length(self.__buffer)
+        if length is None:
+            self.__invalid_messages += 1
+            del self.__buffer[:len(UbxMessages.SYNC)]
+            return True
+        if len(self.__buffer) < length:
+            return False
+        frame = bytes(self.__buffer[:length])
+        del self.__buffer[:length]
+        self.__process_ubx_frame(frame)
+        return True
+
+    def __process_ubx_frame(self, frame: bytes) -> None:
+        message = parse_ubx_frame(frame)
+        if message is None:
+            self.__invalid_messages += 1
+            return
+        message_id, payload = message
+        processor = self.__ubx_processors.get(message_id)
         try:
-            sentence = self.__serial.readline().decode("utf-8")
-            return self.__process_nmea_sentence(sentence.split(","))
-        except SerialException as e:
-            Logs.get_logger().error(f"GPS Serial Exception: {e}", extra=__info__)
+            if processor is not None:
+                processor(message_id, payload)
+            self.__valid_messages += 1
+        except struct.error as e:
+            self.__invalid_messages += 1
+            Logs.get_logger().debug(f"Mensaje UBX no válido {message_id}: {e}", extra=__info__)
+
+    def __process_line(self, line: bytes) -> None:
+        sentence = self.__validate_checksum(line)
+        if sentence is None:
+            self.__invalid_messages += 1
+            return
+        nmea_sentence = sentence.split(",")
+        # El identificador es el emisor (dos caracteres) seguido del tipo de sentencia
+        talker, sentence_type = nmea_sentence[0][:2], nmea_sentence[0][2:]
+        processor = self.__processors.get(sentence_type)
+        try:
+            if processor is not None:
+                processor(nmea_sentence, talker)
+            self.__valid_messages += 1
+        except (ValueError, IndexError) as e:
+            self.__invalid_messages += 1
+            Logs.get_logger().debug(f"Sentencia NMEA no válida {sentence}: {e}", extra=__info__)
+
+    @staticmethod
+    def __validate_checksum(line: bytes) -> str:
+        """
+        Comprueba la suma de control de una sentencia NMEA ($<datos>*hh)
+        :return: Datos de la sentencia sin el $ inicial ni la suma de control, None si no es válida
+        """
+        data, separator, checksum = line[1:].rpartition(b"*")
+        if not separator or len(checksum) != 2:
+            return None
+        try:
+            if int(checksum, 16) != reduce(xor, data, 0):
+                return None
+            return data.decode("ascii")
+        except ValueError:
             return None
 
-    def __process_nmea_sentence(self, nmea_sentence: list) -> bool:
-        nmea_message = nmea_sentence[0]
-        if len(nmea_message) == 0:
-            return False
-        nmea_sentence[-1] = nmea_sentence[-1].strip("\r\n")
-        res = True
-        if nmea_message == NmeaMessages.GPGGA:
-            res = self.__process_gpgga_sentence(nmea_sentence)
-        elif nmea_message == NmeaMessages.GPGLL:
-            res = self.__process_gpgll_sentence(nmea_sentence)
-        elif nmea_message == NmeaMessages.GPRMC:
-            res = self.__process_gprmc_sentence(nmea_sentence)
-        elif nmea_message == NmeaMessages.GPGSV:
-            res = self.__process_gpgsv_sentence(nmea_sentence)
-        elif nmea_message == NmeaMessages.GPGSA:
-            res = self.__process_gpgsa_sentence(nmea_sentence)
-        self.__serial.flush()
-        return res
-
-    def __process_gpgga_sentence(self, nmea_sentence: list) -> bool:
+    def __process_gpgga_sentence(self, nmea_sentence: list, talker: str) -> bool:
         fix_indicator = nmea_sentence[GPGGASentence.POS_FIX_INDICATOR]
         valid_fix, fix_type = self.__is_valid_fix(fix_indicator)
-        # if len(fix_type) > 0:
-        #     Logs.get_logger().debug(f"Modo GPS (GPGGA): {fix_type}", extra=__info__)
         if not valid_fix:
             return False
         latitude = nmea_sentence[GPGGASentence.POS_LATITUDE]
@@ -170,66 +373,173 @@ class NEO6Mv2:
         longitude = nmea_sentence[GPGGASentence.POS_LONGITUDE]
         longitude_indicator = nmea_sentence[GPGGASentence.POS_LONGITUDE_INDICATOR]
         latitude, longitude = self.__convert_coordinates(latitude, latitude_indicator, longitude, longitude_indicator)
-        self.__save_coordinates(latitude, longitude)
-        Logs.get_logger().debug(f"Coordenadas GPS (GPGGA): {latitude} {longitude}", extra=__info__)
-        satelites_used = nmea_sentence[GPGGASentence.POS_SATELLITES_USED]
-        # Logs.get_logger().debug(f"Se están utilizando un total de {satelites_used} satelites", extra=__info__)
+        self.__pending["satellites_used"] = self.__parse_optional(nmea_sentence[GPGGASentence.POS_SATELLITES_USED], int)
+        self.__pending["hdop"] = self.__parse_optional(nmea_sentence[GPGGASentence.POS_HORIZONTAL_PRECISION], float)
+        self.__pending["gps_time"] = self.__convert_utc_time(nmea_sentence[GPGGASentence.POS_UTC_TIME],
+                                                             self.__utc_date)
+        self.__publish_fix(latitude, longitude, NmeaMessages.GGA)
         return True
 
-    def __process_gpgll_sentence(self, nmea_sentence: list[str]):
+    def __process_gpgll_sentence(self, nmea_sentence: list, talker: str) -> bool:
         status = nmea_sentence[GPGLLSentence.POS_STATUS]
         if not self.__is_valid_status(status):
             return False
-        mode = nmea_sentence[GPGLLSentence.POS_MODE][:-3]
-        valid_mode, mode_type = self.__is_valid_mode(mode)
-        # Logs.get_logger().debug(f"Modo GPGLL: {mode_type}", extra=__info__)
-        if not valid_mode:
-            return False
+        # El modo solo existe a partir de NMEA 2.3
+        if len(nmea_sentence) > GPGLLSentence.POS_MODE:
+            valid_mode, mode_type = self.__is_valid_mode(nmea_sentence[GPGLLSentence.POS_MODE])
+            if not valid_mode:
+                return False
         latitude = nmea_sentence[GPGLLSentence.POS_LATITUDE]
         latitude_indicator = nmea_sentence[GPGLLSentence.POS_LATITUDE_INDICATOR]
         longitude = nmea_sentence[GPGLLSentence.POS_LONGITUDE]
         longitude_indicator = nmea_sentence[GPGLLSentence.POS_LONGITUDE_INDICATOR]
         latitude, longitude = self.__convert_coordinates(latitude, latitude_indicator, longitude, longitude_indicator)
-        self.__save_coordinates(latitude, longitude)
-        Logs.get_logger().debug(f"Coordenadas GPS (GPGLL): {latitude} {longitude}", extra=__info__)
+        self.__pending["gps_time"] = self.__convert_utc_time(nmea_sentence[GPGLLSentence.POS_UTC_TIME],
+                                                             self.__utc_date)
+        self.__publish_fix(latitude, longitude, NmeaMessages.GLL)
         return True
 
-    def __process_gprmc_sentence(self, nmea_sentence: list):
-        mode = nmea_sentence[GPRMCSentence.POS_MODE][:-3]
-        valid_mode, mode_type = self.__is_valid_mode(mode)
-        # Logs.get_logger().debug(f"Modo GPRMC: {mode_type}", extra=__info__)
-        if not valid_mode:
+    def __process_gprmc_sentence(self, nmea_sentence: list, talker: str) -> bool:
+        if not self.__is_valid_status(nmea_sentence[GPRMCSentence.POS_STATUS]):
             return False
+        # El modo solo existe a partir de NMEA 2.3
+        if len(nmea_sentence) > GPRMCSentence.POS_MODE:
+            valid_mode, mode_type = self.__is_valid_mode(nmea_sentence[GPRMCSentence.POS_MODE])
+            if not valid_mode:
+                return False
         latitude = nmea_sentence[GPRMCSentence.POS_LATITUDE]
         latitude_indicator = nmea_sentence[GPRMCSentence.POS_LATITUDE_INDICATOR]
         longitude = nmea_sentence[GPRMCSentence.POS_LONGITUDE]
         longitude_indicator = nmea_sentence[GPRMCSentence.POS_LONGITUDE_INDICATOR]
         latitude, longitude = self.__convert_coordinates(latitude, latitude_indicator, longitude, longitude_indicator)
-        self.__save_coordinates(latitude, longitude)
-        Logs.get_logger().debug(f"Coordenadas GPS (GPRMC): {latitude} {longitude}", extra=__info__)
+        speed = self.__parse_optional(nmea_sentence[GPRMCSentence.POS_SPEED_OVER_GROUND], float)
+        self.__pending["speed"] = speed * self.KNOTS_TO_KMH if speed is not None else None
+        self.__pending["course"] = self.__parse_optional(nmea_sentence[GPRMCSentence.POS_COURSE_OVER_GROUND], float)
+        self.__utc_date = nmea_sentence[GPRMCSentence.POS_DATE]
+        self.__pending["gps_time"] = self.__convert_utc_time(nmea_sentence[GPRMCSentence.POS_UTC_TIME],
+                                                             self.__utc_date)
+        self.__publish_fix(latitude, longitude, NmeaMessages.RMC)
         return True
 
-    def __process_gpgsv_sentence(self, nmea_sentence: list):
+    def __process_gpgsv_sentence(self, nmea_sentence: list, talker: str) -> bool:
         satelites_totales = nmea_sentence[GPGSVSentence.POS_SATELLITES_IN_VIEW]
         if len(satelites_totales) == 0:
             return False
-        self._context_vars_mgr.set_context_var(ContextVarsConst.SATELITES_GNSS, int(satelites_totales))
-        Logs.get_logger().debug(f"Se están viendo un total de {satelites_totales} satelites", extra=__info__)
+        # Con varias constelaciones cada emisor ($GP, $GL...) reporta sus propios satélites a la vista
+        self.__satellites_in_view[talker] = int(satelites_totales)
+        self._context_vars_mgr.set_context_var(ContextVarsConst.SATELITES_GNSS, sum(self.__satellites_in_view.values()))
         return True
 
-    def __process_gpgsa_sentence(self, nmea_sentence: list):
+    def __process_gpgsa_sentence(self, nmea_sentence: list, talker: str) -> bool:
         operational_mode = nmea_sentence[GPGSASentence.POS_MODE_2]
         valid_operational_mode, operational_type = self.__is_valid_operational_mode(operational_mode)
-        # Logs.get_logger().debug(f"Modo de operacion (GPGSA): {operational_mode}", extra=__info__)
         if not valid_operational_mode:
             return False
         precision_posicion = nmea_sentence[GPGSASentence.POS_POSITION_PRECISION]
         self._context_vars_mgr.set_context_var(ContextVarsConst.PRECISION_GNSS, float(precision_posicion))
-        _ = nmea_sentence[GPGSASentence.POS_HORIZONTAL_PRECISION]
-        _ = nmea_sentence[GPGSASentence.POS_VERTICAL_PRECISION]
-        Logs.get_logger().debug(f"Precision de las coordenadas: {precision_posicion} M", extra=__info__)
         return True
 
+    def __process_nav_pvt(self, message_id: tuple, payload: bytes) -> None:
+        # Con NAV-PVT disponible (u-blox 7 y posteriores) NAV-SOL no publica fijaciones, para no duplicar cada época
+        self.__pvt_received = True
+        self.__process_nav_solution(parse_nav_pvt(payload), "NAV-PVT")
+
+    def __process_nav_sol(self, message_id: tuple, payload: bytes) -> None:
+        if not self.__pvt_received:
+            self.__process_nav_solution(parse_nav_sol(payload), "NAV-SOL")
+
+    def __process_nav_solution(self, solution: NavSolution, message: str) -> None:
+        self._context_vars_mgr.set_context_var(ContextVarsConst.SATELITES_GNSS, solution.satellites_used)
+        if not solution.fix_ok:
+            return
+        self._context_vars_mgr.set_context_var(ContextVarsConst.PRECISION_GNSS, solution.pdop)
+        self.__pending.update(speed=solution.speed, course=solution.course, gps_time=solution.gps_time,
+                              satellites_used=solution.satellites_used, accuracy=solution.accuracy)
+        self.__publish_fix(solution.latitude, solution.longitude, message)
+
+    def __process_ack(self, message_id: tuple, payload: bytes) -> None:
+        with self.__ack_condition:
+            self.__acks[parse_ack(payload)] = message_id == UbxMessages.ACK_ACK
+            self.__ack_condition.notify_all()
+
+    def __publish_fix(self, latitude: float, longitude: float, sentence: str) -> None:
+        coordinates = Coordinates(latitude, longitude)
+        with self.__fix_condition:
+            self.__sequence += 1
+            self.__latest_fix = GpsFix(coordinates, self.__sequence, time.time(), sentence, **self.__pending)
+            self.__fix_condition.notify_all()
+        self._context_vars_mgr.set_context_var(ContextVarsConst.COORDENADAS_GPS, coordinates)
+        Logs.get_logger().debug(f"Coordenadas GPS ({sentence}): {latitude} {longitude}", extra=__info__)
+
+    def get_latest_fix(self) -> GpsFix:
+        with self.__fix_condition:
+            return self.__latest_fix
+
+    def wait_for_fix(self, last_sequence: int, timeout: float) -> GpsFix:
+        """
+        Espera a una fijación posterior a la indicada. Si ya se publicaron varias, devuelve directamente la más reciente.
+        :param last_sequence: Secuencia de la última fijación procesada, 0 si no se procesó ninguna
+        :param timeout: Tiempo máximo de espera en segundos
+        :return: Última fijación, None si no se publicó ninguna nueva en el tiempo indicado
+        """
+        with self.__fix_condition:
+            if not self.__fix_condition.wait_for(lambda: self.__sequence > last_sequence, timeout):
+                return None
+            return self.__latest_fix
+
+    def get_stats(self) -> dict:
+        return {"valid_messages": self.__valid_messages, "invalid_messages": self.__invalid_messages,
+                "fixes": self.__sequence}
+
+    def configure_ubx(self, baudrate: int, rate_hz: float, messages: list, keep_nmea: list = ()) -> bool:
+        """
+        Configura el receptor por UBX: velocidad del puerto serie, frecuencia de navegación, sentencias NMEA activas y
+        mensajes UBX de navegación. La configuración no se guarda en el receptor, por lo que se repite en cada
+        arranque. Requiere el hilo lector en marcha para recibir las confirmaciones.
+        :param baudrate: Velocidad del puerto serie
+        :param rate_hz: Frecuencia de navegación (hasta 5 Hz en el NEO-6M)
+        :param messages: Mensajes de navegación a activar ("NAV-PVT", "NAV-SOL")
+        :param keep_nmea: Sentencias NMEA que se mantienen activas ("GGA", "RMC"...), el resto se desactivan
+        :return: Receptor configurado (True) - Receptor sin respuesta, se mantiene la configuración anterior (False)
+        """
+        previous_baudrate = self.__serial.baudrate
+        if baudrate != previous_baudrate:
+            # El receptor cambia de velocidad sin confirmar el mensaje, que se envía completo antes de cambiar la local
+            self.__serial.write(build_ubx_message(UbxMessages.CFG_PRT,
+                                                  cfg_prt_payload(baudrate, out_nmea=len(keep_nmea) > 0)))
+            self.__serial.flush()
+            time.sleep(self.BAUDRATE_SWITCH_DELAY)
+            self.__serial.baudrate = baudrate
+        # La confirmación de CFG-RATE verifica además la nueva velocidad, o que el receptor ya estaba configurado
+        if not self.__send_ubx_config(UbxMessages.CFG_RATE, cfg_rate_payload(rate_hz)):
+            Logs.get_logger().warning(f"El receptor GPS no confirma la configuración UBX a {baudrate} baudios",
+                                      extra=__info__)
+            self.__serial.baudrate = previous_baudrate
+            return False
+        self.__baudrate = baudrate
+        for sentence, message_id in UbxMessages.NMEA_SENTENCES.items():
+            if not self.__send_ubx_config(UbxMessages.CFG_MSG, cfg_msg_payload(message_id, int(sentence in keep_nmea))):
+                Logs.get_logger().warning(f"El receptor GPS no admite configurar la sentencia {sentence}",
+                                          extra=__info__)
+        for message in messages:
+            if not self.__send_ubx_config(UbxMessages.CFG_MSG, cfg_msg_payload(UbxMessages.NAMES[message], 1)):
+                Logs.get_logger().warning(f"El receptor GPS no admite el mensaje {message}", extra=__info__)
+        Logs.get_logger().info(f"Receptor GPS configurado por UBX a {baudrate} baudios y {rate_hz} Hz con los "
+                               f"mensajes {messages}", extra=__info__)
+        return True
+
+    def __send_ubx_config(self, message_id: tuple, payload: bytes) -> bool:
+        """
+        Envía un mensaje de configuración y espera su confirmación
+        :return: Mensaje aceptado (True) - Mensaje rechazado o sin confirmación (False)
+        """
+        with self.__ack_condition:
+            self.__acks.pop(message_id, None)
+        self.__serial.write(build_ubx_message(message_id, payload))
+        with self.__ack_condition:
+            self.__ack_condition.wait_for(lambda: message_id in self.__acks, self.ACK_TIMEOUT)
+            return self.__acks.pop(message_id, False)
+
     @staticmethod
     def __is_valid_fix(fix_indicator: str) -> (bool, str):
         if fix_indicator == "0":
@@ -292,23 +602,32 @@ class NEO6Mv2:
 
     @staticmethod
     def __convert_coordinates(latitude, latitute_indicator, longitude, longitude_indicator) -> (float, float):
-        latitude_degrees = float(latitude[:2])
-        latitude_minutes = float(latitude[2:]) / 60
-        latitude_decimal = latitude_degrees + latitude_minutes
+        latitude_decimal = NEO6Mv2.__convert_degrees_minutes(latitude)
         if latitute_indicator == "S":
             latitude_decimal *= -1
 
-        longitude_degrees = float(longitude[:2])
-        longitude_minutes = float(longitude[2:]) / 60
-        longitude_decimal = longitude_degrees + longitude_minutes
+        longitude_decimal = NEO6Mv2.__convert_degrees_minutes(longitude)
         if longitude_indicator == "W":
             longitude_decimal *= -1
 
         return latitude_decimal, longitude_decimal
 
-    def __save_coordinates(self, latitude: float, longitude: float) -> None:
-        self.__current_coordinates = Coordinates(latitude, longitude)
-        self._context_vars_mgr.set_context_var(ContextVarsConst.COORDENADAS_GPS, self.__current_coordinates)
+    @staticmethod
+    def __convert_degrees_minutes(value: str) -> float:
+        # Latitud ddmm.mmmm y longitud dddmm.mmmm: los minutos son siempre los dos dígitos previos al punto decimal
+        minutes_start = value.index(".") - 2
+        return float(value[:minutes_start]) + float(value[minutes_start:]) / 60
+
+    @staticmethod
+    def __convert_utc_time(utc_time: str, date: str) -> float:
+        if len(utc_time) < 6 or len(date) != 6:
+            return None
+        fix_time = datetime.datetime.strptime(date + utc_time[:6], "%d%m%y%H%M%S")
+        return calendar.timegm(fix_time.timetuple()) + float(utc_time[6:] or 0)
+
+    @staticmethod
+    def __parse_optional(value: str, value_type: type):
+        return value_type(value) if len(value) > 0 else None
 
     def get_coordinates(self) -> Coordinates:
         return self._context_vars_mgr.get_context_var(ContextVarsConst.COORDENADAS_GPS)
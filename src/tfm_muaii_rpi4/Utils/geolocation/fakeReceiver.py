@@ -0,0 +1,188 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "fakeReceiver"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Receptor GPS simulado sobre un pseudoterminal, para probar NEO6Mv2 y el controlador GPS sin el módulo NEO-6M. Simula
+# un vehículo a velocidad y rumbo constantes, envía sentencias NMEA y los mensajes UBX activados, y responde a los
+# mensajes de configuración CFG-RATE y CFG-MSG como un NEO-6M (rechaza NAV-PVT salvo con --pvt):
+#     python -m tfm_muaii_rpi4.Utils.geolocation.fakeReceiver --speed 50 --course 90
+# El puerto del pseudoterminal se muestra al arrancar y se indica como "port" en services.gps_controller.
+
+import argparse
+import math
+import os
+import select
+import time
+from functools import reduce
+from operator import xor
+from threading import Event, Thread
+
+from tfm_muaii_rpi4.Utils.geolocation.ubxProtocol import UbxMessages, NavSolution, build_ubx_message, \
+    get_ubx_frame_length, nav_pvt_payload, nav_sol_payload, parse_cfg_msg, parse_cfg_rate, parse_ubx_frame
+
+EARTH_RADIUS: float = 6371008.8
+
+
+class FakeReceiver:
+    DEFAULT_NMEA: tuple = ("GGA", "RMC", "GSA", "GSV")
+    SATELLITES: int = 8
+    PDOP: float = 1.8
+    HEIGHT: float = 50.0            # Altura sobre el elipsoide en m
+    PVT_ACCURACY: float = 2.5       # Precisión horizontal de NAV-PVT en m
+    SOL_ACCURACY: float = 3.5       # Precisión 3D de NAV-SOL en m
+
+    def __init__(self, latitude: float, longitude: float, speed: float, course: float, rate_hz: float = 1.0,
+                 supports_pvt: bool = False):
+        """
+        :param latitude: Latitud inicial en grados
+        :param longitude: Longitud inicial en grados
+        :param speed: Velocidad del vehículo en km/h
+        :param course: Rumbo del vehículo en grados
+        :param rate_hz: Frecuencia de navegación inicial
+        :param supports_pvt: Acepta NAV-PVT como un u-blox 7 o posterior
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.course = course
+        self.rate_hz = rate_hz
+        self.supports_pvt = supports_pvt
+        self.enabled: set = {UbxMessages.NMEA_SENTENCES[sentence] for sentence in self.DEFAULT_NMEA}
+        self.__master, self.__slave = os.openpty()
+        self.__buffer = bytearray()
+        self.__stop = Event()
+        self.__thread: Thread = None
+
+    def get_port(self) -> str:
+        return os.ttyname(self.__slave)
+
+    def start(self) -> None:
+        self.__thread = Thread(target=self.__run, daemon=True, name=f"THREAD_{__info__['module_name']}")
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def __run(self):
+        next_epoch = time.time()
+        while not self.__stop.is_set():
+            readable, _, _ = select.select([self.__master], [], [], max(0.0, next_epoch - time.time()))
+            if readable:
+                self.__buffer += os.read(self.__master, 1024)
+                self.__process_commands()
+            if time.time() >= next_epoch:
+                self.__advance(1 / self.rate_hz)
+                os.write(self.__master, self.__epoch_output(time.time()))
+                next_epoch += 1 / self.rate_hz
+
+    def __advance(self, elapsed: float) -> None:
+        distance = self.speed / 3.6 * elapsed
+        course = math.radians(self.course)
+        self.latitude += math.degrees(distance * math.cos(course) / EARTH_RADIUS)
+        self.longitude += math.degrees(distance * math.sin(course) /
+                                       (EARTH_RADIUS * math.cos(math.radians(self.latitude))))
+
+    def __process_commands(self) -> None:
+        while True:
+            start = self.__buffer.find(UbxMessages.SYNC)
+            if start < 0 or len(self.__buffer) - start < UbxMessages.HEADER_LENGTH:
+                return
+            del self.__buffer[:start]
+            length = get_ubx_frame_length(self.__buffer)
+            if length is None:
+                del self.__buffer[:2]
+                continue
+            if len(self.__buffer) < length:
+                return
+            message = parse_ubx_frame(bytes(self.__buffer[:length]))
+            del self.__buffer[:length]
+            if message is not None:
+                self.__process_command(*message)
+
+    def __process_command(self, message_id: tuple, payload: bytes) -> None:
+        accepted = True
+        if message_id == UbxMessages.CFG_PRT:
+            return  # El cambio de velocidad no tiene efecto en un pseudoterminal y el receptor no lo confirma
+        if message_id == UbxMessages.CFG_RATE:
+            self.rate_hz = parse_cfg_rate(payload)
+        elif message_id == UbxMessages.CFG_MSG:
+            message, rate = parse_cfg_msg(payload)
+            if message == UbxMessages.NAV_PVT and not self.supports_pvt:
+                accepted = False
+            elif rate > 0:
+                self.enabled.add(message)
+            else:
+                self.enabled.discard(message)
+        os.write(self.__master, build_ubx_message(UbxMessages.ACK_ACK if accepted else UbxMessages.ACK_NAK,
+                                                  bytes(message_id)))
+
+    def __epoch_output(self, now: float) -> bytes:
+        output = b""
+        for sentence, message_id in UbxMessages.NMEA_SENTENCES.items():
+            if message_id in self.enabled and sentence in self.DEFAULT_NMEA:
+                output += self.__nmea_sentence(sentence, now)
+        if UbxMessages.NAV_SOL in self.enabled:
+            output += build_ubx_message(UbxMessages.NAV_SOL,
+                                        nav_sol_payload(self.__solution(now, self.SOL_ACCURACY), self.HEIGHT))
+        if UbxMessages.NAV_PVT in self.enabled:
+            output += build_ubx_message(UbxMessages.NAV_PVT,
+                                        nav_pvt_payload(self.__solution(now, self.PVT_ACCURACY), self.HEIGHT))
+        return output
+
+    def __nmea_sentence(self, sentence: str, now: float) -> bytes:
+        utc = time.gmtime(now)
+        utc_time = time.strftime("%H%M%S", utc) + f".{int(now % 1 * 100):02d}"
+        latitude = self.__nmea_degrees(abs(self.latitude), 2) + ("," + ("N" if self.latitude >= 0 else "S"))
+        longitude = self.__nmea_degrees(abs(self.longitude), 3) + ("," + ("E" if self.longitude >= 0 else "W"))
+        if sentence == "GGA":
+            data = f"GPGGA,{utc_time},{latitude},{longitude},1,{self.SATELLITES:02d},1.1,10.0,M,50.0,M,,"
+        elif sentence == "RMC":
+            data = (f"GPRMC,{utc_time},A,{latitude},{longitude},{self.speed / 1.852:.3f},{self.course:.2f},"
+                    f"{time.strftime('%d%m%y', utc)},,,A")
+        elif sentence == "GSA":
+            data = f"GPGSA,A,3,01,02,03,04,05,06,07,08,,,,,{self.PDOP:.1f},1.1,1.4"
+        else:
+            data = f"GPGSV,1,1,{self.SATELLITES:02d}"
+        return f"${data}*{reduce(xor, data.encode(), 0):02X}\r\n".encode()
+
+    @staticmethod
+    def __nmea_degrees(value: float, degree_digits: int) -> str:
+        degrees = int(value)
+        return f"{degrees:0{degree_digits}d}{(value - degrees) * 60:07.4f}"
+
+    def __solution(self, now: float, accuracy: float) -> NavSolution:
+        return NavSolution(fix_ok=True, latitude=self.latitude, longitude=self.longitude, speed=self.speed,
+                           course=self.course, accuracy=accuracy, satellites_used=self.SATELLITES, pdop=self.PDOP,
+                           gps_time=now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receptor GPS simulado sobre un pseudoterminal")
+    parser.add_argument("--latitude", type=float, default=39.4699, help="Latitud inicial en grados")
+    parser.add_argument("--longitude", type=float, default=-0.3763, help="Longitud inicial en grados")
+    parser.add_argument("--speed", type=float, default=0.0, help="Velocidad en km/h")
+    parser.add_argument("--course", type=float, default=0.0, help="Rumbo en grados")
+    parser.add_argument("--rate", type=float, default=1.0, help="Frecuencia de navegación inicial en Hz")
+    parser.add_argument("--pvt", action="store_true", help="Acepta NAV-PVT como un u-blox 7 o posterior")
+    args = parser.parse_args()
+
+    receiver = FakeReceiver(args.latitude, args.longitude, args.speed, args.course, args.rate, args.pvt)
+    receiver.start()
+    print(f"Receptor GPS simulado en {receiver.get_port()}, Ctrl+C para terminar")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+
+
+if __name__ == "__main__":
+    main()
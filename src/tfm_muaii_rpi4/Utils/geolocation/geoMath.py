@@ -0,0 +1,133 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "geoMath"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Cálculos geográficos rápidos con NumPy, en sustitución de geopy en los caminos frecuentes. Salvo geohash, las
+# funciones aceptan escalares, devolviendo float, o arrays de NumPy con las reglas de broadcasting, devolviendo arrays.
+# Latitudes y longitudes en grados, distancias en metros.
+#
+# Error frente a la distancia geodésica WGS84 (geopy.distance.geodesic) en la península ibérica (36º-44º N):
+#   - haversine: esfera de radio medio, error relativo < 0,3 % para cualquier distancia.
+#   - equirectangular: error relativo < 0,3 % hasta 10 km, el de la esfera; la aproximación plana apenas añade error a
+#     esas distancias.
+#   - LocalProjection: plano tangente con los radios de curvatura WGS84 en el origen, error relativo < 0,003 % hasta
+#     1 km del origen, < 0,03 % (< 3 m) hasta 10 km y < 0,15 % hasta 50 km.
+
+import numpy as np
+
+EARTH_RADIUS: float = 6371008.8     # Radio medio terrestre
+WGS84_A: float = 6378137.0
+WGS84_E2: float = 6.69437999014e-3
+
+
+def _result(value):
+    return float(value) if np.ndim(value) == 0 else value
+
+
+def haversine(latitude_1, longitude_1, latitude_2, longitude_2):
+    """
+    Distancia de círculo máximo en metros
+    """
+    lat_1, lon_1, lat_2, lon_2 = map(np.radians, (latitude_1, longitude_1, latitude_2, longitude_2))
+    a = np.sin((lat_2 - lat_1) / 2) ** 2 + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2) ** 2
+    return _result(2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0))))
+
+
+def equirectangular(latitude_1, longitude_1, latitude_2, longitude_2):
+    """
+    Distancia en metros con la aproximación equirectangular, la más rápida, para distancias cortas (< 10 km)
+    """
+    lat_1, lon_1, lat_2, lon_2 = map(np.radians, (latitude_1, longitude_1, latitude_2, longitude_2))
+    x = (lon_2 - lon_1) * np.cos((lat_1 + lat_2) / 2)
+    return _result(EARTH_RADIUS * np.hypot(x, lat_2 - lat_1))
+
+
+def bearing(latitude_1, longitude_1, latitude_2, longitude_2):
+    """
+    Rumbo inicial en grados [0, 360) del primer punto hacia el segundo
+    """
+    lat_1, lon_1, lat_2, lon_2 = map(np.radians, (latitude_1, longitude_1, latitude_2, longitude_2))
+    d_lon = lon_2 - lon_1
+    y = np.sin(d_lon) * np.cos(lat_2)
+    x = np.cos(lat_1) * np.sin(lat_2) - np.sin(lat_1) * np.cos(lat_2) * np.cos(d_lon)
+    return _result(np.degrees(np.arctan2(y, x)) % 360)
+
+
+def point_segment_distance(east, north, start_east, start_north, end_east, end_north):
+    """
+    Distancia en un plano local del punto (east, north) a los segmentos de start a end
+    """
+    d_east, d_north = end_east - start_east, end_north - start_north
+    length2 = d_east ** 2 + d_north ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(length2 > 0, ((east - start_east) * d_east + (north - start_north) * d_north) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return _result(np.hypot(start_east + t * d_east - east, start_north + t * d_north - north))
+
+
+class LocalProjection:
+    """
+    Proyección sobre el plano tangente (este, norte) en metros de un origen, con los radios de curvatura del elipsoide
+    WGS84 en el origen. Equivale a la proyección ENU sin altura para distancias de hasta decenas de km.
+    """
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        sin_lat2 = np.sin(np.radians(latitude)) ** 2
+        prime_vertical = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat2)
+        meridian = WGS84_A * (1 - WGS84_E2) / (1 - WGS84_E2 * sin_lat2) ** 1.5
+        # Metros por grado de longitud y de latitud en el origen
+        self.__east_scale = float(np.radians(1) * prime_vertical * np.cos(np.radians(latitude)))
+        self.__north_scale = float(np.radians(1) * meridian)
+
+    def to_enu(self, latitude, longitude) -> tuple:
+        """
+        :return: Coordenadas este y norte en metros respecto al origen
+        """
+        east = (np.asarray(longitude, dtype=np.float64) - self.longitude) * self.__east_scale
+        north = (np.asarray(latitude, dtype=np.float64) - self.latitude) * self.__north_scale
+        return _result(east), _result(north)
+
+    def to_geodetic(self, east, north) -> tuple:
+        """
+        :return: Latitud y longitud en grados
+        """
+        latitude = self.latitude + np.asarray(north, dtype=np.float64) / self.__north_scale
+        longitude = self.longitude + np.asarray(east, dtype=np.float64) / self.__east_scale
+        return _result(latitude), _result(longitude)
+
+    def get_meters_per_degree(self) -> tuple:
+        """
+        :return: Metros por grado de longitud y de latitud en el origen
+        """
+        return self.__east_scale, self.__north_scale
+
+
+GEOHASH_BASE32: str = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude: float, longitude: float, precision: int = 7) -> str:
+    """
+    Geohash de un punto. Con precisión 7 la celda mide unos 150 x 150 m, 6 unos 1,2 x 0,6 km.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    code, bits, value, even = [], 0, 0, True
+    while len(code) < precision:
+        # Los bits alternan longitud y latitud, empezando por la longitud
+        coordinate, limits = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (limits[0] + limits[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            limits[0] = middle
+        else:
+            limits[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            code.append(GEOHASH_BASE32[value])
+            bits, value = 0, 0
+    return "".join(code)
@@ -8,12 +8,15 @@ import time
 import datetime
 import os
 import json
-import geopy.distance
+import geopy.location
 from geopy.geocoders import Nominatim
 
 from tfm_muaii_rpi4.DataPersistence.roadsPersistence import RoadsDB
 from tfm_muaii_rpi4.Environment.env import EnvSingleton
 from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.geolocation import geoMath
+from tfm_muaii_rpi4.Utils.geolocation.geocodeCache import GeocodeCache
+from tfm_muaii_rpi4.Utils.geolocation.speedLimits import offline_speed_limit
 
 
 Logs = LogsSingleton()
@@ -29,6 +32,13 @@ class Coordinates:
     def get_coordinates(self) -> tuple:
         return self.data["coordinates"]
 
+    def get_lon_lat(self) -> tuple:
+        """
+        Coordenadas en el orden (longitud, latitud) de las geometrías GeoJSON y shapely
+        """
+        latitude, longitude = self.data["coordinates"]
+        return longitude, latitude
+
     def valid_coordinates(self) -> bool:
         return self.get_coordinates() != (0, 0)
 
@@ -37,9 +47,27 @@ class Coordinates:
 
 
 class GeoUtils:
+    USER_AGENT: str = "my_geocoder"
+    DOMAIN: str = "nominatim.openstreetmap.org"
+    SCHEME: str = "https"
+    TIMEOUT: float = 5.0
+
+    def __init__(self, geocoding_conf: dict = None):
+        """
+        :param geocoding_conf: Servidor Nominatim y caché de la geolocalización online (sección geocoding de
+        services.gps_controller). El servidor es configurable para poder sustituirlo por uno local en pruebas.
+        """
+        conf = geocoding_conf or {}
+        self.__geolocator = Nominatim(user_agent=conf.get("user_agent", self.USER_AGENT),
+                                      domain=conf.get("domain", self.DOMAIN), scheme=conf.get("scheme", self.SCHEME),
+                                      timeout=float(conf.get("timeout", self.TIMEOUT)))
+        cache_conf: dict = conf.get("cache", {})
+        self.__cache: GeocodeCache = GeocodeCache(cache_conf) if cache_conf.get("enabled", True) else None
+
     def get_online_max_speed_and_location(self, coordenadas: Coordinates) -> (int, str):
         """
-        Obtención de la máxima velocidad en km/h de una localizacicón definida por la libreria de geopy
+        Obtención de la máxima velocidad en km/h de una localizacicón definida por la libreria de geopy. Los resultados
+        se guardan en caché por celda, de modo que solo se consulta al servidor al cambiar de celda.
         :param coordenadas: Coordenadas de la localización
         :return: Velocidad en km/h
         """
@@ -47,8 +75,11 @@ class GeoUtils:
         location_info: str = ""
         if not coordenadas.valid_coordinates():
             return max_speed, location_info
-        geolocator = Nominatim(user_agent="my_geocoder")
-        location = geolocator.reverse(coordenadas.get_coordinates(), language='es')
+        if self.__cache is not None:
+            cached = self.__cache.get(*coordenadas.get_coordinates())
+            if cached is not None:
+                return cached
+        location = self.__geolocator.reverse(coordenadas.get_coordinates(), language='es')
         if location:
             road_type = self.__get_online_road_type(location)
             max_speed = self.__convert_online_road_speed_limit(road_type)
@@ -60,13 +91,21 @@ class GeoUtils:
                 location_info = f"{road_name}, {ciudad} ({provincia})"
                 Logs.get_logger().debug(f"La velocidad máxima para {road_name} ubicado en {ciudad} ({provincia}) es: "
                                        f"{max_speed} km/h", extra=__info__)
+            if self.__cache is not None:
+                self.__cache.put(*coordenadas.get_coordinates(), max_speed, location_info)
         return max_speed, location_info
 
+    def get_cache_stats(self) -> dict:
+        return self.__cache.get_stats() if self.__cache is not None else {}
+
     def get_offline_max_speed_and_location(self, road_info: dict) -> (int, str):
         #TODO: En el arranque se tendrá que cargar fichero con info de carreteras de la comunidad valenciana y obtener
         # de ahí la información
         road_type: str = road_info["tipo_via"]
-        max_speed: int = self.__convert_offline_road_speed_limit(road_info["clase"], road_type)
+        # Las carreteras cargadas en memoria traen la velocidad máxima precalculada
+        max_speed: int = road_info.get("max_speed")
+        if max_speed is None:
+            max_speed = offline_speed_limit(road_info["clase"], road_type)
         road_name: str = road_info["nombre"].capitalize()
         municipio: str = road_info["municipio"].capitalize()
         provincia: str = road_info["provincia"].capitalize()
@@ -75,42 +114,6 @@ class GeoUtils:
                                 f"({provincia}) es: {max_speed} km/h", extra=__info__)
         return max_speed, location_info
 
-    @staticmethod
-    def __convert_offline_road_speed_limit(road_class: str, road_type: str) -> int:
-        if road_class == "Carretera convencional":
-            carretera_conv = {
-                {"Carretera", "CTRA", "Red TenT Global", "CARRE"}: 90,
-                {"CALLE", "Vial", "AVDA", "C", "C/", "PG", "PL", "URB", "PLAZA", "Desconocido", "AVGDA",
-                 "VIA", "GRUP", "POLIG", "PDA", "LUGAR", "TRSSI", "RONDA", "PLCET", "PLAÇA", "PASEO",
-                 "PTGE"}: 50,
-                {"BARRO", "CMNO", "camino", "PRAJE", "ALDEA", "CÑADA"}: 30,
-                {"Vía verde", "SEND", "Vial bici", "SENDA", "VREDA"}: 20
-            }
-            for roads, velocidad in carretera_conv.items():
-                if road_type in roads:
-                    return velocidad
-            return 0
-
-        if road_class == "Carretera multicarril":
-            carretera_multi = {
-                {"Carretera", "CTRA", "Red TenT Global"}: 100,
-                {"AVDA", "C/", "AV", "PONT", "C", "PG", "CALLE"}: 50
-            }
-            for roads, velocidad in carretera_multi.items():
-                if road_type in roads:
-                    return velocidad
-            return 0
-
-        speed_limits = {
-            "Autopista de peaje": 120,
-            "Autopista libre / autovía": 120,
-            "Camino": 30,
-            "Senda": 20,
-            "Carril bici": 20,
-            "Urbano": 50
-        }
-        return speed_limits.get(road_class, 0)
-
     @staticmethod
     def __get_online_road_type(location: geopy.location.Location) -> str:
         """
@@ -144,31 +147,19 @@ class GeoUtils:
         # Devolver la velocidad máxima según el tipo de carretera
         return speed_limits.get(road_type, 0)
 
-    def calculate_speed(self, last_coordinates: Coordinates, current_coordinates: Coordinates) -> int:
+    @staticmethod
+    def calculate_distance(origin: Coordinates, destination: Coordinates) -> float:
         """
-        Se calcula la velocidad en km/h a la que se está circulando a partir de dos coordenadas.
-        :param last_coordinates: Últimas coordenadas obtenidas.
-        :param current_coordinates: Coordenadas actuales.
-        :return: Velocidad actual
+        Distancia en metros entre dos coordenadas (haversine, error < 0,3 % frente a la geodésica)
         """
-        if not isinstance(last_coordinates, Coordinates) and not isinstance(current_coordinates, Coordinates):
-            return None
-        distance = geopy.distance.geodesic(last_coordinates.get_coordinates(),
-                                           current_coordinates.get_coordinates()).m
-        time_difference = current_coordinates.get_timestamp() - last_coordinates.get_timestamp()
-        if time_difference == 0:
-            return 0
-        speed = distance / time_difference
-        return self.__convert_ms_to_kmh(speed)
+        return geoMath.haversine(*origin.get_coordinates(), *destination.get_coordinates())
 
     @staticmethod
-    def __convert_ms_to_kmh(speed: float) -> int:
+    def calculate_bearing(origin: Coordinates, destination: Coordinates) -> float:
         """
-        Conversión de velocidad de m/s a km/h
-        :param speed: Velocidad en metros por segundo
-        :return: Velocidad en kilometros por hora
+        Rumbo inicial en grados de origin hacia destination
         """
-        return round(speed * 3.6)
+        return geoMath.bearing(*origin.get_coordinates(), *destination.get_coordinates())
 
     @staticmethod
     def convert_provincia_to_road_db(provincia: str):
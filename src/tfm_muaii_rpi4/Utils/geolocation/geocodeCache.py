@@ -0,0 +1,90 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "geocodeCache"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from tfm_muaii_rpi4.DataPersistence.geocodingPersistence import GeocodingPersistenceSingleton
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.geolocation.geoMath import geohash
+
+Logs = LogsSingleton()
+
+
+class GeocodeCache:
+    """
+    Caché LRU con caducidad de la geolocalización inversa online (velocidad máxima y descripción de la ubicación) por
+    celda geohash: mientras el vehículo no sale de la celda, la consulta se resuelve en memoria. Los resultados se
+    guardan además en SQLite y se recuperan en el arranque, para conservar la caché entre reinicios.
+    """
+    PRECISION: int = 7          # Celdas de unos 150 x 150 m
+    TTL: float = 7 * 24 * 3600
+    MAX_ENTRIES: int = 5000
+
+    def __init__(self, conf: dict = None):
+        """
+        :param conf: Parámetros de la caché (sección geocoding.cache de services.gps_controller)
+        """
+        conf = conf or {}
+        self.__precision: int = int(conf.get("precision", self.PRECISION))
+        self.__ttl: float = float(conf.get("ttl", self.TTL))
+        self.__max_entries: int = int(conf.get("max_entries", self.MAX_ENTRIES))
+        self.__persistence = GeocodingPersistenceSingleton()
+        self.__entries: OrderedDict = OrderedDict()     # geohash -> (velocidad máxima, ubicación, instante)
+        self.__lock = Lock()
+        self.__loaded: bool = False
+        self.__hits: int = 0
+        self.__misses: int = 0
+
+    def __load(self) -> None:
+        """
+        Recupera de la base de datos los resultados vigentes y elimina los caducados
+        """
+        self.__loaded = True
+        self.__persistence.start()
+        min_timestamp = time.time() - self.__ttl
+        self.__persistence.delete_records(min_timestamp)
+        for record in self.__persistence.get_records(min_timestamp, self.__max_entries):
+            self.__entries[record["geohash"]] = (record["max_speed"], record["location_info"], record["timestamp"])
+        Logs.get_logger().info(f"Caché de geolocalización cargada con {len(self.__entries)} resultados",
+                               extra=__info__)
+
+    def get(self, latitude: float, longitude: float) -> (int, str):
+        """
+        :return: Velocidad máxima y ubicación de la celda de las coordenadas, None si no están en caché o caducaron
+        """
+        key = geohash(latitude, longitude, self.__precision)
+        with self.__lock:
+            if not self.__loaded:
+                self.__load()
+            entry = self.__entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.__ttl:
+                del self.__entries[key]
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[0], entry[1]
+
+    def put(self, latitude: float, longitude: float, max_speed: int, location_info: str) -> None:
+        key = geohash(latitude, longitude, self.__precision)
+        now = time.time()
+        with self.__lock:
+            self.__entries[key] = (max_speed, location_info, now)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+        self.__persistence.save_record({"geohash": key, "max_speed": max_speed, "location_info": location_info,
+                                        "timestamp": now})
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {"entries": len(self.__entries), "hits": self.__hits, "misses": self.__misses,
+                    "hit_rate": round(self.__hits / lookups, 3) if lookups > 0 else 0.0}
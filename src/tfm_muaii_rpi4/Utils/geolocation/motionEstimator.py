@@ -0,0 +1,176 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "motionEstimator"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from tfm_muaii_rpi4.Utils.geolocation.NEO6Mv2 import GpsFix
+from tfm_muaii_rpi4.Utils.geolocation.geoMath import LocalProjection
+
+
+class MotionState(NamedTuple):
+    latitude: float
+    longitude: float
+    speed: float            # Velocidad filtrada en km/h
+    heading: float          # Rumbo filtrado en grados, None hasta que el vehículo se mueve
+    stopped: bool
+    timestamp: float
+
+
+class MotionEstimator:
+    """
+    Estimador del movimiento del vehículo: filtro de Kalman de velocidad constante sobre un plano local (este, norte)
+    en metros, que fusiona la posición de cada fijación con la velocidad y el rumbo sobre el suelo que reporta el
+    receptor. Los intervalos se calculan con la hora GPS de las fijaciones cuando está disponible. La parada del
+    vehículo se decide con histéresis: se considera parado tras stop_time segundos por debajo de stop_speed y vuelve a
+    moverse al superar move_speed.
+    """
+    POSITION_NOISE: float = 5.0         # Desviación de la posición en m si la fijación no indica su precisión
+    UERE: float = 4.0                   # Error equivalente de pseudodistancia en m, para convertir el HDOP en metros
+    SPEED_NOISE: float = 0.5            # Desviación de la velocidad del receptor en m/s
+    ACCELERATION_NOISE: float = 2.0     # Desviación de la aceleración del vehículo en m/s² (ruido del proceso)
+    STOP_SPEED: float = 2.0             # km/h
+    MOVE_SPEED: float = 5.0             # km/h
+    STOP_TIME: float = 3.0              # s
+    MAX_GAP: float = 10.0               # Sin fijaciones durante más tiempo el filtro se reinicia
+    REANCHOR_DISTANCE: float = 10000.0  # Distancia al origen del plano local a partir de la cual se desplaza
+    MS_TO_KMH: float = 3.6
+
+    def __init__(self, conf: dict = None):
+        """
+        :param conf: Parámetros del filtro y de la histéresis (sección motion de services.gps_controller)
+        """
+        conf = conf or {}
+        self.__position_noise: float = float(conf.get("position_noise", self.POSITION_NOISE))
+        self.__speed_noise: float = float(conf.get("speed_noise", self.SPEED_NOISE))
+        self.__acceleration_noise: float = float(conf.get("acceleration_noise", self.ACCELERATION_NOISE))
+        self.__stop_speed: float = float(conf.get("stop_speed", self.STOP_SPEED))
+        self.__move_speed: float = float(conf.get("move_speed", self.MOVE_SPEED))
+        self.__stop_time: float = float(conf.get("stop_time", self.STOP_TIME))
+        self.__state: np.ndarray = None         # (este, norte, velocidad este, velocidad norte)
+        self.__covariance: np.ndarray = None
+        self.__projection: LocalProjection = None
+        self.__timestamp: float = None
+        self.__gps_time: bool = False
+        self.__heading: float = None
+        self.__stopped: bool = True
+        self.__below_since: float = None
+        self.__motion_state: MotionState = None
+
+    def reset(self) -> None:
+        self.__state = None
+        self.__timestamp = None
+        self.__heading = None
+        self.__below_since = None
+        self.__motion_state = None
+
+    def get_state(self) -> MotionState:
+        return self.__motion_state
+
+    def update(self, fix: GpsFix) -> MotionState:
+        """
+        Incorpora una fijación al filtro
+        :return: Estado del movimiento estimado
+        """
+        latitude, longitude = fix.coordinates.get_coordinates()
+        gps_time = fix.gps_time is not None
+        timestamp = fix.gps_time if gps_time else fix.received
+        # Cada época del receptor publica varias fijaciones (GGA, RMC y GLL, o NAV-PVT y NAV-SOL) con la misma hora GPS
+        # y las mismas medidas: se fusionan una sola vez para no sobrestimar la confianza del filtro
+        if self.__state is not None and gps_time and self.__gps_time and timestamp == self.__timestamp:
+            return self.__motion_state
+        if self.__state is not None:
+            elapsed = timestamp - self.__timestamp
+            # Las horas GPS y locales no son comparables entre sí
+            if gps_time != self.__gps_time or elapsed < 0 or elapsed > self.MAX_GAP:
+                self.reset()
+        if self.__state is None:
+            self.__init_filter(latitude, longitude)
+        else:
+            self.__predict(timestamp - self.__timestamp)
+        self.__timestamp = timestamp
+        self.__gps_time = gps_time
+
+        east, north = self.__projection.to_enu(latitude, longitude)
+        measurement, model, noise = [east, north], [[1, 0, 0, 0], [0, 1, 0, 0]], [self.__get_position_noise(fix)] * 2
+        velocity = self.__get_velocity(fix)
+        if velocity is not None:
+            measurement += velocity
+            model += [[0, 0, 1, 0], [0, 0, 0, 1]]
+            noise += [self.__speed_noise ** 2] * 2
+        self.__correct(np.array(measurement), np.array(model, dtype=np.float64), np.diag(noise))
+        if math.hypot(self.__state[0], self.__state[1]) > self.REANCHOR_DISTANCE:
+            self.__projection = LocalProjection(*self.__projection.to_geodetic(self.__state[0], self.__state[1]))
+            self.__state[:2] = 0.0
+
+        speed = math.hypot(self.__state[2], self.__state[3]) * self.MS_TO_KMH
+        if speed >= self.__stop_speed:
+            self.__heading = math.degrees(math.atan2(self.__state[2], self.__state[3])) % 360
+        self.__update_stopped(speed, timestamp)
+        self.__motion_state = MotionState(*self.__projection.to_geodetic(self.__state[0], self.__state[1]), speed,
+                                          self.__heading, self.__stopped, timestamp)
+        return self.__motion_state
+
+    def __init_filter(self, latitude: float, longitude: float) -> None:
+        self.__projection = LocalProjection(latitude, longitude)
+        self.__state = np.zeros(4)
+        # La velocidad inicial es desconocida: se parte de reposo con una incertidumbre amplia
+        self.__covariance = np.diag([self.__position_noise ** 2] * 2 + [10.0 ** 2] * 2)
+
+    def __predict(self, elapsed: float) -> None:
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = elapsed
+        # Ruido de proceso por aceleración constante a tramos
+        q = self.__acceleration_noise ** 2
+        position, cross, velocity = elapsed ** 4 / 4 * q, elapsed ** 3 / 2 * q, elapsed ** 2 * q
+        process_noise = np.array([[position, 0, cross, 0],
+                                  [0, position, 0, cross],
+                                  [cross, 0, velocity, 0],
+                                  [0, cross, 0, velocity]])
+        self.__state = transition @ self.__state
+        self.__covariance = transition @ self.__covariance @ transition.T + process_noise
+
+    def __correct(self, measurement: np.ndarray, model: np.ndarray, noise: np.ndarray) -> None:
+        innovation = measurement - model @ self.__state
+        innovation_covariance = model @ self.__covariance @ model.T + noise
+        gain = self.__covariance @ model.T @ np.linalg.inv(innovation_covariance)
+        self.__state = self.__state + gain @ innovation
+        self.__covariance = (np.eye(4) - gain @ model) @ self.__covariance
+
+    def __get_position_noise(self, fix: GpsFix) -> float:
+        if fix.accuracy is not None:
+            return max(fix.accuracy, 1.0) ** 2
+        if fix.hdop is not None:
+            return max(fix.hdop * self.UERE, 1.0) ** 2
+        return self.__position_noise ** 2
+
+    def __get_velocity(self, fix: GpsFix) -> list:
+        """
+        Velocidad (este, norte) en m/s reportada por el receptor, None si no la reporta. Parado, el receptor puede no
+        indicar el rumbo.
+        """
+        if fix.speed is None:
+            return None
+        speed = fix.speed / self.MS_TO_KMH
+        if fix.course is None:
+            return [0.0, 0.0] if fix.speed < self.__stop_speed else None
+        course = math.radians(fix.course)
+        return [speed * math.sin(course), speed * math.cos(course)]
+
+    def __update_stopped(self, speed: float, timestamp: float) -> None:
+        if self.__stopped:
+            if speed > self.__move_speed:
+                self.__stopped = False
+                self.__below_since = None
+        elif speed < self.__stop_speed:
+            if self.__below_since is None:
+                self.__below_since = timestamp
+            elif timestamp - self.__below_since >= self.__stop_time:
+                self.__stopped = True
+        else:
+            self.__below_since = None
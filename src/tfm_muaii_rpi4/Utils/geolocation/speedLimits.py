@@ -0,0 +1,46 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "speedLimits"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Velocidades máximas en km/h de las carreteras de las bases de datos offline, según su clase y su tipo de vía.
+
+_CONVENTIONAL_ROAD_GROUPS: list = [
+    (("Carretera", "CTRA", "Red TenT Global", "CARRE"), 90),
+    (("CALLE", "Vial", "AVDA", "C", "C/", "PG", "PL", "URB", "PLAZA", "Desconocido", "AVGDA", "VIA", "GRUP", "POLIG",
+      "PDA", "LUGAR", "TRSSI", "RONDA", "PLCET", "PLAÇA", "PASEO", "PTGE"), 50),
+    (("BARRO", "CMNO", "camino", "PRAJE", "ALDEA", "CÑADA"), 30),
+    (("Vía verde", "SEND", "Vial bici", "SENDA", "VREDA"), 20)
+]
+
+_MULTILANE_ROAD_GROUPS: list = [
+    (("Carretera", "CTRA", "Red TenT Global"), 100),
+    (("AVDA", "C/", "AV", "PONT", "C", "PG", "CALLE"), 50)
+]
+
+# Clases cuya velocidad depende del tipo de vía
+ROAD_TYPE_SPEED_LIMITS: dict = {
+    "Carretera convencional": {road_type: speed for road_types, speed in _CONVENTIONAL_ROAD_GROUPS
+                               for road_type in road_types},
+    "Carretera multicarril": {road_type: speed for road_types, speed in _MULTILANE_ROAD_GROUPS
+                              for road_type in road_types}
+}
+
+ROAD_CLASS_SPEED_LIMITS: dict = {
+    "Autopista de peaje": 120,
+    "Autopista libre / autovía": 120,
+    "Camino": 30,
+    "Senda": 20,
+    "Carril bici": 20,
+    "Urbano": 50
+}
+
+
+def offline_speed_limit(road_class: str, road_type: str) -> int:
+    """
+    :return: Velocidad máxima en km/h, 0 si la clase o el tipo de vía no se conocen
+    """
+    if road_class in ROAD_TYPE_SPEED_LIMITS:
+        return ROAD_TYPE_SPEED_LIMITS[road_class].get(road_type, 0)
+    return ROAD_CLASS_SPEED_LIMITS.get(road_class, 0)
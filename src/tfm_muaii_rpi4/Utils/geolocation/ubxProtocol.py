@@ -0,0 +1,275 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "ubxProtocol"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+# Protocolo binario UBX de los receptores u-blox: construcción de los mensajes de configuración (CFG-PRT, CFG-RATE,
+# CFG-MSG) y decodificación con struct de las soluciones de navegación NAV-PVT y NAV-SOL. Las operaciones inversas
+# (decodificar la configuración y construir las soluciones) sirven para simular el receptor (ver fakeReceiver). El NEO-6M (protocolo 7) no
+# dispone de NAV-PVT, que se añadió en los receptores u-blox 7 y posteriores; en él la solución llega en NAV-SOL en
+# coordenadas ECEF, que se convierten a geodésicas.
+
+import calendar
+import math
+import struct
+import time
+from typing import NamedTuple
+
+
+class UbxMessages:
+    SYNC: bytes = b"\xb5\x62"
+    HEADER_LENGTH: int = 6          # Sincronismo, clase, identificador y longitud
+    CHECKSUM_LENGTH: int = 2
+    MAX_PAYLOAD_LENGTH: int = 512
+    NAV_PVT_LENGTH: int = 92
+
+    NAV_POSLLH: tuple = (0x01, 0x02)
+    NAV_SOL: tuple = (0x01, 0x06)
+    NAV_PVT: tuple = (0x01, 0x07)
+    NAV_VELNED: tuple = (0x01, 0x12)
+    ACK_NAK: tuple = (0x05, 0x00)
+    ACK_ACK: tuple = (0x05, 0x01)
+    CFG_PRT: tuple = (0x06, 0x00)
+    CFG_MSG: tuple = (0x06, 0x01)
+    CFG_RATE: tuple = (0x06, 0x08)
+
+    NAMES: dict = {"NAV-POSLLH": NAV_POSLLH, "NAV-SOL": NAV_SOL, "NAV-PVT": NAV_PVT, "NAV-VELNED": NAV_VELNED}
+
+    # Sentencias NMEA estándar, para activarlas o desactivarlas con CFG-MSG
+    NMEA_SENTENCES: dict = {"GGA": (0xF0, 0x00), "GLL": (0xF0, 0x01), "GSA": (0xF0, 0x02), "GSV": (0xF0, 0x03),
+                            "RMC": (0xF0, 0x04), "VTG": (0xF0, 0x05)}
+
+
+class UbxPort:
+    UART1: int = 1
+    MODE_8N1: int = 0x08D0
+    PROTO_UBX: int = 0x01
+    PROTO_NMEA: int = 0x02
+    TIME_REF_GPS: int = 1
+
+
+WGS84_A: float = 6378137.0
+WGS84_F: float = 1 / 298.257223563
+WGS84_B: float = WGS84_A * (1 - WGS84_F)
+WGS84_E2: float = WGS84_F * (2 - WGS84_F)
+WGS84_EP2: float = (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+
+GPS_EPOCH: int = calendar.timegm((1980, 1, 6, 0, 0, 0))
+GPS_UTC_LEAP_SECONDS: int = 18  # Diferencia entre la hora GPS y la UTC desde 2017
+SECONDS_PER_WEEK: int = 604800
+MPS_TO_KMH: float = 3.6
+
+_CFG_PRT = struct.Struct("<BBHIIHHHH")
+_CFG_RATE = struct.Struct("<HHH")
+_CFG_MSG = struct.Struct("<BBB")
+_ACK = struct.Struct("<BB")
+_NAV_PVT = struct.Struct("<IHBBBBBBIiBBBBiiiiIIiiiiiIIH")
+_NAV_SOL = struct.Struct("<IihBBiiiIiiiIHBBI")
+_LENGTH = struct.Struct("<H")
+
+
+class NavSolution(NamedTuple):
+    """
+    Solución de navegación decodificada de NAV-PVT o NAV-SOL, en unidades del resto de la aplicación
+    """
+    fix_ok: bool
+    latitude: float                 # Grados
+    longitude: float                # Grados
+    speed: float                    # Velocidad sobre el suelo en km/h
+    course: float                   # Rumbo del movimiento en grados
+    accuracy: float                 # Precisión horizontal (NAV-PVT) o 3D (NAV-SOL) estimada en metros
+    satellites_used: int
+    pdop: float
+    gps_time: float                 # Hora UTC de la solución en segundos desde epoch, None si no es válida
+
+
+def ubx_checksum(data: bytes) -> bytes:
+    """
+    Suma de control de Fletcher de 8 bits sobre la clase, el identificador, la longitud y el contenido del mensaje
+    """
+    ck_a = ck_b = 0
+    for byte in data:
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return bytes((ck_a, ck_b))
+
+
+def build_ubx_message(message: tuple, payload: bytes = b"") -> bytes:
+    data = bytes(message) + _LENGTH.pack(len(payload)) + payload
+    return UbxMessages.SYNC + data + ubx_checksum(data)
+
+
+def parse_ubx_frame(frame: bytes) -> (tuple, bytes):
+    """
+    Valida un mensaje UBX completo
+    :param frame: Mensaje desde los bytes de sincronismo hasta la suma de control
+    :return: Clase e identificador del mensaje y su contenido, None si la suma de control no es válida
+    """
+    if ubx_checksum(frame[2:-UbxMessages.CHECKSUM_LENGTH]) != frame[-UbxMessages.CHECKSUM_LENGTH:]:
+        return None
+    return (frame[2], frame[3]), frame[UbxMessages.HEADER_LENGTH:-UbxMessages.CHECKSUM_LENGTH]
+
+
+def get_ubx_frame_length(header: bytes) -> int:
+    """
+    :param header: Primeros HEADER_LENGTH bytes del mensaje
+    :return: Longitud total del mensaje, None si la longitud del contenido no es válida
+    """
+    payload_length = _LENGTH.unpack_from(header, 4)[0]
+    if payload_length > UbxMessages.MAX_PAYLOAD_LENGTH:
+        return None
+    return UbxMessages.HEADER_LENGTH + payload_length + UbxMessages.CHECKSUM_LENGTH
+
+
+def cfg_prt_payload(baudrate: int, out_nmea: bool = True) -> bytes:
+    """
+    Configuración de la UART1: 8N1 a baudrate, entrada UBX y NMEA y salida UBX, y NMEA si out_nmea
+    """
+    out_proto = UbxPort.PROTO_UBX | (UbxPort.PROTO_NMEA if out_nmea else 0)
+    return _CFG_PRT.pack(UbxPort.UART1, 0, 0, UbxPort.MODE_8N1, baudrate, UbxPort.PROTO_UBX | UbxPort.PROTO_NMEA,
+                         out_proto, 0, 0)
+
+
+def cfg_rate_payload(rate_hz: float) -> bytes:
+    return _CFG_RATE.pack(round(1000 / rate_hz), 1, UbxPort.TIME_REF_GPS)
+
+
+def cfg_msg_payload(message: tuple, rate: int) -> bytes:
+    """
+    :param message: Clase e identificador del mensaje
+    :param rate: Un mensaje cada rate soluciones de navegación en el puerto actual, 0 para desactivarlo
+    """
+    return _CFG_MSG.pack(message[0], message[1], rate)
+
+
+def parse_cfg_rate(payload: bytes) -> float:
+    """
+    :return: Frecuencia de navegación en Hz
+    """
+    return 1000 / _CFG_RATE.unpack_from(payload)[0]
+
+
+def parse_cfg_msg(payload: bytes) -> (tuple, int):
+    """
+    :return: Clase e identificador del mensaje y su tasa en el puerto actual
+    """
+    msg_class, msg_id, rate = _CFG_MSG.unpack_from(payload)
+    return (msg_class, msg_id), rate
+
+
+def parse_ack(payload: bytes) -> tuple:
+    """
+    :return: Clase e identificador del mensaje confirmado o rechazado
+    """
+    return _ACK.unpack_from(payload)
+
+
+def parse_nav_pvt(payload: bytes) -> NavSolution:
+    (_, year, month, day, hour, minute, second, valid, _, nano, fix_type, flags, _, num_sv, lon, lat, _, _, h_acc, _,
+     _, _, _, g_speed, head_mot, _, _, p_dop) = _NAV_PVT.unpack_from(payload)
+    gps_time = None
+    if valid & 0x03 == 0x03:    # Fecha y hora válidas
+        gps_time = calendar.timegm((year, month, day, hour, minute, second)) + nano * 1e-9
+    return NavSolution(fix_ok=bool(flags & 0x01) and fix_type in (2, 3, 4),
+                       latitude=lat * 1e-7, longitude=lon * 1e-7,
+                       speed=g_speed * 1e-3 * MPS_TO_KMH, course=head_mot * 1e-5,
+                       accuracy=h_acc * 1e-3, satellites_used=num_sv, pdop=p_dop * 0.01, gps_time=gps_time)
+
+
+def parse_nav_sol(payload: bytes) -> NavSolution:
+    (itow, ftow, week, gps_fix, flags, ecef_x, ecef_y, ecef_z, p_acc, ecef_vx, ecef_vy, ecef_vz, _, p_dop, _, num_sv,
+     _) = _NAV_SOL.unpack_from(payload)
+    latitude, longitude = ecef_to_geodetic(ecef_x * 1e-2, ecef_y * 1e-2, ecef_z * 1e-2)
+    speed, course = ecef_velocity_to_ground(ecef_vx * 1e-2, ecef_vy * 1e-2, ecef_vz * 1e-2, latitude, longitude)
+    gps_time = None
+    if flags & 0x0C == 0x0C:    # Semana y tiempo de la semana válidos
+        gps_time = GPS_EPOCH + week * SECONDS_PER_WEEK + itow * 1e-3 + ftow * 1e-9 - GPS_UTC_LEAP_SECONDS
+    return NavSolution(fix_ok=bool(flags & 0x01) and gps_fix in (2, 3, 4),
+                       latitude=latitude, longitude=longitude,
+                       speed=speed * MPS_TO_KMH, course=course,
+                       accuracy=p_acc * 1e-2, satellites_used=num_sv, pdop=p_dop * 0.01, gps_time=gps_time)
+
+
+def nav_pvt_payload(solution: NavSolution, height: float = 0.0) -> bytes:
+    """
+    Contenido de NAV-PVT para una solución de navegación, inverso de parse_nav_pvt
+    :param height: Altura sobre el elipsoide en metros
+    """
+    gps_time = solution.gps_time if solution.gps_time is not None else 0.0
+    utc = time.gmtime(gps_time)
+    valid = 0x07 if solution.gps_time is not None else 0x00
+    fix_type, flags = (3, 0x01) if solution.fix_ok else (0, 0x00)
+    speed = solution.speed / MPS_TO_KMH
+    course = math.radians(solution.course)
+    payload = _NAV_PVT.pack(0, utc.tm_year, utc.tm_mon, utc.tm_mday, utc.tm_hour, utc.tm_min, utc.tm_sec, valid,
+                            50, int(gps_time % 1 * 1e9), fix_type, flags, 0, solution.satellites_used,
+                            round(solution.longitude * 1e7), round(solution.latitude * 1e7), round(height * 1e3),
+                            round(height * 1e3), round(solution.accuracy * 1e3), round(solution.accuracy * 1.6e3),
+                            round(speed * math.cos(course) * 1e3), round(speed * math.sin(course) * 1e3), 0,
+                            round(speed * 1e3), round(solution.course * 1e5), 300, 100000,
+                            round(solution.pdop * 100))
+    return payload + bytes(UbxMessages.NAV_PVT_LENGTH - len(payload))
+
+
+def nav_sol_payload(solution: NavSolution, height: float = 0.0) -> bytes:
+    """
+    Contenido de NAV-SOL para una solución de navegación, inverso de parse_nav_sol
+    :param height: Altura sobre el elipsoide en metros
+    """
+    gps_time = solution.gps_time if solution.gps_time is not None else GPS_EPOCH - GPS_UTC_LEAP_SECONDS
+    week, tow = divmod(gps_time - GPS_EPOCH + GPS_UTC_LEAP_SECONDS, SECONDS_PER_WEEK)
+    itow = int(tow * 1000)
+    flags = (0x0C if solution.gps_time is not None else 0x00) | (0x01 if solution.fix_ok else 0x00)
+    x, y, z = geodetic_to_ecef(solution.latitude, solution.longitude, height)
+    vx, vy, vz = ground_velocity_to_ecef(solution.speed / MPS_TO_KMH, solution.course, solution.latitude,
+                                         solution.longitude)
+    return _NAV_SOL.pack(itow, int((tow * 1000 - itow) * 1e6), int(week), 3 if solution.fix_ok else 0, flags,
+                         round(x * 100), round(y * 100), round(z * 100), round(solution.accuracy * 100),
+                         round(vx * 100), round(vy * 100), round(vz * 100), 30, round(solution.pdop * 100), 0,
+                         solution.satellites_used, 0)
+
+
+def ecef_to_geodetic(x: float, y: float, z: float) -> (float, float):
+    """
+    Conversión de coordenadas ECEF en metros a latitud y longitud WGS84 en grados (método de Bowring, con error
+    milimétrico en la superficie terrestre)
+    """
+    p = math.hypot(x, y)
+    theta = math.atan2(z * WGS84_A, p * WGS84_B)
+    latitude = math.atan2(z + WGS84_EP2 * WGS84_B * math.sin(theta) ** 3,
+                          p - WGS84_E2 * WGS84_A * math.cos(theta) ** 3)
+    return math.degrees(latitude), math.degrees(math.atan2(y, x))
+
+
+def geodetic_to_ecef(latitude: float, longitude: float, height: float = 0.0) -> (float, float, float):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    n = WGS84_A / math.sqrt(1 - WGS84_E2 * math.sin(lat) ** 2)
+    return ((n + height) * math.cos(lat) * math.cos(lon),
+            (n + height) * math.cos(lat) * math.sin(lon),
+            (n * (1 - WGS84_E2) + height) * math.sin(lat))
+
+
+def ecef_velocity_to_ground(vx: float, vy: float, vz: float, latitude: float, longitude: float) -> (float, float):
+    """
+    Proyecta una velocidad ECEF en m/s sobre el plano horizontal local
+    :return: Velocidad sobre el suelo en m/s y rumbo en grados
+    """
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    v_east = -math.sin(lon) * vx + math.cos(lon) * vy
+    v_north = -math.sin(lat) * math.cos(lon) * vx - math.sin(lat) * math.sin(lon) * vy + math.cos(lat) * vz
+    return math.hypot(v_east, v_north), math.degrees(math.atan2(v_east, v_north)) % 360
+
+
+def ground_velocity_to_ecef(speed: float, course: float, latitude: float, longitude: float) -> (float, float, float):
+    """
+    Inverso de ecef_velocity_to_ground para una velocidad horizontal
+    :param speed: Velocidad sobre el suelo en m/s
+    :param course: Rumbo en grados
+    :return: Velocidad ECEF en m/s
+    """
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    v_north, v_east = speed * math.cos(math.radians(course)), speed * math.sin(math.radians(course))
+    return (-math.sin(lon) * v_east - math.sin(lat) * math.cos(lon) * v_north,
+            math.cos(lon) * v_east - math.sin(lat) * math.sin(lon) * v_north,
+            math.cos(lat) * v_north)
@@ -0,0 +1,103 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "latencyStats"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+
+
+class _StageCounter:
+    def __init__(self, window: int):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.last: float = 0.0
+        self.max: float = 0.0
+        self.samples: deque = deque(maxlen=window)
+
+    def add(self, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.last = elapsed
+        self.samples.append(elapsed)
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentiles(self, percentiles: tuple) -> list:
+        if len(self.samples) == 0:
+            return [0.0] * len(percentiles)
+        return np.percentile(np.fromiter(self.samples, dtype=np.float64), percentiles).tolist()
+
+
+class LatencyStats:
+    """
+    Contadores de latencia por etapa (captura, preprocesado, inferencia...). Es seguro utilizarlo desde varios hilos.
+    Los tiempos se almacenan en segundos y se reportan en milisegundos. Los percentiles se calculan sobre las últimas
+    window muestras de cada etapa.
+    """
+    WINDOW: int = 1000
+    PERCENTILES: tuple = (50, 95, 99)
+
+    def __init__(self, stages: list = None, window: int = WINDOW):
+        self.__lock = Lock()
+        self.__window: int = window
+        self.__counters: dict = {}
+        for stage in stages or []:
+            self.__counters[stage] = _StageCounter(window)
+
+    def add(self, stage: str, elapsed: float) -> None:
+        with self.__lock:
+            counter = self.__counters.get(stage)
+            if counter is None:
+                counter = self.__counters[stage] = _StageCounter(self.__window)
+            counter.add(elapsed)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        Mide el tiempo del bloque de código y lo acumula en la etapa indicada
+        :param stage: Nombre de la etapa
+        """
+        init_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - init_time)
+
+    def get_count(self, stage: str) -> int:
+        with self.__lock:
+            counter = self.__counters.get(stage)
+            return counter.count if counter is not None else 0
+
+    def summary(self) -> dict:
+        """
+        Devuelve un resumen por etapa con el número de muestras y la latencia última, media, máxima y los percentiles
+        p50, p95 y p99 en ms.
+        """
+        with self.__lock:
+            summary: dict = {}
+            for stage, counter in self.__counters.items():
+                summary[stage] = {"count": counter.count,
+                                  "last_ms": round(counter.last * 1000, 2),
+                                  "mean_ms": round(counter.mean() * 1000, 2),
+                                  "max_ms": round(counter.max * 1000, 2)}
+                for percentile, value in zip(self.PERCENTILES, counter.percentiles(self.PERCENTILES)):
+                    summary[stage][f"p{percentile}_ms"] = round(value * 1000, 2)
+            return summary
+
+    def summary_str(self) -> str:
+        return ", ".join(f"{stage}: n={values['count']} media={values['mean_ms']} ms p95={values['p95_ms']} ms "
+                         f"max={values['max_ms']} ms" for stage, values in self.summary().items())
+
+    def reset(self) -> None:
+        with self.__lock:
+            for stage in self.__counters:
+                self.__counters[stage] = _StageCounter(self.__window)
@@ -0,0 +1,32 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "memoryStats"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+PROC_STATUS_FILE: str = "/proc/self/status"
+
+
+def _read_status_kb(field: str) -> int:
+    try:
+        with open(PROC_STATUS_FILE, "r") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def get_rss_mb() -> float:
+    """
+    Memoria residente actual del proceso en MB (0 fuera de Linux)
+    """
+    return _read_status_kb("VmRSS") / 1024
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Pico de memoria residente del proceso en MB desde su arranque (0 fuera de Linux)
+    """
+    return _read_status_kb("VmHWM") / 1024
@@ -0,0 +1,142 @@
+__author__ = "Jose David Escribano Orts"
+__subsystem__ = "Utils"
+__module__ = "connectivityMonitor"
+__version__ = "1.0"
+__info__ = {"subsystem": __subsystem__, "module_name": __module__, "version": __version__}
+
+import socket
+import time
+from threading import Event, Lock
+
+from tfm_muaii_rpi4.Environment.env import EnvSingleton
+from tfm_muaii_rpi4.Logger.logger import LogsSingleton
+from tfm_muaii_rpi4.Utils.utils import Service
+
+Logs = LogsSingleton()
+
+
+class _ConnectivityMonitor(Service):
+    """
+    Comprobación en segundo plano de la conexión a internet. Con conexión se comprueba cada online_period segundos; sin
+    ella, los reintentos se espacian desde retry_min hasta retry_max segundos, duplicando el intervalo tras cada fallo.
+    El estado se consulta sin esperas con is_online y los cambios se notifican a las funciones registradas con
+    add_listener, que reciben el nuevo estado.
+    """
+    HOSTS: list = [["8.8.8.8", 53], ["1.1.1.1", 53]]
+    TIMEOUT: float = 1.0
+    ONLINE_PERIOD: float = 30.0
+    RETRY_MIN: float = 2.0
+    RETRY_MAX: float = 60.0
+
+    def __init__(self):
+        super().__init__(__info__, is_thread=True)
+        env = EnvSingleton()
+        conf: dict = env.get_service_conf(env.connectivity_monitor) or {}
+        self.__hosts: list = [(host, int(port)) for host, port in conf.get("hosts", self.HOSTS)]
+        self.__timeout: float = float(conf.get("timeout", self.TIMEOUT))
+        self.__online_period: float = float(conf.get("online_period", self.ONLINE_PERIOD))
+        self.__retry_min: float = float(conf.get("retry_min", self.RETRY_MIN))
+        self.__retry_max: float = float(conf.get("retry_max", self.RETRY_MAX))
+        self.__online: bool = False
+        self.__online_event = Event()
+        self.__probe_event = Event()
+        self.__listeners: list = []
+        self.__lock = Lock()
+        self.__last_probe: float = 0.0
+
+    def start(self):
+        try:
+            super().start()
+        except Exception as e:
+            super().critical_error(e, "start")
+
+    def stop(self):
+        try:
+            self._stop_thread.set()
+            self.__probe_event.set()
+            super().stop()
+        except Exception as e:
+            super().critical_error(e, "stop")
+
+    def _run(self):
+        retry_period = self.__retry_min
+        while not super().need_stop():
+            self.__probe_event.clear()
+            online = self.__probe()
+            self.__set_online(online)
+            if online:
+                retry_period = self.__retry_min
+                delay = self.__online_period
+            else:
+                delay = retry_period
+                retry_period = min(retry_period * 2, self.__retry_max)
+            # Una petición de comprobación o la parada del servicio interrumpen la espera
+            self.__probe_event.wait(delay)
+
+    def __probe(self) -> bool:
+        self.__last_probe = time.time()
+        for host, port in self.__hosts:
+            try:
+                with socket.create_connection((host, port), timeout=self.__timeout):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def __set_online(self, online: bool) -> None:
+        with self.__lock:
+            if online == self.__online:
+                return
+            self.__online = online
+            listeners = list(self.__listeners)
+        if online:
+            self.__online_event.set()
+            Logs.get_logger().info("Conexión a internet disponible", extra=__info__)
+        else:
+            self.__online_event.clear()
+            Logs.get_logger().warning("Conexión a internet perdida", extra=__info__)
+        for listener in listeners:
+            try:
+                listener(online)
+            except Exception as e:
+                Logs.get_logger().error(f"Error al notificar el cambio de conexión: {e}", extra=__info__)
+
+    def is_online(self) -> bool:
+        """
+        :return: Último estado de la conexión, sin realizar ninguna comprobación
+        """
+        return self.__online
+
+    def wait_online(self, timeout: float = None) -> bool:
+        """
+        Espera como mucho timeout segundos a que haya conexión
+        :return: Conexión disponible (True) - Sin conexión (False)
+        """
+        return self.__online_event.wait(timeout)
+
+    def request_probe(self) -> None:
+        """
+        Solicita una comprobación inmediata, por ejemplo si una petición online ha fallado estando conectado
+        """
+        self.__probe_event.set()
+
+    def add_listener(self, listener) -> None:
+        with self.__lock:
+            self.__listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        with self.__lock:
+            if listener in self.__listeners:
+                self.__listeners.remove(listener)
+
+    def get_last_probe(self) -> float:
+        return self.__last_probe
+
+
+class ConnectivityMonitorSingleton:
+    __instance = None
+
+    def __new__(cls):
+        if ConnectivityMonitorSingleton.__instance is None:
+            ConnectivityMonitorSingleton.__instance = _ConnectivityMonitor()
+        return ConnectivityMonitorSingleton.__instance
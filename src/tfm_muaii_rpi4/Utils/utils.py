@@ -143,9 +143,12 @@ class ServiceDB:
 
 
 def internet_access(host="8.8.8.8", port=53, timeout=1):
+    """
+    Comprobación puntual de la conexión a internet. Para consultas frecuentes se usa ConnectivityMonitorSingleton, que
+    mantiene el estado en segundo plano.
+    """
     try:
-        socket.setdefaulttimeout(timeout)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
-        return True
-    except Exception:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
         return False
\ No newline at end of file